@@ -1,14 +1,28 @@
 import collections
 import dataclasses
 import datetime
+import fnmatch
+import glob
+import math
+import os
 import re
+import subprocess
 import typing
 
+from . import baseline
+from . import blobcache
+from . import budget
 from . import commands
 from . import output
+from . import planner
+from . import profiling
+from . import pruning
+from . import scanner
 
 
 IGNORE_PRAGMA = "no-check-fixmes"
+# Maximum number of paths given to a single Git command.
+PATHSPEC_CHUNK_SIZE = 1000
 
 
 # All default values are here (not in the `config` module) to be close
@@ -16,11 +30,25 @@ IGNORE_PRAGMA = "no-check-fixmes"
 @dataclasses.dataclass
 class Config:
     path: str = "."
+    rev: str = ""  # an empty string means the working tree
+    refs: typing.Sequence = ()  # if set, ``rev`` is ignored
+    cache_file: str = ""
+    engine: scanner.Engine = scanner.Engine.GIT
     max_age: int = 180
 
     output_format: output.OutputFormat = output.OutputFormat.TEXT
+    output_file: str = ""
     only_old: bool = False
     colorize_errors: bool = True
+    stream: bool = False
+    profile: str = ""
+    metrics_file: str = ""
+    history_file: str = ""
+    baseline: str = ""
+    update_baseline: bool = False
+    fail_fast: bool = False
+    time_budget: float = 0  # seconds, 0 means no limit
+    timeouts: dict = dataclasses.field(default_factory=dict)
 
     annotations: typing.Sequence = ("todo", "fixme", )  # no-check-fixmes
     ignored_orphans_annotations: typing.Sequence = ("wontfix", "xxx")  # annotation which won't trigger orphans checks
@@ -28,6 +56,18 @@ class Config:
     future_tag_regex: str = r"FUTURE-[-[:alnum:]\._]+?"  # no-check-fixmes
 
     whitelist: typing.Sequence = ()
+    whitelist_file: str = ""
+    max_file_size: int = 0  # bytes, 0 means no limit
+    excluded_attributes: typing.Sequence = ()  # e.g. "linguist-generated"
+
+    def __post_init__(self):
+        if isinstance(self.timeouts, dict):  # not when copied with ``dataclasses.replace()``
+            self.timeouts = commands.Timeouts(**self.timeouts)
+
+    @property
+    def oldest_first(self):
+        """Whether the oldest candidates should be evaluated first."""
+        return self.fail_fast or bool(self.time_budget)
 
     @property
     def annotation_regex(self):
@@ -55,6 +95,34 @@ class Config:
         )
         return self._py_annotation_regex
 
+    @property
+    def annotation_plan(self):
+        """How ``git grep`` searches annotations (see the ``planner``
+        module). The scanner searches the extended regular expression.
+        """
+        # pylint: disable=access-member-before-definition
+        if hasattr(self, "_annotation_plan"):
+            return self._annotation_plan
+        if self.uses_scanner:
+            mode = planner.GrepMode.EXTENDED
+        else:
+            mode = planner.choose_annotations_mode(self.annotations, planner.has_perl_regexp(self.path))
+        self._annotation_plan = planner.get_annotations_plan(self.annotations, mode)
+        return self._annotation_plan
+
+    def is_annotation(self, line_content):
+        """Return whether a line found by a search of annotations
+        (with ``annotation_plan``) has an annotation.
+        """
+        return self.annotation_plan.is_exact(line_content) or bool(self.py_annotation_regex.search(line_content))
+
+    def get_tag(self, line_content):
+        """Return the annotation of the line (lowercased, e.g. "todo"),
+        or an empty string if there is none.
+        """
+        match = self.py_annotation_regex.search(line_content)
+        return match.group(2).lower() if match else ""
+
     @property
     def py_assignee_regex(self):
         """Python compiled regex to extract the assignee."""
@@ -68,6 +136,113 @@ class Config:
         )
         return self._py_assignee_regex
 
+    def get_scanner(self, rev=""):
+        """Return the scanner of the working tree (or of ``rev``), used
+        if the ``engine`` option is "python" (see the ``scanner``
+        module).
+        """
+        # pylint: disable=access-member-before-definition
+        if not hasattr(self, "_scanners"):
+            self._scanners = {}
+        if rev not in self._scanners:
+            patterns = scanner.Patterns(
+                annotation=self.annotation_regex,
+                ignore_pragma=IGNORE_PRAGMA,
+                future_tag=self.future_tag_regex,
+                # Like in ``iter_orphan_futures()`` and ``get_known_future_tags()``
+                known_future_tag=(
+                    f"{self.ignored_orphans_annotations_regex}|{self.annotation_regex}"
+                    f".*{self.future_tag_regex}"
+                ),
+            )
+            self._scanners[rev] = scanner.Scanner(
+                self.path,
+                patterns,
+                excluded=lambda path: (
+                    self.compiled_whitelist.matches(path) or path in self.get_pruned_paths(rev)
+                ),
+                timeout=self.timeouts.grep,
+                retries=self.timeouts.retries,
+                rev=rev,
+            )
+        return self._scanners[rev]
+
+    @property
+    def compiled_whitelist(self):
+        """Patterns of the ``whitelist`` option and of the whitelist
+        file, compiled to match paths (see ``Whitelist``).
+        """
+        # pylint: disable=access-member-before-definition
+        if not hasattr(self, "_compiled_whitelist"):
+            patterns = list(self.whitelist)
+            if self.whitelist_file:
+                patterns.extend(read_whitelist_file(self.whitelist_file))
+            self._compiled_whitelist = Whitelist(patterns)
+        return self._compiled_whitelist
+
+    @property
+    def lists_searched_paths(self):
+        """Whether searched paths are listed and given to ``git grep``
+        (see ``get_searched_blob_ids()``), instead of giving whitelisted
+        patterns: a whitelist file may have too many patterns for a
+        command line, and pruned files are only known by their paths.
+        """
+        return bool(self.whitelist_file) or self.prunes_files
+
+    @property
+    def prunes_files(self):
+        """Whether some files may be pruned (see ``get_pruned_paths()``)."""
+        return bool(self.max_file_size or self.excluded_attributes)
+
+    def get_pruned_paths(self, rev="", paths=None):
+        """Return paths of files of the working tree (or of ``rev``)
+        that are not searched, because they are too large or have one
+        of ``excluded_attributes`` (see the ``pruning`` module).
+
+        If ``paths`` is given, only these files are checked (e.g. files
+        modified by a push), instead of listing all files.
+        """
+        # pylint: disable=access-member-before-definition
+        if not self.prunes_files:
+            return set()
+        timeout, retries = self.timeouts.grep, self.timeouts.retries
+        if paths is not None:
+            if rev:
+                blob_ids = get_blob_ids(self.path, rev, timeout=timeout, retries=retries, paths=paths)
+            else:
+                blob_ids = dict.fromkeys(paths, "")  # sizes are read from the working tree
+            return self._prune(blob_ids, rev)
+        if not hasattr(self, "_pruned_paths"):
+            self._pruned_paths = {}
+        if rev not in self._pruned_paths:
+            if rev:
+                blob_ids = get_blob_ids(self.path, rev, timeout=timeout, retries=retries)
+            else:
+                blob_ids, _modified = get_index_blob_ids(self.path, timeout=timeout, retries=retries)
+            blob_ids = {
+                path: blob_id for path, blob_id in blob_ids.items() if not self.compiled_whitelist.matches(path)
+            }
+            self._pruned_paths[rev] = self._prune(blob_ids, rev)
+        return self._pruned_paths[rev]
+
+    def _prune(self, blob_ids, rev):
+        return pruning.get_pruned_paths(
+            self.path,
+            blob_ids,
+            max_size=self.max_file_size,
+            attributes=self.excluded_attributes,
+            rev=rev,
+            timeout=self.timeouts.grep,
+            retries=self.timeouts.retries,
+        )
+
+    @property
+    def uses_scanner(self):
+        """Whether files are searched by the scanner instead of ``git
+        grep``.
+        """
+        return self.engine == scanner.Engine.PYTHON
+
 
 @dataclasses.dataclass
 class Annotation:
@@ -77,16 +252,22 @@ class Annotation:
     age: int = 0
     assignee: str = ""
     is_old: bool = False
+    timed_out: bool = False  # if the age could not be retrieved in time
+    ref: str = ""  # only set when several refs are scanned
 
     @property
     def must_warn(self):
-        return self.is_old
+        return self.is_old or self.timed_out
+
+    @property
+    def location(self):
+        if self.ref:
+            return f"{self.ref}:{self.path}:{self.line_no}"
+        return f"{self.path}:{self.line_no}"
 
     def to_text(self):
-        return (
-            f"{self.assignee: <15} - {self.age: >4} days - "
-            f"{self.path}:{self.line_no}: {self.line_content.strip()}"
-        )
+        age = " TIMEOUT " if self.timed_out else f"{self.age: >4} days"
+        return f"{self.assignee: <15} - {age} - {self.location}: {self.line_content.strip()}"
 
     def to_dict(self):
         return {
@@ -96,6 +277,8 @@ class Annotation:
             "line_content": self.line_content,
             "age": self.age,
             "is_old": self.is_old,
+            "timed_out": self.timed_out,
+            "ref": self.ref,
         }
 
 
@@ -108,6 +291,10 @@ class FutureTag:
 
     must_warn = True
 
+    @property
+    def location(self):
+        return f"{self.path}:{self.line_no}"
+
     def to_text(self):
         return (
             f"{self.author: <15} -   ORPHAN  - "
@@ -123,42 +310,82 @@ class FutureTag:
         }
 
 
-def get_annotation_candidates(directory, annotation_regex, whitelist):
-    """Return lines (with filename and line number) that contains an annotation."""
-    return commands.get_output(
+def iter_annotation_candidates(
+    directory, annotation_regex, whitelist, timeout=0, retries=0, rev="", paths=(), plan=None,
+):
+    """Yield lines (see ``commands.GrepLine``) that contains an
+    annotation, in the working tree or in the ``rev`` revision, and
+    only in ``paths`` if given, as soon as ``git grep`` finds them.
+
+    ``annotation_regex`` is searched as an extended regular expression,
+    unless ``plan`` is given (see the ``planner`` module).
+    """
+    plan = plan or planner.GrepPlan(planner.GrepMode.EXTENDED, (annotation_regex,))
+    lines = commands.iter_output(
         [
             "git",
             "grep",
             "-I",  # Ignore binary files
+            "-z",  # NUL bytes after paths and line numbers, which are hence not quoted
             "--line-number",
             "--ignore-case",
-            "--extended-regexp",
-            "-e",  # Find annotations
-            annotation_regex,
+            *plan.options,  # Find annotations
             "--and",  # When they do not contain the ignore pragma ("no-check-fixmes")
             "--not",
             "-e",
             IGNORE_PRAGMA,
-            "--",
-            ".",
         ]
+        + ([rev] if rev else [])
+        + ["--"]
+        + ([f":(literal){path}" for path in paths] or ["."])
         + [f":(exclude){glob}" for glob in whitelist],
         cwd=directory,
         valid_return_codes=(0, 1),  # 1 means that no files were found
+        timeout=timeout,
+        retries=retries,
+    )
+    yield from commands.iter_grep_lines(lines, rev)
+
+
+def get_annotation_candidates(
+    directory, annotation_regex, whitelist, timeout=0, retries=0, rev="", paths=(), plan=None,
+):
+    """Return lines that contains an annotation (see
+    ``iter_annotation_candidates()``).
+    """
+    return list(
+        iter_annotation_candidates(
+            directory,
+            annotation_regex,
+            whitelist,
+            timeout=timeout,
+            retries=retries,
+            rev=rev,
+            paths=paths,
+            plan=plan,
+        )
     )
 
 
-def get_line_blame(filename, line, cwd):
+def get_line_blame(filename, line, cwd, timeout=0, retries=0, rev=""):
     """Return author's email and timestamp of the latest commit that
-    touched this line.
+    touched this line (of the working tree, or of the ``rev``
+    revision).
     """
-    infos = commands.get_output(
-        ["git", "blame", f"-L {line},{line}", "--porcelain", "--", filename],
+    # The output is not decoded: it ends with the line, whose encoding
+    # is unknown.
+    infos = commands.get_raw_output(
+        ["git", "blame", f"-L {line},{line}", "--porcelain"]
+        + ([rev] if rev else [])
+        + ["--", filename],
         cwd=cwd,
-    )
+        timeout=timeout,
+        retries=retries,
+    ).split(b"\n")
 
     def _get_info(metadata):
-        return [info.split()[1] for info in infos if info.startswith(metadata)][0]
+        prefix = f"{metadata} ".encode("utf-8")
+        return [commands.decode(info[len(prefix):]) for info in infos if info.startswith(prefix)][0]
 
     committer_mail = _get_info("committer-mail")
     timestamp = int(_get_info("committer-time"))
@@ -180,31 +407,515 @@ def get_login_from_committer_email(committer_email):
     return committer_email
 
 
-def get_annotations(config: Config):
-    annotations = []
-    for candidate in get_annotation_candidates(
-        config.path, config.annotation_regex, config.whitelist
+def get_index_blob_ids(directory, timeout=0, retries=0):
+    """Return the blob id of each file of the index (see
+    ``get_blob_ids()``), and paths of files that are modified in the
+    working tree (whose content is hence not the blob of the index).
+    """
+    modified = {
+        os.fsdecode(path)
+        for path in commands.get_raw_output(
+            ["git", "ls-files", "-z", "--modified"], cwd=directory, timeout=timeout, retries=retries,
+        ).split(b"\0")
+        if path
+    }
+    blob_ids = {}
+    for entry, path in _iter_entries(
+        commands.get_raw_output(
+            ["git", "ls-files", "-z", "--stage"], cwd=directory, timeout=timeout, retries=retries,
+        )
     ):
-        filename, line_no, line_content = candidate.split(":", 2)
-        if config.py_annotation_regex.search(line_content):
-            annotations.append(Annotation(filename, int(line_no), line_content))
+        mode, object_id, stage = entry
+        if mode == "160000":  # submodule
+            continue
+        if stage != "0":  # unmerged
+            modified.add(path)
+        blob_ids[path] = object_id
+    return blob_ids, modified
+
+
+def get_searched_blob_ids(config: Config, rev=""):
+    """Return the blob id of each file that is searched in ``rev`` (or
+    in the working tree), i.e. that is neither whitelisted nor pruned,
+    and paths of modified files (see ``get_index_blob_ids()``).
+    """
+    if rev:
+        blob_ids = get_blob_ids(
+            config.path, rev, timeout=config.timeouts.grep, retries=config.timeouts.retries,
+        )
+        modified = set()
+    else:
+        blob_ids, modified = get_index_blob_ids(
+            config.path, timeout=config.timeouts.grep, retries=config.timeouts.retries,
+        )
+    pruned = config.get_pruned_paths(rev)
+    blob_ids = {
+        path: blob_id
+        for path, blob_id in blob_ids.items()
+        if not config.compiled_whitelist.matches(path) and path not in pruned
+    }
+    return blob_ids, modified
+
+
+def get_blob_lines(cache: blobcache.BlobCache, key, blob_ids, grep, modified=()):
+    """Return lines found by ``grep`` in files of ``blob_ids`` (a
+    mapping of paths to blob ids), searching each blob only once, and
+    only if it is not in ``cache`` (under ``key``). Modified files
+    are always searched.
+
+    ``grep`` is called with lists of paths and must return lines (see
+    ``commands.GrepLine``).
+    """
+    found = {}  # blob id -> (line number, content) lists
+    unknown = {}  # blob id -> path of a file to search
+    for path, blob_id in blob_ids.items():
+        if path in modified:
+            continue
+        if blob_id not in found and blob_id not in unknown:
+            cached = cache.get(key, blob_id)
+            if cached is not None:
+                found[blob_id] = cached
+        hit = blob_id in found or blob_id in unknown
+        profiling.record_cache("blobs", hit)
+        if not hit:
+            unknown[blob_id] = path
+
+    paths = sorted(set(unknown.values()) | {path for path in blob_ids if path in modified})
+    searched = {path: [] for path in paths}
+    for start in range(0, len(paths), PATHSPEC_CHUNK_SIZE):
+        chunk = paths[start:start + PATHSPEC_CHUNK_SIZE]
+        for line in grep(chunk):
+            searched[line.path].append([line.line_no, line.content])
+    for blob_id, path in unknown.items():
+        found[blob_id] = searched[path]
+        cache.set(key, blob_id, searched[path])
+
+    lines = []
+    for path, blob_id in sorted(blob_ids.items()):
+        rests = searched[path] if path in modified else found[blob_id]
+        lines.extend(commands.GrepLine(path, line_no, content) for line_no, content in rests)
+    return lines
+
+
+def get_annotations_key(config: Config):
+    # Lines found depend on how annotations are searched.
+    plan = config.annotation_plan
+    return blobcache.get_key("annotations", config.annotation_regex, plan.mode, *plan.patterns, IGNORE_PRAGMA)
+
+
+def grep_annotation_candidates(config: Config, rev=""):
+    """Return a function that searches annotation candidates in given
+    paths (see ``get_blob_lines()``).
+    """
+    if config.uses_scanner:
+        return lambda paths: config.get_scanner(rev).scan(paths).annotation_lines
 
-    for annotation in annotations:
-        last_committer, last_modification = get_line_blame(
-            annotation.path, annotation.line_no, cwd=config.path
+    def grep(paths):
+        return iter_annotation_candidates(
+            config.path,
+            config.annotation_regex,
+            (),  # whitelisted paths are not given
+            timeout=config.timeouts.grep,
+            retries=config.timeouts.retries,
+            rev=rev,
+            paths=paths,
+            plan=config.annotation_plan,
         )
-        last_committer = get_login_from_committer_email(last_committer)
-        match = config.py_assignee_regex.search(annotation.line_content)
-        annotation.assignee = match.group("assignee") if match else last_committer
-        annotation.age = (
-            datetime.datetime.now(datetime.timezone.utc) - last_modification
-        ).days
-        annotation.is_old = annotation.age > config.max_age
-    return annotations
-
-
-def get_known_future_tags(directory, annotation_regex, future_tag_regex, whitelist):
-    """Return a list of tags that are referenced along annotations."""
+    return grep
+
+
+def iter_unblamed_annotations(config: Config):
+    """Yield annotations, without their age and assignee.
+
+    If the ``cache_file`` option is set, only files whose content is
+    not in the cache are searched. Pruned files (see
+    ``Config.get_pruned_paths()``) are not searched.
+    """
+    if config.cache_file or (config.lists_searched_paths and not config.uses_scanner):
+        # Only searched files are given to ``git grep``.
+        with profiling.phase("grep"), blobcache.BlobCache(config.cache_file or ":memory:") as cache:
+            blob_ids, modified = get_searched_blob_ids(config, config.rev)
+            candidates = get_blob_lines(
+                cache,
+                get_annotations_key(config),
+                blob_ids,
+                grep_annotation_candidates(config, config.rev),
+                modified,
+            )
+    elif config.uses_scanner:
+        with profiling.phase("grep"):
+            candidates = config.get_scanner(config.rev).scan().annotation_lines
+    else:
+        # Lines are processed as ``git grep`` finds them, while
+        # annotations are blamed: the "grep" phase only counts the
+        # time spent to read them.
+        candidates = profiling.iterate(
+            "grep",
+            iter_annotation_candidates(
+                config.path,
+                config.annotation_regex,
+                config.whitelist,
+                timeout=config.timeouts.grep,
+                retries=config.timeouts.retries,
+                rev=config.rev,
+                plan=config.annotation_plan,
+            ),
+        )
+    for candidate in candidates:
+        if not config.is_annotation(candidate.content):
+            continue
+        yield Annotation(candidate.path, candidate.line_no, candidate.content)
+
+
+def get_last_modification_times(directory, paths, timeout=0, retries=0, rev=""):
+    """Return the timestamp of the last commit (of the current branch,
+    or of the history of ``rev``) that modified each file of ``paths``.
+    """
+    times = {}
+    paths = sorted(set(paths))
+    for start in range(0, len(paths), PATHSPEC_CHUNK_SIZE):
+        chunk = paths[start:start + PATHSPEC_CHUNK_SIZE]
+        output = commands.get_raw_output(
+            [
+                "git",
+                "log",
+                "--relative",  # paths relative to ``directory``, like ``git grep``
+                "--name-only",
+                "-z",
+                "--format=%x00%ct",
+            ] + ([rev] if rev else []) + ["--"] + [f":(literal){path}" for path in chunk],
+            cwd=directory,
+            timeout=timeout,
+            retries=retries,
+        )
+        # Each commit is "\0<timestamp>\0", followed by "\n" and
+        # NUL-terminated paths, if any.
+        timestamp = 0
+        is_timestamp = is_first_path = False
+        for token in output.split(b"\0"):
+            if is_timestamp:
+                timestamp = int(token)
+                is_timestamp, is_first_path = False, True
+                continue
+            if not token:
+                is_timestamp = True
+                continue
+            if is_first_path:
+                token = token[1:]
+                is_first_path = False
+            # Commits are listed from the most recent one.
+            times.setdefault(os.fsdecode(token), timestamp)
+    return times
+
+
+def get_uncommitted_paths(directory, timeout=0, retries=0) -> set:
+    """Return paths of files that are modified (or added) in the
+    working tree or in the index, but not committed yet.
+    """
+    paths = set()
+    for index_option in ([], ["--cached"]):
+        output = commands.get_raw_output(
+            ["git", "diff", *index_option, "--relative", "--name-only", "-z"],
+            cwd=directory,
+            timeout=timeout,
+            retries=retries,
+        )
+        paths.update(os.fsdecode(path) for path in output.split(b"\0") if path)
+    return paths
+
+
+def _get_budget_config(config: Config, time_budget: budget.TimeBudget | None):
+    """Return ``config``, or a copy of it where searches do not run
+    after ``time_budget`` is spent (see ``TimeBudget.limit_timeouts()``).
+    """
+    if not time_budget or not config.time_budget:
+        return config
+    return dataclasses.replace(config, timeouts=time_budget.limit_timeouts(config.timeouts))
+
+
+def get_blame(config: Config, annotation: Annotation, rev=""):
+    """Return the committer and the date of the last modification of
+    the line of ``annotation``, or None if ``git blame`` timed out.
+    """
+    try:
+        with profiling.phase("blame"):
+            return get_line_blame(
+                annotation.path,
+                annotation.line_no,
+                cwd=config.path,
+                timeout=config.timeouts.blame,
+                retries=config.timeouts.retries,
+                rev=rev,
+            )
+    except subprocess.TimeoutExpired:
+        return None
+
+
+def set_blame(config: Config, annotation: Annotation, blame):
+    """Set the assignee and age of ``annotation`` from ``blame`` (see
+    ``get_blame()``).
+    """
+    match = config.py_assignee_regex.search(annotation.line_content)
+    if blame is None:
+        # Report it (as an error) instead of blocking or aborting the run.
+        annotation.assignee = match.group("assignee") if match else ""
+        annotation.timed_out = True
+        return
+    last_committer, last_modification = blame
+    last_committer = get_login_from_committer_email(last_committer)
+    annotation.assignee = match.group("assignee") if match else last_committer
+    annotation.age = (
+        datetime.datetime.now(datetime.timezone.utc) - last_modification
+    ).days
+    annotation.is_old = annotation.age > config.max_age
+
+
+def get_fingerprint(config: Config, annotation: Annotation):
+    return baseline.get_fingerprint(
+        annotation.path, annotation.line_content, config.get_tag(annotation.line_content)
+    )
+
+
+def iter_annotations(config: Config, time_budget: budget.TimeBudget | None = None):
+    """Yield annotations, each one as soon as its age is known.
+
+    If the ``baseline`` option is set, annotations of the baseline
+    are skipped (and not blamed).
+
+    If the ``fail_fast`` or ``time_budget`` option is set, annotations
+    of files that have not been modified for the longest time come
+    first, because they are the most likely to be old. If
+    ``time_budget`` is given, annotations are yielded until it is
+    spent.
+
+    If the ``refs`` option is set, annotations of each ref are yielded
+    (see ``iter_refs_annotations()``).
+    """
+    if config.refs:
+        yield from iter_refs_annotations(config, time_budget)
+        return
+    accepted = baseline.read(config.baseline) if config.baseline else None
+    unblamed = iter_unblamed_annotations(_get_budget_config(config, time_budget))
+    if config.oldest_first:
+        try:
+            unblamed = list(unblamed)
+            timeouts = _get_budget_config(config, time_budget).timeouts
+            with profiling.phase("log"):
+                times = get_last_modification_times(
+                    config.path,
+                    [ann.path for ann in unblamed],
+                    timeout=timeouts.log,
+                    retries=timeouts.retries,
+                    rev=config.rev,
+                )
+                if not config.rev:
+                    uncommitted = get_uncommitted_paths(config.path, timeout=timeouts.log, retries=timeouts.retries)
+                    times.update(dict.fromkeys(uncommitted, math.inf))
+        except subprocess.TimeoutExpired:
+            if not (time_budget and time_budget.is_spent()):
+                raise
+            time_budget.stop()
+            return
+        # Uncommitted files are the newest ones.
+        unblamed.sort(key=lambda ann: times.get(ann.path, math.inf))
+    if time_budget and config.time_budget:
+        # Annotations are already in a list, sorted (see ``oldest_first``).
+        unblamed = time_budget.iterate(unblamed)
+    for annotation in unblamed:
+        if accepted:
+            fingerprint = get_fingerprint(config, annotation)
+            if accepted[fingerprint]:
+                accepted[fingerprint] -= 1
+                continue
+        set_blame(config, annotation, get_blame(config, annotation, config.rev))
+        yield annotation
+
+
+class Whitelist:
+    """Match paths against whitelist patterns, like ``git grep`` does
+    with ``:(exclude)`` pathspecs: a pattern matches a path (with
+    wildcards that also match slashes) or a directory.
+
+    Patterns are compiled once, so that matching a path does not
+    depend much on the number of patterns: patterns without wildcards
+    are looked up in sets (for the path and each of its directories),
+    and other ones are combined in a single regular expression.
+    """
+
+    def __init__(self, patterns: typing.Iterable[str]):
+        self.patterns = list(patterns)
+        self.paths = set()  # patterns without wildcards
+        self.directories = set()
+        regexes = []
+        for pattern in self.patterns:
+            if glob.has_magic(pattern):
+                regexes.append(fnmatch.translate(pattern))
+                regexes.append(re.escape(pattern.rstrip("/") + "/"))
+            else:
+                self.paths.add(pattern)
+                self.directories.add(pattern.rstrip("/"))
+        self.regex = re.compile("|".join(f"(?:{regex})" for regex in regexes)) if regexes else None
+
+    def __bool__(self):
+        return bool(self.patterns)
+
+    def matches(self, path) -> bool:
+        if path in self.paths:
+            return True
+        if self.directories:
+            directory, sep, _name = path.rpartition("/")
+            while sep:
+                if directory in self.directories:
+                    return True
+                directory, sep, _name = directory.rpartition("/")
+        return bool(self.regex and self.regex.match(path))
+
+
+def read_whitelist_file(path) -> list[str]:
+    """Return patterns of a whitelist file: one pattern per line, or
+    separated by NUL bytes (like ``--pathspec-file-nul`` files of Git).
+    """
+    with open(path, encoding="utf-8") as fp:
+        content = fp.read()
+    separator = "\0" if "\0" in content else "\n"
+    return [pattern.strip() for pattern in content.split(separator) if pattern.strip()]
+
+
+def is_whitelisted(path, whitelist):
+    """Return whether ``path`` matches a pattern of ``whitelist`` (a list
+    of patterns, or a ``Whitelist``).
+    """
+    if not isinstance(whitelist, Whitelist):
+        whitelist = Whitelist(whitelist)
+    return whitelist.matches(path)
+
+
+def _iter_entries(output):
+    """Yield fields of each entry of the output of ``git ls-files -z
+    --stage`` or ``git ls-tree -z`` (i.e. "<fields>\\t<path>\\0"),
+    and its path.
+    """
+    for entry in output.split(b"\0"):
+        if entry:
+            info, _tab, path = entry.partition(b"\t")
+            yield info.decode("utf-8").split(), os.fsdecode(path)
+
+
+def get_blob_ids(directory, rev, timeout=0, retries=0, paths=None):
+    """Return the blob id of each file of ``rev`` (in ``directory``,
+    with paths relative to it), or only of ``paths`` if given.
+    """
+    if paths is None:
+        chunks = [[]]
+    else:
+        paths = sorted(paths)
+        chunks = [paths[start:start + PATHSPEC_CHUNK_SIZE] for start in range(0, len(paths), PATHSPEC_CHUNK_SIZE)]
+    blob_ids = {}
+    for chunk in chunks:
+        for entry, path in _iter_entries(
+            commands.get_raw_output(
+                # Paths given to ``ls-tree`` are not patterns: "*" is literal.
+                ["git", "ls-tree", "-r", "-z", rev, "--", *chunk],
+                cwd=directory,
+                timeout=timeout,
+                retries=retries,
+            )
+        ):
+            _mode, object_type, object_id = entry
+            if object_type == "blob":  # not a submodule
+                blob_ids[path] = object_id
+    return blob_ids
+
+
+def iter_refs_annotations(config: Config, time_budget: budget.TimeBudget | None = None):
+    """Yield annotations of each ref of the ``refs`` option.
+
+    Most files are identical on all refs (e.g. release branches): each
+    unique file content (blob) is searched only once, and an
+    annotation is blamed only once for all refs where its file has the
+    same content. The blame of the first ref is then used for others.
+    If the ``cache_file`` option is set, blobs that are in the cache
+    are not searched at all.
+    """
+    unblamed = []  # (annotation, blob id)
+    times = {}  # (ref, path) -> time of the last modification
+    key = get_annotations_key(config)
+    with blobcache.BlobCache(config.cache_file or ":memory:") as cache:
+        for ref in config.refs:
+            try:
+                with profiling.phase("grep"):
+                    ref_config = _get_budget_config(config, time_budget)
+                    blob_ids, _modified = get_searched_blob_ids(ref_config, ref)
+                    candidates = get_blob_lines(cache, key, blob_ids, grep_annotation_candidates(ref_config, ref))
+                ref_unblamed = []
+                for candidate in candidates:
+                    if config.is_annotation(candidate.content):
+                        annotation = Annotation(candidate.path, candidate.line_no, candidate.content, ref=ref)
+                        ref_unblamed.append((annotation, blob_ids[candidate.path]))
+                if config.oldest_first:
+                    timeouts = _get_budget_config(config, time_budget).timeouts
+                    with profiling.phase("log"):
+                        ref_times = get_last_modification_times(
+                            config.path,
+                            [ann.path for ann, _blob_id in ref_unblamed],
+                            timeout=timeouts.log,
+                            retries=timeouts.retries,
+                            rev=ref,
+                        )
+                    times.update(((ref, path), timestamp) for path, timestamp in ref_times.items())
+            except subprocess.TimeoutExpired:
+                if not (time_budget and time_budget.is_spent()):
+                    raise
+                time_budget.stop()
+                return
+            if config.baseline:
+                # Each ref has all annotations of the baseline.
+                accepted = baseline.read(config.baseline)
+                for annotation, blob_id in ref_unblamed:
+                    fingerprint = get_fingerprint(config, annotation)
+                    if accepted[fingerprint]:
+                        accepted[fingerprint] -= 1
+                        continue
+                    unblamed.append((annotation, blob_id))
+            else:
+                unblamed.extend(ref_unblamed)
+
+    if config.oldest_first:
+        unblamed.sort(key=lambda item: times.get((item[0].ref, item[0].path), math.inf))
+    if time_budget:
+        unblamed = time_budget.iterate(unblamed)
+    blames = {}  # (path, blob id, line number) -> blame
+    for annotation, blob_id in unblamed:
+        blame_key = (annotation.path, blob_id, annotation.line_no)
+        hit = blame_key in blames
+        profiling.record_cache("blames", hit)
+        if not hit:
+            blames[blame_key] = get_blame(config, annotation, annotation.ref)
+        set_blame(config, annotation, blames[blame_key])
+        yield annotation
+
+
+def get_annotations(config: Config, time_budget: budget.TimeBudget | None = None):
+    return list(iter_annotations(config, time_budget))
+
+
+def update_baseline(config: Config):
+    """Write all current annotations to the baseline file and return
+    their number.
+    """
+    fingerprints = [
+        get_fingerprint(config, annotation) for annotation in iter_unblamed_annotations(config)
+    ]
+    baseline.write(config.baseline, fingerprints)
+    return len(fingerprints)
+
+
+def get_known_future_tags(
+    directory, annotation_regex, future_tag_regex, whitelist, timeout=0, retries=0, rev="", paths=(),
+):
+    """Return a list of tags that are referenced along annotations
+    (only in ``paths`` if given).
+    """
     grep = [
         "git",
         "grep",
@@ -212,70 +923,217 @@ def get_known_future_tags(directory, annotation_regex, future_tag_regex, whiteli
         "--ignore-case",
         "--extended-regexp",
         f"{annotation_regex}.*{future_tag_regex}",
-        "--",
-        ".",
     ]
+    if rev:
+        grep.append(rev)
+    grep.append("--")
+    grep.extend([f":(literal){path}" for path in paths] or ["."])
     grep.extend([f":(exclude){glob}" for glob in whitelist])
     lines = commands.get_pipe_command_output(
         grep,
         piped_to=["sed", "--regexp-extended", f"s/.*?({future_tag_regex}).*?/\\1/g"],
         cwd=directory,
         valid_return_codes=(0, 1),  # 0 if there are matches, 1 otherwise
+        timeout=timeout,
+        retries=retries,
     )
     return set(lines)
 
 
-def get_all_futures(directory, future_tag_regex, whitelist):
-    """Get all occurrences of FUTURE tags."""
+def grep_known_future_tags(config: Config, rev=""):
+    """Return tags that are referenced along annotations (or along
+    annotations that do not trigger orphans checks) in ``rev``, or in
+    the working tree, with ``git grep``.
+    """
+    known_tags_regex = fr'{config.ignored_orphans_annotations_regex}|{config.annotation_regex}'
+    if not config.lists_searched_paths:
+        return get_known_future_tags(
+            config.path,
+            known_tags_regex,
+            config.future_tag_regex,
+            config.whitelist,
+            timeout=config.timeouts.grep,
+            retries=config.timeouts.retries,
+            rev=rev,
+        )
+    # Only searched files are given to ``git grep``.
+    known_tags = set()
+    paths = sorted(get_searched_blob_ids(config, rev)[0])
+    for start in range(0, len(paths), PATHSPEC_CHUNK_SIZE):
+        known_tags.update(
+            get_known_future_tags(
+                config.path,
+                known_tags_regex,
+                config.future_tag_regex,
+                (),  # whitelisted paths are not given
+                timeout=config.timeouts.grep,
+                retries=config.timeouts.retries,
+                rev=rev,
+                paths=paths[start:start + PATHSPEC_CHUNK_SIZE],
+            )
+        )
+    return known_tags
+
+
+def iter_future_lines(directory, future_tag_regex, whitelist, timeout=0, retries=0, rev="", paths=()):
+    """Yield lines (see ``commands.GrepLine``) of each occurrence of
+    FUTURE tags, with the tag as content (only in ``paths`` if given),
+    as soon as ``git grep`` finds them.
+    """
+    plan = planner.get_future_tags_plan(future_tag_regex)
     grep = [
         "git",
         "grep",
         "-I",  # ignore binary files
+        "-z",  # NUL bytes after paths and line numbers
         "--line-number",
-        "--extended-regexp",
         "--only-matching",
-        "-e",
-        future_tag_regex,
+        *plan.options,
         "--and",
         "--not",
         "-e",
         IGNORE_PRAGMA,
     ]
+    if rev:
+        grep.append(rev)
+    if rev or paths:
+        grep.append("--")
+    grep.extend([f":(literal){path}" for path in paths])
     grep.extend([f":(exclude){glob}" for glob in whitelist])
-    lines = commands.get_output(
+    lines = commands.iter_output(
         grep,
         cwd=directory,
         valid_return_codes=(0, 1),  # 0 if there are matches, 1 otherwise
+        timeout=timeout,
+        retries=retries,
     )
+    yield from commands.iter_grep_lines(lines, rev)
+
 
+def get_future_lines(directory, future_tag_regex, whitelist, timeout=0, retries=0, rev="", paths=()):
+    """Return lines of each occurrence of FUTURE tags (see
+    ``iter_future_lines()``).
+    """
+    return list(
+        iter_future_lines(
+            directory, future_tag_regex, whitelist, timeout=timeout, retries=retries, rev=rev, paths=paths,
+        )
+    )
+
+
+def get_future_occurrences(lines):
+    """Return occurrences of each FUTURE tag of ``lines`` (see
+    ``iter_future_lines()``).
+    """
     occurrences = collections.defaultdict(list)
     for line in lines:
-        path, line_no, tag = line.split(":", 2)
-        occurrences[tag].append(FutureTag(path=path, line_no=int(line_no), tag=tag))
+        occurrences[line.content].append(FutureTag(path=line.path, line_no=line.line_no, tag=line.content))
     return occurrences
 
 
-def get_orphan_futures(config):
-    """Return orphan FUTURE tags.
+def get_all_futures(directory, future_tag_regex, whitelist, timeout=0, retries=0, rev="", paths=()):
+    """Get all occurrences of FUTURE tags (only in ``paths`` if given)."""
+    return get_future_occurrences(
+        iter_future_lines(
+            directory, future_tag_regex, whitelist, timeout=timeout, retries=retries, rev=rev, paths=paths,
+        )
+    )
+
+
+def get_cached_futures(config: Config, cache: blobcache.BlobCache):
+    """Get all occurrences of FUTURE tags, searching only files whose
+    content is not in ``cache``.
+    """
+    def grep(paths):
+        if config.uses_scanner:
+            return config.get_scanner(config.rev).scan(paths).future_lines
+        return iter_future_lines(
+            config.path,
+            config.future_tag_regex,
+            (),  # whitelisted paths are not given
+            timeout=config.timeouts.grep,
+            retries=config.timeouts.retries,
+            rev=config.rev,
+            paths=paths,
+        )
+
+    blob_ids, modified = get_searched_blob_ids(config, config.rev)
+    # Lines found depend on whether tags are searched by Git or Python.
+    key = blobcache.get_key("futures", config.future_tag_regex, config.engine, IGNORE_PRAGMA)
+    return get_future_occurrences(get_blob_lines(cache, key, blob_ids, grep, modified))
+
+
+def _search_futures(config: Config):
+    """Return occurrences of FUTURE tags (by tag) and known tags."""
+    if config.uses_scanner:
+        known_tags = config.get_scanner(config.rev).scan().known_future_tags
+    else:
+        known_tags = grep_known_future_tags(config, config.rev)
+    if config.cache_file or (config.lists_searched_paths and not config.uses_scanner):
+        with blobcache.BlobCache(config.cache_file or ":memory:") as cache:
+            futures = get_cached_futures(config, cache)
+    elif config.uses_scanner:
+        futures = get_future_occurrences(config.get_scanner(config.rev).scan().future_lines)
+    else:
+        futures = get_all_futures(
+            config.path,
+            config.future_tag_regex,
+            config.whitelist,
+            timeout=config.timeouts.grep,
+            retries=config.timeouts.retries,
+            rev=config.rev,
+        )
+    return futures, known_tags
+
+
+def iter_orphan_futures(config, time_budget: budget.TimeBudget | None = None):
+    """Yield orphan FUTURE tags, each one as soon as its author is
+    known.
 
     A FUTURE tag is orphan if it does not also appear (elsewhere) on a
-    line with an annotation.
+    line with an annotation. If ``time_budget`` is given, orphan tags
+    are yielded until it is spent. If the ``cache_file`` option is set,
+    occurrences of FUTURE tags are only searched in files whose content
+    is not in the cache. If the ``engine`` option is "python", all tags
+    are searched in a single pass over files (see the ``scanner``
+    module). Pruned files (see ``Config.get_pruned_paths()``) are not
+    searched.
     """
-    known_tags = get_known_future_tags(
-        config.path,
-        fr'{config.ignored_orphans_annotations_regex}|{config.annotation_regex}',
-        config.future_tag_regex, config.whitelist,
-    )
-    futures = get_all_futures(config.path, config.future_tag_regex, config.whitelist)
-    orphans = []
-    for tag, occurrences in sorted(futures.items()):
-        if tag in known_tags:
+    try:
+        with profiling.phase("grep"):
+            futures, known_tags = _search_futures(_get_budget_config(config, time_budget))
+    except subprocess.TimeoutExpired:
+        if not (time_budget and time_budget.is_spent()):
+            raise
+        time_budget.stop()
+        return
+    orphans = [
+        occurrence
+        for tag, occurrences in sorted(futures.items())
+        if tag not in known_tags
+        for occurrence in sorted(occurrences, key=lambda occ: (occ.path, occ.line_no))
+    ]
+    if time_budget:
+        orphans = time_budget.iterate(orphans)
+    for occurrence in orphans:
+        try:
+            with profiling.phase("blame"):
+                last_committer_email, _last_modification = get_line_blame(
+                    occurrence.path,
+                    occurrence.line_no,
+                    cwd=config.path,
+                    timeout=config.timeouts.blame,
+                    retries=config.timeouts.retries,
+                    rev=config.rev,
+                )
+        except subprocess.TimeoutExpired:
+            # The tag is an orphan anyway, only its author is unknown.
+            yield occurrence
             continue
-        occurrences = sorted(occurrences, key=lambda occ: (occ.path, occ.line_no))
-        for occurrence in occurrences:
-            last_committer_email, _last_modification = get_line_blame(
-                occurrence.path, occurrence.line_no, cwd=config.path
-            )
-            occurrence.author = get_login_from_committer_email(last_committer_email)
-            orphans.append(occurrence)
-    return orphans
+        occurrence.author = get_login_from_committer_email(last_committer_email)
+        yield occurrence
+
+
+def get_orphan_futures(config, time_budget: budget.TimeBudget | None = None):
+    """Return orphan FUTURE tags (see ``iter_orphan_futures``)."""
+    return list(iter_orphan_futures(config, time_budget))
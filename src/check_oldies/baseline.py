@@ -0,0 +1,63 @@
+"""Baselines of accepted annotations.
+
+A legacy project may have thousands of annotations that nobody is
+going to fix soon. A baseline is a file that lists them, so that
+``check-fixmes`` only reports (and blames) annotations that are not
+in the baseline.
+
+Each line of a baseline file is the fingerprint of an annotation: its
+tag (e.g. "todo"), a hash of its normalized content and its path.
+Line numbers are not part of the fingerprint, so that an annotation
+is still in the baseline when lines are added above it. If the
+content of an annotation changes, it is not in the baseline anymore.
+A project may have identical annotations in the same file: their
+fingerprint is then listed once for each of them.
+"""
+
+import collections
+import hashlib
+import os
+import re
+import tempfile
+
+from . import commands
+
+
+HEADER = "# check-fixmes baseline, generated with `check-fixmes --update-baseline`.\n"
+WHITESPACES = re.compile(r"\s+")
+
+
+def get_fingerprint(path: str, line_content: str, tag: str) -> str:
+    normalized = WHITESPACES.sub(" ", line_content.strip())
+    content_hash = hashlib.sha1(normalized.encode("utf-8")).hexdigest()[:16]
+    # Each fingerprint is a line of a UTF-8 file.
+    path = commands.escape_path(path).replace("\n", "\\n")
+    return f"{tag} {content_hash} {path}"
+
+
+def read(path) -> collections.Counter:
+    """Return fingerprints of the baseline file at ``path`` (and the
+    number of annotations of each fingerprint).
+    """
+    fingerprints: collections.Counter = collections.Counter()
+    with open(path, encoding="utf-8") as fp:
+        for line in fp:
+            line = line.rstrip("\n")
+            if line and not line.startswith("#"):
+                fingerprints[line] += 1
+    return fingerprints
+
+
+def write(path, fingerprints):
+    """Write ``fingerprints`` (an iterable, possibly with duplicates)
+    to the baseline file at ``path``, sorted to ease reviews of its
+    changes (by path).
+    """
+    directory = os.path.dirname(os.path.abspath(path))
+    fd, tmp_path = tempfile.mkstemp(dir=directory, prefix=".baseline.", suffix=".tmp")
+    with os.fdopen(fd, "w", encoding="utf-8") as fp:
+        fp.write(HEADER)
+        for fingerprint in sorted(fingerprints, key=lambda f: (f.split(" ", 2)[2], f)):
+            fp.write(f"{fingerprint}\n")
+    os.chmod(tmp_path, 0o644)
+    os.replace(tmp_path, path)
@@ -0,0 +1,76 @@
+"""A persistent cache of lines found in each file content (blob).
+
+Searching annotations (or FUTURE tags) in a file only depends on its
+content and on the searched patterns. Between two runs, most files
+are unchanged, and vendored files are often shared by several
+repositories. The cache maps the blob id of a file (its content hash,
+as computed by Git) to the lines that a search found in it, so that
+only files with a new content have to be searched.
+
+Entries are stored under a key that is the hash of the searched
+patterns (see ``get_key()``): changing the configuration of
+annotations does not use stale results.
+"""
+
+import hashlib
+import json
+import sqlite3
+
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS blobs (
+    key TEXT NOT NULL,
+    blob_id TEXT NOT NULL,
+    lines TEXT NOT NULL,
+    PRIMARY KEY (key, blob_id)
+) WITHOUT ROWID;
+"""
+
+# Increment when the format of cached lines changes.
+VERSION = 2
+
+
+def get_key(*patterns) -> str:
+    """Return the key of a search of ``patterns``."""
+    text = "\0".join(str(pattern) for pattern in (VERSION, *patterns))
+    return hashlib.sha1(text.encode("utf-8")).hexdigest()
+
+
+class BlobCache:
+    """Store lines found in blobs in a SQLite database (in memory if
+    ``path`` is ":memory:").
+
+    Use it as a context manager, so that new entries are committed
+    when done.
+    """
+
+    def __init__(self, path):
+        self.connection = sqlite3.connect(path)
+        self.connection.executescript(SCHEMA)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, *exc_info):
+        if exc_type is not None:
+            self.connection.rollback()
+        self.close()
+
+    def close(self):
+        self.connection.commit()
+        self.connection.close()
+
+    def get(self, key: str, blob_id: str) -> list[str] | None:
+        """Return lines found in the blob, or None if it is not in the
+        cache.
+        """
+        row = self.connection.execute(
+            "SELECT lines FROM blobs WHERE key = ? AND blob_id = ?", (key, blob_id)
+        ).fetchone()
+        return json.loads(row[0]) if row else None
+
+    def set(self, key: str, blob_id: str, lines: list[str]):
+        self.connection.execute(
+            "INSERT OR REPLACE INTO blobs (key, blob_id, lines) VALUES (?, ?, ?)",
+            (key, blob_id, json.dumps(lines)),
+        )
@@ -3,12 +3,16 @@ import datetime
 import os
 import pathlib
 import re
+import subprocess
 import typing
 import urllib.parse
 
+from . import budget
 from . import commands
+from . import configuration
 from . import githost
 from . import output
+from . import profiling
 
 
 TODAY = datetime.date.today()
@@ -42,8 +46,16 @@ class Config:
     max_age: int = 90
 
     output_format: output.OutputFormat = output.OutputFormat.TEXT
+    output_file: str = ""
     colorize_errors: bool = True
     only_old: bool = False
+    stream: bool = False
+    profile: str = ""
+    metrics_file: str = ""
+    history_file: str = ""
+    fail_fast: bool = False
+    time_budget: float = 0  # seconds, 0 means no limit
+    timeouts: dict = dataclasses.field(default_factory=dict)
 
     calm_branches: typing.Sequence = ("gh-pages", "master", "main", "prod", "maint(enance)?/.*")
     ignore_branches_without_pull_request: bool = False
@@ -57,6 +69,7 @@ class Config:
     repo_name: str = ""
 
     def __post_init__(self):
+        self.timeouts = commands.Timeouts(**self.timeouts)
         if self.host_api_access:
             self.host_api_access = GitHostApiAccessInfo(**self.host_api_access)
 
@@ -80,6 +93,11 @@ class Config:
             else:
                 self.platform = "github"  # non-breaking change: keep the previous default value
 
+    @property
+    def oldest_first(self):
+        """Whether the oldest branches should be evaluated first."""
+        return self.fail_fast or bool(self.time_budget)
+
     def ignore_branch(self, branch):
         for calm_branch_regexp in self.calm_branches:
             if re.match(calm_branch_regexp, branch):
@@ -99,10 +117,15 @@ class BranchInfo:
     age: int
     is_old: bool
     pull_request: githost.PullRequestInfo | None = None
+    timed_out: bool = False  # if the age or the pull request could not be retrieved in time
 
     @property
     def must_warn(self):
-        return self.is_old
+        return self.is_old or self.timed_out
+
+    @property
+    def location(self):
+        return self.name
 
     @property
     def name_and_details(self):
@@ -113,9 +136,8 @@ class BranchInfo:
         return details
 
     def to_text(self):
-        return (
-            f"{self.author[:30]: <30} - {self.age: >4} days - {self.name_and_details}"
-        )
+        age = " TIMEOUT " if self.timed_out else f"{self.age: >4} days"
+        return f"{self.author[:30]: <30} - {age} - {self.name_and_details}"
 
     def to_dict(self):
         return {
@@ -123,6 +145,7 @@ class BranchInfo:
             "author": self.author,
             "age": self.age,
             "is_old": self.is_old,
+            "timed_out": self.timed_out,
             "url": self.url,
             "pull_request_number": self.pull_request.number if self.pull_request else None,
             "pull_request_state": self.pull_request.state if self.pull_request else None,
@@ -155,44 +178,93 @@ def get_repository_info(path):
     raise ValueError(f"Could not parse remote origin and determine the Git host: '{remote_url}'")
 
 
-def get_branches(config: Config):
-    branches = []
-    for branch in commands.get_output(("git", "branch", "--remotes"), cwd=config.path):
+def iter_branches(config: Config, time_budget: budget.TimeBudget | None = None):
+    """Yield branches, each one as soon as its age (and the linked pull
+    request, if configured) is known.
+
+    If the ``fail_fast`` or ``time_budget`` option is set, the oldest
+    branches come first. If ``time_budget`` is given, branches are
+    yielded until it is spent.
+    """
+    pr_getter = None
+    if config.host_api_access:
+        pr_getter = githost.PullRequestGetter(
+            config.platform,
+            config.host_owner,
+            config.host_api_access,
+            timeout=config.timeouts.api,
+            retries=config.timeouts.retries,
+        )
+
+    # Branches of a bare repository (e.g. a mirror) are those of
+    # origin, as local branches.
+    bare = configuration.is_bare_repository(config.path)
+    prefix = "" if bare else "origin/"
+    with profiling.phase("list branches"):
+        if config.oldest_first or bare:
+            all_branches = commands.get_output(
+                ["git", "for-each-ref"]
+                + (["--sort=committerdate"] if config.oldest_first else [])
+                + [
+                    "--format=%(refname:short)",
+                    "refs/heads/" if bare else "refs/remotes/origin/",
+                ],
+                cwd=config.path,
+            )
+        else:
+            all_branches = commands.get_output(("git", "branch", "--remotes"), cwd=config.path)
+    candidates = []
+    for branch in all_branches:
         branch = branch.strip()
-        if not branch.startswith("origin/"):
+        if not branch.startswith(prefix):
             continue
-        branch = branch.strip()[len("origin/") :]
-        if config.ignore_branch(branch) or "->" in branch:
+        branch = branch.strip()[len(prefix) :]
+        if config.ignore_branch(branch) or "->" in branch or branch == "HEAD":
+            continue
+        candidates.append(branch)
+    if time_budget:
+        candidates = time_budget.iterate(candidates)
+
+    for branch in candidates:
+        info = BranchInfo(
+            repo=config.repo_name,
+            name=branch,
+            url=config.get_branch_url(branch=branch),
+            author="",
+            age=0,
+            is_old=False,
+        )
+        try:
+            with profiling.phase("log"):
+                out = commands.get_output(
+                    ("git", "log", f"{prefix}{branch}", "-1", "--format=%ae %ci"),
+                    cwd=config.path,
+                    timeout=config.timeouts.log,
+                    retries=config.timeouts.retries,
+                )[0]
+        except subprocess.TimeoutExpired:
+            # Report it (as an error) instead of blocking or aborting the run.
+            info.timed_out = True
+            yield info
             continue
-        out = commands.get_output(
-            ("git", "log", f"origin/{branch}", "-1", "--format=%ae %ci"),
-            cwd=config.path,
-        )[0]
         # line looks like "john.smith@mail.test 2018-12-19 14:18:52 +0100"
         email, date, *_rest = out.split(" ")
         date = datetime.date(*[int(s) for s in date.split("-")])
-        age = (TODAY - date).days
-        branches.append(
-            BranchInfo(
-                repo=config.repo_name,
-                name=branch,
-                url=config.get_branch_url(branch=branch),
-                author=email,
-                age=age,
-                is_old=age > config.max_age,
-            )
-        )
+        info.author = email
+        info.age = (TODAY - date).days
+        info.is_old = info.age > config.max_age
+        if pr_getter:
+            try:
+                with profiling.phase("host API"):
+                    info.pull_request = pr_getter.get_pull_request(config.repo_name, info.name)
+            except githost.TIMEOUT_ERRORS as exc:
+                if not githost.is_timeout(exc):
+                    raise
+                info.timed_out = True
+        if config.ignore_branches_without_pull_request and not info.pull_request and not info.timed_out:
+            continue
+        yield info
 
-    if not branches:
-        return []
 
-    if config.host_api_access:
-        pr_getter = githost.PullRequestGetter(config.platform, config.host_owner, config.host_api_access)
-        for branch in branches:
-            branch.pull_request = pr_getter.get_pull_request(config.repo_name, branch.name)
-
-    return [
-        branch
-        for branch in branches
-        if not config.ignore_branches_without_pull_request or branch.pull_request
-    ]
+def get_branches(config: Config, time_budget: budget.TimeBudget | None = None):
+    return list(iter_branches(config, time_budget))
@@ -0,0 +1,73 @@
+import dataclasses
+import time
+import typing
+
+
+class TimeBudget:
+    """Limit the time spent evaluating candidates (e.g. blaming lines
+    of annotations).
+
+    The budget starts when the object is created. ``seconds=0`` means
+    that the budget is unlimited. Candidates given to ``iterate()`` are
+    yielded until the budget is spent: the caller should hence give
+    the most important ones first.
+    """
+
+    def __init__(self, seconds: float = 0):
+        self.seconds = seconds
+        self.deadline = time.monotonic() + seconds if seconds else None
+        self.total = 0
+        self.evaluated = 0
+        self.is_exhausted = False
+        self.is_stopped = False
+
+    def is_spent(self):
+        return self.deadline is not None and time.monotonic() >= self.deadline
+
+    def get_timeout(self, timeout: float) -> float:
+        """Return ``timeout`` (in seconds, 0 means no timeout),
+        shortened so that a command does not run after the budget is
+        spent.
+        """
+        if self.deadline is None:
+            return timeout
+        remaining = max(self.deadline - time.monotonic(), 0.001)  # 0 would mean no timeout
+        return min(timeout, remaining) if timeout else remaining
+
+    def limit_timeouts(self, timeouts):
+        """Return a copy of ``timeouts`` (see ``commands.Timeouts``)
+        where searches (``git grep`` and ``git log``) do not run after
+        the budget is spent. They are not run again if they time out.
+        """
+        if self.deadline is None:
+            return timeouts
+        return dataclasses.replace(
+            timeouts,
+            grep=self.get_timeout(timeouts.grep),
+            log=self.get_timeout(timeouts.log),
+            retries=0,
+        )
+
+    def stop(self):
+        """Mark the budget as exhausted before candidates are known,
+        e.g. because searching them took too long.
+        """
+        self.is_exhausted = True
+        self.is_stopped = True
+
+    def iterate(self, candidates: typing.Sequence) -> typing.Iterator:
+        self.total += len(candidates)
+        for candidate in candidates:
+            if self.is_spent():
+                self.is_exhausted = True
+                return
+            self.evaluated += 1
+            yield candidate
+
+    def get_message(self, noun: str) -> str:
+        if self.is_stopped:
+            return f"Incomplete: {noun} could not be searched within the time budget of {self.seconds:g} seconds."
+        return (
+            f"Incomplete: {self.evaluated} of {self.total} {noun} evaluated "
+            f"within the time budget of {self.seconds:g} seconds."
+        )
@@ -4,8 +4,12 @@ import sys
 
 import check_oldies.branches
 
+from . import budget
 from . import configuration
+from . import history
+from . import metrics
 from . import output
+from . import profiling
 
 
 def get_parser():
@@ -35,6 +39,10 @@ def get_parser():
         choices=sorted(output.OutputFormat),
         type=output.OutputFormat,
     )
+    parser.add_argument(
+        "--output-file",
+        help="Path of the file to write the output to. Defaults to the standard output.",
+    )
     parser.add_argument(
         "--max-age",
         type=int,
@@ -49,6 +57,24 @@ def get_parser():
         default=False,
         help="Show only old branches. By default, the command shows all branches."
     )
+    parser.add_argument(
+        "--fail-fast",
+        action="store_true",
+        default=None,
+        help=(
+            "Stop at the first old branch and show only this one. "
+            "The oldest branches are checked first."
+        ),
+    )
+    parser.add_argument(
+        "--stream",
+        action="store_true",
+        default=None,
+        help=(
+            "Show branches as soon as they are found, instead of sorting them. "
+            "The final status is shown last."
+        ),
+    )
     parser.add_argument(
         "--no-color",
         action="store_false",
@@ -56,41 +82,124 @@ def get_parser():
         dest="colorize_errors",
         help="Do not colorize errors. Defaults to colorizing errors in red.",
     )
+    parser.add_argument(
+        "--metrics-file",
+        help=(
+            "Path of an OpenMetrics text file to write metrics to "
+            "(e.g. for the textfile collector of the Prometheus node exporter)."
+        ),
+    )
+    parser.add_argument(
+        "--history-file",
+        help=(
+            "Path of a SQLite database where results of each run are recorded, "
+            "to follow trends with check-oldies-report."
+        ),
+    )
+    parser.add_argument(
+        "--time-budget",
+        type=float,
+        metavar="SECONDS",
+        help=(
+            "Stop evaluating branches when this time is spent, and show partial results. "
+            "The oldest branches are evaluated first. By default, there is no limit."
+        ),
+    )
+    parser.add_argument(
+        "--profile",
+        nargs="?",
+        const="-",
+        metavar="JSON_FILE",
+        help=(
+            "Report durations of each phase, subprocess and request. "
+            "The report is written to the standard error, or to JSON_FILE if given."
+        ),
+    )
     return parser
 
 
+def get_messages(tally, time_budget):
+    """Return OK and error messages."""
+    errors = []
+    if tally.warnings > tally.timeouts:
+        errors.append("Some branches are too old.")
+    if tally.timeouts:
+        errors.append("Some branches could not be checked in time.")
+    if time_budget.is_exhausted:
+        errors.append(time_budget.get_message("branches"))
+    if tally.warnings:
+        return "", "NOK: " + " ".join(errors)
+    if errors:
+        return "", " ".join(errors)
+    return "OK: All branches are fresh.", ""
+
+
 def main():
+    profiling.reset()
     parser = get_parser()
     config = configuration.get_config(
         "check-branches", parser, sys.argv[1:], check_oldies.branches.Config
     )
     if not configuration.is_git_directory(config.path):
         sys.exit(f'Invalid path: "{config.path}" is not a Git repository.')
+    time_budget = budget.TimeBudget(config.time_budget)
 
-    branches = check_oldies.branches.get_branches(config)
+    collector = metrics.Metrics("check-branches")
+    branches = collector.track_branches(
+        metrics.get_repository_name(config.path),
+        check_oldies.branches.iter_branches(config, time_budget),
+        config.max_age,
+    )
+    history_store = None
+    if config.history_file:
+        history_store = history.History(config.history_file)
+        run_id = history_store.start_run(
+            "check-branches",
+            metrics.get_repository_name(config.path),
+            history.get_revision(config.path),
+        )
+        branches = history_store.track_branches(run_id, branches, config.max_age)
     if config.only_old:
-        branches = [branch for branch in branches if branch.is_old]
-    branches.sort(key=lambda branch: (branch.author, -branch.age, branch.name))
-    has_old_branches = any(branch for branch in branches if branch.is_old)
+        branches = (branch for branch in branches if branch.is_old)
+    tally = output.Tally()
+    branches = tally.track(branches)
+    if config.fail_fast:
+        branches = output.first_warning(branches)
 
-    ok_msg = err_msg = ""
-    if has_old_branches:
-        err_msg = "NOK: Some branches are too old."
+    printer_options = {
+        "output_file": config.output_file,
+        "colorize_errors": config.colorize_errors,
+        "xunit_suite_name": "check-branches",
+        "xunit_case_name": "branches",
+        "xunit_class_name": "CheckBranches",
+    }
+    if config.stream:
+        output.stream_printer(
+            branches,
+            config.output_format,
+            get_messages=lambda: get_messages(tally, time_budget),
+            **printer_options,
+        )
     else:
-        ok_msg = "OK: All branches are fresh."
-
-    output.printer(
-        branches,
-        config.output_format,
-        ok_message=ok_msg,
-        error_message=err_msg,
-        colorize_errors=config.colorize_errors,
-        xunit_suite_name="check-branches",
-        xunit_case_name="branches",
-        xunit_class_name="CheckBranches",
-    )
+        branches = sorted(branches, key=lambda branch: (branch.author, -branch.age, branch.name))
+        ok_msg, err_msg = get_messages(tally, time_budget)
+        with profiling.phase("output"):
+            output.printer(
+                branches,
+                config.output_format,
+                ok_message=ok_msg,
+                error_message=err_msg,
+                **printer_options,
+            )
 
-    sys.exit(os.EX_DATAERR if has_old_branches else os.EX_OK)
+    if history_store is not None:
+        history_store.close()
+    profiling.report(config.profile)
+    metrics.write(config.metrics_file, collector, profiling.current)
+    if tally.warnings:
+        sys.exit(os.EX_DATAERR)
+    # Partial results without errors are not a success.
+    sys.exit(os.EX_TEMPFAIL if time_budget.is_exhausted else os.EX_OK)
 
 
 if __name__ == "__main__":  # pragma: no cover
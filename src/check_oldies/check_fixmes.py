@@ -4,8 +4,13 @@ import sys
 
 import check_oldies.annotations
 
+from . import budget
 from . import configuration
+from . import history
+from . import metrics
 from . import output
+from . import profiling
+from . import scanner
 
 
 def get_parser():
@@ -27,6 +32,22 @@ def get_parser():
             "Defaults to the working directory."
         ),
     )
+    parser.add_argument(
+        "--rev",
+        help=(
+            "Search annotations in this revision (e.g. a branch, a tag or a commit hash) "
+            "instead of the working tree. Defaults to HEAD in a bare repository."
+        ),
+    )
+    parser.add_argument(
+        "--ref",
+        action="append",
+        dest="refs",
+        help=(
+            "Search annotations in this ref (e.g. a release branch). Can be given more "
+            "than once, to search several refs in one run. Overrides --rev."
+        ),
+    )
     parser.add_argument(
         "--format",
         default=output.OutputFormat.TEXT,
@@ -35,6 +56,10 @@ def get_parser():
         choices=sorted(output.OutputFormat),
         type=output.OutputFormat,
     )
+    parser.add_argument(
+        "--output-file",
+        help="Path of the file to write the output to. Defaults to the standard output.",
+    )
     parser.add_argument(
         "--max-age",
         type=int,
@@ -49,6 +74,37 @@ def get_parser():
         default=False,
         help="Show only old annotations. By default, the command shows all annotations."
     )
+    parser.add_argument(
+        "--fail-fast",
+        action="store_true",
+        default=None,
+        help=(
+            "Stop at the first old annotation and show only this one. "
+            "The oldest files are checked first."
+        ),
+    )
+    parser.add_argument(
+        "--stream",
+        action="store_true",
+        default=None,
+        help=(
+            "Show annotations as soon as they are found, instead of sorting them. "
+            "The final status is shown last."
+        ),
+    )
+    parser.add_argument(
+        "--baseline",
+        help=(
+            "Path of a baseline file. Annotations listed in this file are "
+            "neither checked nor reported."
+        ),
+    )
+    parser.add_argument(
+        "--update-baseline",
+        action="store_true",
+        default=None,
+        help="Write all current annotations to the baseline file, and exit.",
+    )
     parser.add_argument(
         "--no-color",
         action="store_false",
@@ -56,44 +112,171 @@ def get_parser():
         dest="colorize_errors",
         help="Do not colorize errors. Defaults to colorizing errors in red.",
     )
+    parser.add_argument(
+        "--metrics-file",
+        help=(
+            "Path of an OpenMetrics text file to write metrics to "
+            "(e.g. for the textfile collector of the Prometheus node exporter)."
+        ),
+    )
+    parser.add_argument(
+        "--cache-file",
+        help=(
+            "Path of a SQLite database where lines found in each file content are cached, "
+            "so that only new file contents are searched on the next runs."
+        ),
+    )
+    parser.add_argument(
+        "--whitelist-file",
+        help=(
+            "Path of a file of whitelist patterns (one per line, or separated by NUL bytes), "
+            "in addition to the whitelist option."
+        ),
+    )
+    parser.add_argument(
+        "--max-file-size",
+        type=int,
+        metavar="BYTES",
+        help="Do not search files that are larger than this size. By default, there is no limit.",
+    )
+    parser.add_argument(
+        "--engine",
+        help=(
+            "How files are searched: with git grep (the default), "
+            "or with a parallel scanner that searches all annotations in a single pass."
+        ),
+        choices=sorted(scanner.Engine),
+        type=scanner.Engine,
+    )
+    parser.add_argument(
+        "--history-file",
+        help=(
+            "Path of a SQLite database where results of each run are recorded, "
+            "to follow trends with check-oldies-report."
+        ),
+    )
+    parser.add_argument(
+        "--time-budget",
+        type=float,
+        metavar="SECONDS",
+        help=(
+            "Stop evaluating annotations when this time is spent, and show partial results. "
+            "Annotations of the oldest files are evaluated first. By default, there is no limit."
+        ),
+    )
+    parser.add_argument(
+        "--profile",
+        nargs="?",
+        const="-",
+        metavar="JSON_FILE",
+        help=(
+            "Report durations of each phase, subprocess and request. "
+            "The report is written to the standard error, or to JSON_FILE if given."
+        ),
+    )
     return parser
 
 
+def get_messages(tally, time_budget):
+    """Return OK and error messages."""
+    errors = []
+    if tally.warnings > tally.timeouts:
+        errors.append("Some annotations are too old.")
+    if tally.timeouts:
+        errors.append("Some annotations could not be checked in time.")
+    if time_budget.is_exhausted:
+        errors.append(time_budget.get_message("annotations"))
+    if tally.warnings:
+        return "", "NOK: " + " ".join(errors)
+    if errors:
+        return "", " ".join(errors)
+    if tally.count:
+        return "OK: All annotations are fresh.", ""
+    return "OK: No annotations were found.", ""
+
+
 def main():
+    profiling.reset()
     parser = get_parser()
     config = configuration.get_config(
         "check-fixmes", parser, sys.argv[1:], check_oldies.annotations.Config
     )
     if not configuration.is_git_directory(config.path):
         sys.exit(f'Invalid path: "{config.path}" is not a Git repository.')
+    if not config.rev and configuration.is_bare_repository(config.path):
+        config.rev = "HEAD"  # there is no working tree to search
+    time_budget = budget.TimeBudget(config.time_budget)
 
-    annotations = check_oldies.annotations.get_annotations(config)
+    if config.update_baseline:
+        if not config.baseline:
+            sys.exit("The --update-baseline argument requires a baseline file (see --baseline).")
+        count = check_oldies.annotations.update_baseline(config)
+        print(f"Wrote {count} annotation(s) to {config.baseline}.")
+        sys.exit(os.EX_OK)
+    if config.baseline and not os.path.exists(config.baseline):
+        sys.exit(
+            f'Invalid baseline: "{config.baseline}" does not exist. '
+            f'Create it with --update-baseline.'
+        )
+
+    collector = metrics.Metrics("check-fixmes")
+    annotations = collector.track_annotations(
+        metrics.get_repository_name(config.path),
+        check_oldies.annotations.iter_annotations(config, time_budget),
+        config.max_age,
+    )
+    history_store = None
+    if config.history_file:
+        history_store = history.History(config.history_file)
+        run_id = history_store.start_run(
+            "check-fixmes",
+            metrics.get_repository_name(config.path),
+            history.get_revision(config.path, config.rev),
+        )
+        annotations = history_store.track_annotations(
+            run_id, annotations, config.max_age, config.get_tag
+        )
     if config.only_old:
-        annotations = [a for a in annotations if a.is_old]
-    annotations.sort(key=lambda f: (f.assignee, -f.age, f.path, f.line_no))
-    has_old_annotations = any(ann for ann in annotations if ann.is_old)
+        annotations = (a for a in annotations if a.is_old)
+    tally = output.Tally()
+    annotations = tally.track(annotations)
+    if config.fail_fast:
+        annotations = output.first_warning(annotations)
 
-    ok_msg = err_msg = ""
-    if has_old_annotations:
-        err_msg = "NOK: Some annotations are too old."
+    printer_options = {
+        "output_file": config.output_file,
+        "colorize_errors": config.colorize_errors,
+        "xunit_suite_name": "check-fixmes",
+        "xunit_case_name": "fixmes",
+        "xunit_class_name": "CheckFixmes",
+    }
+    if config.stream:
+        output.stream_printer(
+            annotations,
+            config.output_format,
+            get_messages=lambda: get_messages(tally, time_budget),
+            **printer_options,
+        )
     else:
-        if annotations:
-            ok_msg = "OK: All annotations are fresh."
-        else:
-            ok_msg = "OK: No annotations were found."
-
-    output.printer(
-        annotations,
-        config.output_format,
-        ok_message=ok_msg,
-        error_message=err_msg,
-        colorize_errors=config.colorize_errors,
-        xunit_suite_name="check-fixmes",
-        xunit_case_name="fixmes",
-        xunit_class_name="CheckFixmes",
-    )
+        annotations = sorted(annotations, key=lambda f: (f.assignee, -f.age, f.path, f.line_no, f.ref))
+        ok_msg, err_msg = get_messages(tally, time_budget)
+        with profiling.phase("output"):
+            output.printer(
+                annotations,
+                config.output_format,
+                ok_message=ok_msg,
+                error_message=err_msg,
+                **printer_options,
+            )
 
-    sys.exit(os.EX_DATAERR if has_old_annotations else os.EX_OK)
+    if history_store is not None:
+        history_store.close()
+    profiling.report(config.profile)
+    metrics.write(config.metrics_file, collector, profiling.current)
+    if tally.warnings:
+        sys.exit(os.EX_DATAERR)
+    # Partial results without errors are not a success.
+    sys.exit(os.EX_TEMPFAIL if time_budget.is_exhausted else os.EX_OK)
 
 
 if __name__ == "__main__":  # pragma: no cover
@@ -3,8 +3,13 @@ import os
 import sys
 
 from . import annotations
+from . import budget
 from . import configuration
+from . import history
+from . import metrics
 from . import output
+from . import profiling
+from . import scanner
 
 
 def get_parser():
@@ -26,6 +31,13 @@ def get_parser():
             "Defaults to the working directory."
         ),
     )
+    parser.add_argument(
+        "--rev",
+        help=(
+            "Search FUTURE tags in this revision (e.g. a branch, a tag or a commit hash) "
+            "instead of the working tree. Defaults to HEAD in a bare repository."
+        ),
+    )
     parser.add_argument(
         "--no-color",
         action="store_false",
@@ -41,37 +53,156 @@ def get_parser():
         choices=sorted(output.OutputFormat),
         type=output.OutputFormat,
     )
+    parser.add_argument(
+        "--output-file",
+        help="Path of the file to write the output to. Defaults to the standard output.",
+    )
+    parser.add_argument(
+        "--stream",
+        action="store_true",
+        default=None,
+        help=(
+            "Show orphan FUTURE tags as soon as they are found. "
+            "The final status is shown last."
+        ),
+    )
+    parser.add_argument(
+        "--metrics-file",
+        help=(
+            "Path of an OpenMetrics text file to write metrics to "
+            "(e.g. for the textfile collector of the Prometheus node exporter)."
+        ),
+    )
+    parser.add_argument(
+        "--cache-file",
+        help=(
+            "Path of a SQLite database where lines found in each file content are cached, "
+            "so that only new file contents are searched on the next runs."
+        ),
+    )
+    parser.add_argument(
+        "--whitelist-file",
+        help=(
+            "Path of a file of whitelist patterns (one per line, or separated by NUL bytes), "
+            "in addition to the whitelist option."
+        ),
+    )
+    parser.add_argument(
+        "--max-file-size",
+        type=int,
+        metavar="BYTES",
+        help="Do not search files that are larger than this size. By default, there is no limit.",
+    )
+    parser.add_argument(
+        "--engine",
+        help=(
+            "How files are searched: with git grep (the default), "
+            "or with a parallel scanner that searches all FUTURE tags in a single pass."
+        ),
+        choices=sorted(scanner.Engine),
+        type=scanner.Engine,
+    )
+    parser.add_argument(
+        "--history-file",
+        help=(
+            "Path of a SQLite database where results of each run are recorded, "
+            "to follow trends with check-oldies-report."
+        ),
+    )
+    parser.add_argument(
+        "--time-budget",
+        type=float,
+        metavar="SECONDS",
+        help=(
+            "Stop evaluating FUTURE tags when this time is spent, and show partial results. "
+            "By default, there is no limit."
+        ),
+    )
+    parser.add_argument(
+        "--profile",
+        nargs="?",
+        const="-",
+        metavar="JSON_FILE",
+        help=(
+            "Report durations of each phase, subprocess and request. "
+            "The report is written to the standard error, or to JSON_FILE if given."
+        ),
+    )
     return parser
 
 
+def get_messages(tally, time_budget):
+    """Return OK and error messages."""
+    incomplete = time_budget.get_message("orphan FUTURE tags") if time_budget.is_exhausted else ""
+    if tally.count:
+        return "", f"NOK: There are orphan FUTURE tags. {incomplete}".rstrip()
+    if incomplete:
+        return "", incomplete
+    return "OK: No orphan FUTURE tags were found.", ""
+
+
 def main():
+    profiling.reset()
     parser = get_parser()
     config = configuration.get_config(
         "check-future-tags", parser, sys.argv[1:], annotations.Config
     )
     if not configuration.is_git_directory(config.path):
         sys.exit(f'Invalid path: "{config.path}" is not a Git repository.')
+    if not config.rev and configuration.is_bare_repository(config.path):
+        config.rev = "HEAD"  # there is no working tree to search
+    time_budget = budget.TimeBudget(config.time_budget)
 
-    orphan_futures = annotations.get_orphan_futures(config)
+    tally = output.Tally()
+    collector = metrics.Metrics("check-future-tags")
+    orphan_futures = collector.track_orphan_futures(
+        metrics.get_repository_name(config.path), annotations.iter_orphan_futures(config, time_budget)
+    )
+    history_store = None
+    if config.history_file:
+        history_store = history.History(config.history_file)
+        run_id = history_store.start_run(
+            "check-future-tags",
+            metrics.get_repository_name(config.path),
+            history.get_revision(config.path, config.rev),
+        )
+        orphan_futures = history_store.track_orphan_futures(run_id, orphan_futures)
+    orphan_futures = tally.track(orphan_futures)
 
-    ok_msg = err_msg = ""
-    if orphan_futures:
-        err_msg = "NOK: There are orphan FUTURE tags."
+    printer_options = {
+        "output_file": config.output_file,
+        "colorize_errors": config.colorize_errors,
+        "xunit_suite_name": "check-future-tags",
+        "xunit_case_name": "future-tags",
+        "xunit_class_name": "CheckFutureTags",
+    }
+    if config.stream:
+        output.stream_printer(
+            orphan_futures,
+            config.output_format,
+            get_messages=lambda: get_messages(tally, time_budget),
+            **printer_options,
+        )
     else:
-        ok_msg = "OK: No orphan FUTURE tags were found."
-
-    output.printer(
-        orphan_futures,
-        config.output_format,
-        ok_message=ok_msg,
-        error_message=err_msg,
-        colorize_errors=config.colorize_errors,
-        xunit_suite_name="check-future-tags",
-        xunit_case_name="future-tags",
-        xunit_class_name="CheckFutureTags",
-    )
+        orphan_futures = list(orphan_futures)
+        ok_msg, err_msg = get_messages(tally, time_budget)
+        with profiling.phase("output"):
+            output.printer(
+                orphan_futures,
+                config.output_format,
+                ok_message=ok_msg,
+                error_message=err_msg,
+                **printer_options,
+            )
 
-    sys.exit(os.EX_DATAERR if orphan_futures else os.EX_OK)
+    if history_store is not None:
+        history_store.close()
+    profiling.report(config.profile)
+    metrics.write(config.metrics_file, collector, profiling.current)
+    if tally.count:
+        sys.exit(os.EX_DATAERR)
+    # Partial results without errors are not a success.
+    sys.exit(os.EX_TEMPFAIL if time_budget.is_exhausted else os.EX_OK)
 
 
 if __name__ == "__main__":  # pragma: no cover
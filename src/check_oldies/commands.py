@@ -1,50 +1,414 @@
+import atexit
+import codecs
+import dataclasses
 import os
 import pathlib
+import signal
 import subprocess
+import threading
+import time
 import typing
 
+from . import profiling
 
-def get_output(cmd_list, cwd, valid_return_codes=(0,)):
-    """Return command output as a list of non-empty lines."""
-    res = subprocess.run(
+
+# The hash of an empty tree, which exists in all repositories.
+EMPTY_TREE = "4b825dc642cb6eb9a060e54bf8d69288fbee4904"
+
+
+@dataclasses.dataclass
+class Timeouts:
+    """Timeouts (in seconds) of each type of operation. 0 means no
+    timeout.
+    """
+    grep: float = 600
+    blame: float = 60
+    log: float = 60
+    api: float = 30
+    retries: int = 1  # number of retries of an operation that timed out
+
+
+def _kill_process_group(process):
+    # Commands are started in their own process group (see
+    # ``start_new_session`` below), so that children (e.g. processes
+    # spawned by ``git``) are killed too.
+    try:
+        os.killpg(process.pid, signal.SIGKILL)
+    except ProcessLookupError:  # pragma: no cover
+        pass
+
+
+def _run(cmd_list, cwd, timeout, encoding="utf-8", input_data=None):
+    with subprocess.Popen(
         cmd_list,
         cwd=cwd,
-        capture_output=True,
-        check=False,
-        encoding="utf-8",
-    )
-    if res.returncode not in valid_return_codes:
+        stdin=subprocess.PIPE if input_data is not None else None,
+        stdout=subprocess.PIPE,
+        stderr=subprocess.PIPE,
+        encoding=encoding,
+        start_new_session=True,
+    ) as process:
+        try:
+            stdout, stderr = process.communicate(input_data, timeout=timeout or None)
+        except subprocess.TimeoutExpired:
+            _kill_process_group(process)
+            process.communicate()
+            raise
+    return process.returncode, stdout, stderr
+
+
+def _get_stdout(cmd_list, cwd, valid_return_codes, timeout, retries, encoding, input_data=None):
+    for attempt in range(retries + 1):
+        start = time.perf_counter()
+        try:
+            returncode, stdout, stderr = _run(cmd_list, cwd, timeout, encoding, input_data)
+        except subprocess.TimeoutExpired:
+            profiling.record("command timeout", " ".join(cmd_list), time.perf_counter() - start)
+            if attempt == retries:
+                raise
+            continue
+        profiling.record("command", " ".join(cmd_list), time.perf_counter() - start, len(stdout))
+        break
+    if returncode not in valid_return_codes:
         raise subprocess.CalledProcessError(
-            res.returncode,
+            returncode,
             cmd_list,
-            res.stdout,
-            res.stderr,
+            stdout,
+            stderr,
         )
-    return [line for line in res.stdout.split(os.linesep) if line]
+    return stdout
 
 
-def get_pipe_command_output(
-    base_cmd_list: list[str],
-    piped_to: list[str],
-    cwd: pathlib.Path,
-    valid_return_codes: typing.Iterable[int] = (0,),
-) -> list[str]:
-    """Return output of ``base_cmd_list | piped_to`` as a list of
-    non-empty lines.
+def get_output(cmd_list, cwd, valid_return_codes=(0,), timeout=0, retries=0):
+    """Return command output as a list of non-empty lines.
+
+    If the command does not finish within ``timeout`` seconds, it is
+    killed and run again, up to ``retries`` times. Then
+    ``subprocess.TimeoutExpired`` is raised.
     """
+    stdout = _get_stdout(cmd_list, cwd, valid_return_codes, timeout, retries, encoding="utf-8")
+    return [line for line in stdout.split(os.linesep) if line]
+
+
+def get_raw_output(cmd_list, cwd, valid_return_codes=(0,), timeout=0, retries=0, input_data=None) -> bytes:
+    """Return command output as bytes, e.g. to parse NUL-separated
+    output (see ``get_output()`` for ``timeout`` and ``retries``).
+    ``input_data`` (bytes) is written to the standard input of the command.
+    """
+    return _get_stdout(cmd_list, cwd, valid_return_codes, timeout, retries, encoding=None, input_data=input_data)
+
+
+def iter_output(cmd_list, cwd, valid_return_codes=(0,), timeout=0, retries=0) -> typing.Iterator[bytes]:
+    """Yield non-empty lines of the command output (as bytes, without
+    line separators) as soon as they are read, so that callers can
+    process them while the command runs, without holding the whole
+    output in memory.
+
+    The standard error is read in the background, and the return code
+    is checked once the whole output has been read. If the command
+    does not finish within ``timeout`` seconds, it is killed and run
+    again, up to ``retries`` times, but only if no line has been
+    yielded yet. Then ``subprocess.TimeoutExpired`` is raised. If the
+    caller stops iterating, the command is killed.
+    """
+    description = " ".join(cmd_list)
+    for attempt in range(retries + 1):
+        start = time.perf_counter()
+        timed_out = threading.Event()
+        bytes_read = 0
+        stderr = []
+        with subprocess.Popen(
+            cmd_list,
+            cwd=cwd,
+            stdout=subprocess.PIPE,
+            stderr=subprocess.PIPE,
+            start_new_session=True,
+        ) as process:
+
+            def kill(process=process, timed_out=timed_out):
+                timed_out.set()
+                _kill_process_group(process)
+
+            # Read the standard error in the background, so that the
+            # command does not block if it writes a lot to it.
+            reader = threading.Thread(
+                target=lambda process=process, stderr=stderr: stderr.append(process.stderr.read()),
+                daemon=True,
+            )
+            reader.start()
+            watchdog = threading.Timer(timeout, kill)
+            if timeout:
+                watchdog.start()
+            try:
+                for line in process.stdout:
+                    bytes_read += len(line)
+                    if line.endswith(b"\n"):
+                        line = line[:-1]
+                    if line:
+                        yield line
+                process.wait()
+            finally:
+                watchdog.cancel()
+                if process.poll() is None:  # the caller stopped iterating
+                    _kill_process_group(process)
+                    process.wait()
+                reader.join()
+        if timed_out.is_set():
+            profiling.record("command timeout", description, time.perf_counter() - start)
+            if attempt == retries or bytes_read:
+                raise subprocess.TimeoutExpired(cmd_list, timeout)
+            continue
+        profiling.record("command", description, time.perf_counter() - start, bytes_read)
+        break
+    if process.returncode not in valid_return_codes:
+        raise subprocess.CalledProcessError(process.returncode, cmd_list, None, stderr[0] if stderr else None)
+
+
+def _run_pipe(base_cmd_list, piped_to, cwd, timeout):
     # pylint: disable=consider-using-with
     pipe1 = subprocess.Popen(
         base_cmd_list,
         cwd=cwd,
         stdout=subprocess.PIPE,
-        encoding="utf-8",
+        start_new_session=True,
     )
     pipe2 = subprocess.Popen(
         piped_to,
         stdin=pipe1.stdout,
         stdout=subprocess.PIPE,
         encoding="utf-8",
+        errors="replace",  # files are not necessarily encoded in UTF-8
+        start_new_session=True,
     )
     pipe1.stdout.close()
-    output = pipe2.communicate()[0]
+    try:
+        output = pipe2.communicate(timeout=timeout or None)[0]
+    except subprocess.TimeoutExpired:
+        for process in (pipe1, pipe2):
+            _kill_process_group(process)
+        pipe2.communicate()
+        pipe1.wait()
+        raise
+    pipe1.wait()
+    return output
+
+
+def get_pipe_command_output(
+    base_cmd_list: list[str],
+    piped_to: list[str],
+    cwd: pathlib.Path,
+    valid_return_codes: typing.Iterable[int] = (0,),
+    timeout: float = 0,
+    retries: int = 0,
+) -> list[str]:
+    """Return output of ``base_cmd_list | piped_to`` as a list of
+    non-empty lines.
+
+    If the commands do not finish within ``timeout`` seconds, they are
+    killed and run again, up to ``retries`` times. Then
+    ``subprocess.TimeoutExpired`` is raised.
+    """
+    description = f"{' '.join(base_cmd_list)} | {' '.join(piped_to)}"
+    for attempt in range(retries + 1):
+        start = time.perf_counter()
+        try:
+            output = _run_pipe(base_cmd_list, piped_to, cwd, timeout)
+        except subprocess.TimeoutExpired:
+            profiling.record("command timeout", description, time.perf_counter() - start)
+            if attempt == retries:
+                raise
+            continue
+        profiling.record("command", description, time.perf_counter() - start, len(output))
+        break
     return [line for line in output.split(os.linesep) if line]
+
+
+@dataclasses.dataclass
+class GitObject:
+    name: str  # as requested (e.g. a blob id, or "<rev>:<path>")
+    object_id: str = ""
+    type: str = ""  # "blob", "tree", etc., or "missing"
+    size: int = 0
+    content: bytes | None = None  # only read by ``git cat-file --batch``
+
+
+class CatFile:
+    """A long-lived ``git cat-file --batch`` (or ``--batch-check``,
+    which only gives types and sizes) process, to read many objects of
+    the repository of ``directory`` without spawning a process for
+    each.
+
+    All requested objects are written to the process (by a thread)
+    while responses are read, so that requests are pipelined. Use
+    ``get_cat_file()`` to share one process per repository for the
+    whole run.
+    """
+
+    def __init__(self, directory, batch="--batch"):
+        self.description = f"git cat-file {batch}"
+        self.with_contents = batch == "--batch"
+        # pylint: disable=consider-using-with
+        self.process = subprocess.Popen(
+            ["git", "cat-file", batch],
+            cwd=directory,
+            stdin=subprocess.PIPE,
+            stdout=subprocess.PIPE,
+            stderr=subprocess.DEVNULL,
+            start_new_session=True,
+        )
+        self.lock = threading.Lock()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
+
+    def _write(self, names):
+        try:
+            for name in names:
+                self.process.stdin.write(name.encode("utf-8") + b"\n")
+            self.process.stdin.flush()
+        except (BrokenPipeError, ValueError):  # the process has been killed
+            pass
+
+    def _read(self, name):
+        header = self.process.stdout.readline()
+        if not header:
+            raise EOFError(f"{self.description} exited")
+        fields = header.decode("utf-8").split()
+        if fields[-1] in ("missing", "ambiguous"):
+            return GitObject(name, type="missing")
+        object_id, object_type, size = fields
+        obj = GitObject(name, object_id, object_type, int(size))
+        if self.with_contents:
+            obj.content = self.process.stdout.read(obj.size)
+            self.process.stdout.read(1)  # newline after the content
+        return obj
+
+    def get_objects(self, names: typing.Sequence[str], timeout: float = 0) -> list[GitObject]:
+        """Return objects of ``names`` (e.g. blob ids), in the same
+        order.
+
+        If they cannot be read within ``timeout`` seconds, the process
+        is killed and ``subprocess.TimeoutExpired`` is raised.
+        """
+        start = time.perf_counter()
+        timed_out = threading.Event()
+
+        def kill():
+            timed_out.set()
+            _kill_process_group(self.process)
+
+        with self.lock:
+            writer = threading.Thread(target=self._write, args=(names, ), daemon=True)
+            watchdog = threading.Timer(timeout, kill)
+            writer.start()
+            if timeout:
+                watchdog.start()
+            try:
+                objects = [self._read(name) for name in names]
+            except (EOFError, ValueError):
+                if not timed_out.is_set():
+                    raise
+            finally:
+                watchdog.cancel()
+                writer.join()
+        if timed_out.is_set():
+            profiling.record("command timeout", self.description, time.perf_counter() - start)
+            raise subprocess.TimeoutExpired(self.description, timeout)
+        profiling.record(
+            "command",
+            self.description,
+            time.perf_counter() - start,
+            sum(obj.size for obj in objects) if self.with_contents else 0,
+        )
+        return objects
+
+    def close(self):
+        """Stop the process: it exits when its input is closed."""
+        if self.process.poll() is None:
+            self.process.stdin.close()
+            try:
+                self.process.wait(timeout=5)
+            except subprocess.TimeoutExpired:  # pragma: no cover
+                _kill_process_group(self.process)
+                self.process.wait()
+        self.process.stdout.close()
+
+
+_cat_files = {}  # (path of the repository, batch option) -> CatFile
+
+
+def get_cat_file(directory, batch="--batch") -> CatFile:
+    """Return a ``CatFile`` process for the repository of
+    ``directory``, started on the first call and kept until the end of
+    the run (see ``close_cat_files()``).
+    """
+    key = (os.path.realpath(directory), batch)
+    cat_file = _cat_files.get(key)
+    if cat_file is None or cat_file.process.poll() is not None:
+        cat_file = _cat_files[key] = CatFile(directory, batch)
+    return cat_file
+
+
+@atexit.register
+def close_cat_files():
+    while _cat_files:
+        _key, cat_file = _cat_files.popitem()
+        cat_file.close()
+
+
+class GrepLine(typing.NamedTuple):
+    path: str  # relative to the searched directory, not quoted
+    line_no: int
+    content: str  # the line, or the matching part with ``--only-matching``
+
+
+def decode(raw: bytes) -> str:
+    """Decode text of a file (e.g. a line found by ``git grep``),
+    which is not necessarily encoded in UTF-8.
+    """
+    return raw.decode("utf-8", "replace")
+
+
+def iter_grep_lines(lines: typing.Iterable[bytes], rev="") -> typing.Iterator[GrepLine]:
+    """Yield lines (see ``GrepLine``) of the output of ``git grep -z
+    --line-number`` (e.g. from ``iter_output()``), where the path and
+    the line number are followed by a NUL byte (instead of a colon).
+    Paths are hence not quoted, and may contain colons or newlines.
+    When a revision is searched, paths are prefixed by ``rev`` and a
+    colon, which are stripped.
+    """
+    prefix_length = len(rev) + 1 if rev else 0
+    pending = b""
+    for line in lines:
+        record = pending + line
+        if record.count(b"\0") < 2:  # the path contains a newline
+            pending = record + b"\n"
+            continue
+        pending = b""
+        path, line_no, content = record.split(b"\0", 2)
+        yield GrepLine(
+            os.fsdecode(path[prefix_length:]),
+            int(line_no),
+            decode(content[:-1] if content.endswith(b"\r") else content),
+        )
+
+
+def escape_path(path: str) -> str:
+    """Return ``path`` (as decoded by ``os.fsdecode()``) with bytes that
+    are not valid UTF-8 escaped (e.g. "caf\\xe9.py"), so that it can
+    be encoded in UTF-8, e.g. to be stored or sent.
+    """
+    return os.fsencode(path).decode("utf-8", "backslashreplace")
+
+
+def unquote_path(path):
+    """Return ``path`` as given by Git (that quotes paths with special
+    characters like C strings), unquoted.
+    """
+    if not path.startswith('"'):
+        return path
+    return os.fsdecode(codecs.escape_decode(path[1:-1].encode("utf-8"))[0])
+
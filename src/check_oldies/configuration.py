@@ -18,6 +18,20 @@ def is_git_directory(path):
     return res.returncode == os.EX_OK
 
 
+def is_bare_repository(path):
+    """Return whether ``path`` is a Git repository without a working
+    tree (e.g. a mirror).
+    """
+    res = subprocess.run(
+        ["git", "rev-parse", "--is-bare-repository"],
+        cwd=path,
+        capture_output=True,
+        check=False,
+        encoding="utf-8",
+    )
+    return res.stdout.strip() == "true"
+
+
 def replace_dashes(options):
     """Recursively replace dashes by underscores in dictonary keys."""
     if not isinstance(options, dict):
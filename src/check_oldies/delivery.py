@@ -0,0 +1,175 @@
+"""Delivery of e-mail reports.
+
+Messages are first written to a persistent outbox (a directory with
+one file per message), then sent over a small pool of SMTP
+connections. Messages that could not be sent stay in the outbox and
+are sent on the next run.
+"""
+
+import concurrent.futures
+import dataclasses
+import email
+import email.policy
+import os
+import pathlib
+import smtplib
+import threading
+import time
+import uuid
+
+
+class Outbox:
+    """A directory of messages waiting to be sent."""
+
+    suffix = ".eml"
+
+    def __init__(self, path):
+        self.path = pathlib.Path(path)
+        self.path.mkdir(parents=True, exist_ok=True)
+
+    def add(self, message):
+        # Write to a temporary file first so that a crash does not
+        # leave a truncated message in the outbox.
+        name = f"{time.time_ns()}-{uuid.uuid4().hex}"
+        tmp_path = self.path / f".{name}.tmp"
+        tmp_path.write_bytes(message.as_bytes(policy=email.policy.SMTP))
+        path = self.path / f"{name}{self.suffix}"
+        os.replace(tmp_path, path)
+        return path
+
+    def pending(self):
+        """Return paths of messages to send, oldest first."""
+        return sorted(self.path.glob(f"*{self.suffix}"))
+
+    def load(self, path):
+        with open(path, "rb") as fp:
+            return email.message_from_binary_file(fp, policy=email.policy.default)
+
+    def remove(self, path):
+        path.unlink()
+
+
+class RateLimiter:
+    """Allow at most ``rate`` calls per second (0 means no limit)."""
+
+    def __init__(self, rate):
+        self.interval = 1 / rate if rate else 0
+        self._next = 0.0
+        self._lock = threading.Lock()
+
+    def wait(self):
+        if not self.interval:
+            return
+        with self._lock:
+            now = time.monotonic()
+            delay = max(0.0, self._next - now)
+            self._next = max(now, self._next) + self.interval
+        if delay:
+            time.sleep(delay)
+
+
+@dataclasses.dataclass
+class DeliveryReport:
+    sent: list = dataclasses.field(default_factory=list)
+    failed: list = dataclasses.field(default_factory=list)
+
+
+def is_transient(exc):
+    """Return whether it is worth retrying after this error.
+
+    4xx replies are transient failures by definition (RFC 5321,
+    section 4.2.1). Other errors (lost or refused connection, etc.)
+    are instances of ``OSError`` and may be transient as well.
+    """
+    if isinstance(exc, smtplib.SMTPResponseException):
+        return 400 <= exc.smtp_code < 500
+    if isinstance(exc, smtplib.SMTPRecipientsRefused):
+        return all(400 <= code < 500 for code, _msg in exc.recipients.values())
+    return isinstance(exc, OSError)
+
+
+class _ConnectionPool:
+    """Give each worker thread its own SMTP connection."""
+
+    def __init__(self, smtp_config):
+        self.smtp_config = smtp_config
+        self._local = threading.local()
+        self._connections = []
+        self._lock = threading.Lock()
+
+    def get(self):
+        smtp = getattr(self._local, "smtp", None)
+        if smtp is None:
+            smtp = self.smtp_config.make_connection()
+            self._local.smtp = smtp
+            with self._lock:
+                self._connections.append(smtp)
+        return smtp
+
+    def discard(self):
+        smtp = getattr(self._local, "smtp", None)
+        if smtp is None:
+            return
+        self._local.smtp = None
+        with self._lock:
+            self._connections.remove(smtp)
+        try:
+            smtp.close()
+        except OSError:  # pragma: no cover
+            pass
+
+    def close(self):
+        for smtp in self._connections:
+            try:
+                smtp.quit()
+            except (smtplib.SMTPException, OSError):  # pragma: no cover
+                smtp.close()
+        self._connections.clear()
+
+
+def _send(outbox, path, pool, rate_limiter, smtp_config):
+    message = outbox.load(path)
+    attempt = 0
+    while True:
+        rate_limiter.wait()
+        try:
+            pool.get().send_message(message)
+        except (smtplib.SMTPException, OSError) as exc:
+            pool.discard()
+            attempt += 1
+            if attempt > smtp_config.max_retries or not is_transient(exc):
+                return message["To"], exc
+            time.sleep(smtp_config.retry_delay * 2 ** (attempt - 1))
+        else:
+            outbox.remove(path)
+            return message["To"], None
+
+
+def deliver(outbox, smtp_config):
+    """Send all messages of the outbox.
+
+    Return a ``DeliveryReport`` that lists recipients of sent messages
+    and recipients of failed messages (alongside the error). Failed messages are kept in the
+    outbox.
+    """
+    report = DeliveryReport()
+    pool = _ConnectionPool(smtp_config)
+    rate_limiter = RateLimiter(smtp_config.rate_limit)
+    try:
+        with concurrent.futures.ThreadPoolExecutor(
+            max_workers=max(1, smtp_config.connections),
+            thread_name_prefix="smtp",
+        ) as executor:
+            futures = [
+                executor.submit(_send, outbox, path, pool, rate_limiter, smtp_config)
+                for path in outbox.pending()
+            ]
+            for future in futures:
+                recipient, error = future.result()
+                if error is None:
+                    report.sent.append(recipient)
+                else:
+                    report.failed.append((recipient, error))
+    finally:
+        pool.close()
+    return report
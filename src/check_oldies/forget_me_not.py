@@ -1,20 +1,28 @@
 import argparse
-import collections
 import dataclasses
 import datetime
 from email.message import EmailMessage
 import pathlib
 import smtplib
+import subprocess
 import sys
 import typing
 
 from . import annotations
 from . import branches
 from . import configuration
+from . import delivery
+from . import history
+from . import metrics
+from . import profiling
+from . import spool
 
 
 CATCH_ALL = object()
 CONFIGURATION_FILE = 'forget-me-not.toml'
+# Listed among unknown users for annotations without assignee (e.g.
+# whose blame timed out).
+NO_ASSIGNEE = "(no assignee)"
 
 
 @dataclasses.dataclass
@@ -51,6 +59,10 @@ class SmtpConfig:
     port: int = 0  # use OS default behaviour
     user: str | None = None
     password: str | None = None
+    connections: int = 1
+    max_retries: int = 3
+    retry_delay: float = 1.0  # seconds, doubled after each retry
+    rate_limit: float = 0  # messages per second, 0 means no limit
 
     def make_connection(self):
         smtp = smtplib.SMTP(self.host, port=self.port)
@@ -67,6 +79,11 @@ class Config:
     warning_delay: int = 15
     ignored_repositories: typing.Sequence = ()
     output: typing.Sequence = ("stdout", )
+    outbox: str = "forget-me-not-outbox"
+    profile: str = ""
+    metrics_file: str = ""
+    history_file: str = ""
+    cache_file: str = ""
 
     smtp: dict = dataclasses.field(default_factory=lambda: {'host': 'localhost'})
 
@@ -83,6 +100,9 @@ class Config:
     email_body_annotation_line_template: str = (
         "{age} days: {repo}:{path}:{line_no}: {line_content}"
     )
+    email_body_timed_out_annotation_line_template: str = (
+        "TIMEOUT: {repo}:{path}:{line_no}: {line_content}"
+    )
     email_body_branches: str = "\n".join((
         "You have {count} old branch(es) that will block builds "
         "in less than {warning_delay} days:",
@@ -109,11 +129,14 @@ class FakeArgumentParser:
         return self
 
 
-def check_repositories(config):
-    all_reports = {
-        'annotations': [],
-        'branches': []
-    }
+def check_repositories(config, findings, collector=None, history_store=None):
+    """Check all repositories and store old annotations and branches in
+    the ``findings`` spool.
+
+    If given, ``collector`` (a ``metrics.Metrics`` instance) counts
+    all annotations and branches, and ``history_store`` (a
+    ``history.History`` instance) records them.
+    """
     for path in sorted(pathlib.Path(config.path).iterdir()):
         if not path.is_dir():
             continue
@@ -121,13 +144,20 @@ def check_repositories(config):
             continue
         if not configuration.is_git_directory(path):
             continue
-        repo_reports = check_repository(path, config.warning_delay)
-        all_reports["annotations"].extend(repo_reports["annotations"])
-        all_reports["branches"].extend(repo_reports["branches"])
-    return all_reports
+        try:
+            repo_reports = check_repository(
+                path, config.warning_delay, collector, history_store, config.cache_file
+            )
+        except subprocess.TimeoutExpired as exc:
+            # Do not let a single (e.g. corrupted) repository block
+            # reports of all others.
+            print(f"Could not check {path.stem}: {exc}")
+            continue
+        findings.add_annotations(path.stem, repo_reports["annotations"])
+        findings.add_branches(repo_reports["branches"])
 
 
-def check_repository(path, warning_delay):
+def check_repository(path, warning_delay, collector=None, history_store=None, cache_file=""):
     repo_config_path = path / configuration.PYPROJECT_FILENAME
     if not repo_config_path.exists():
         repo_config_path = None  # we'll use the default config
@@ -137,93 +167,129 @@ def check_repository(path, warning_delay):
         argv=[],
         config_class=annotations.Config,
     )
+    if not ann_config.rev and configuration.is_bare_repository(path):
+        ann_config.rev = "HEAD"  # e.g. a mirror, without working tree
+    # A single cache for all repositories, since vendored files are
+    # often shared by several of them.
+    ann_config.cache_file = cache_file or ann_config.cache_file
     branches_config = configuration.get_config(
         tool_name="check-branches",
         arg_parser=FakeArgumentParser(path=path, conf=repo_config_path),
         argv=[],
         config_class=branches.Config,
     )
-    ann_config.max_age -= warning_delay
-    branches_config.max_age -= warning_delay
-    all_annotations = annotations.get_annotations(ann_config)
-    for annotation in all_annotations:
-        annotation.repository = path.stem
-    all_branches = branches.get_branches(branches_config)
+    # Metrics and history count annotations and branches that are old
+    # as per the configuration of the project, while reports include
+    # those that will be old within the warning delay.
+    collector = collector or metrics.Metrics("forget-me-not")
+    found_annotations = collector.track_annotations(
+        path.stem, annotations.iter_annotations(ann_config), ann_config.max_age
+    )
+    found_branches = collector.track_branches(
+        path.stem, branches.iter_branches(branches_config), branches_config.max_age
+    )
+    if history_store is not None:
+        run_id = history_store.start_run("forget-me-not", path.stem, history.get_revision(path, ann_config.rev))
+        found_annotations = history_store.track_annotations(
+            run_id, found_annotations, ann_config.max_age, ann_config.get_tag
+        )
+        found_branches = history_store.track_branches(
+            run_id, found_branches, branches_config.max_age
+        )
     return {
-        "annotations": [ann for ann in all_annotations if ann.is_old],
-        "branches": [branch for branch in all_branches if branch.is_old],
+        "annotations": list(select_annotations(path.stem, found_annotations, ann_config.max_age - warning_delay)),
+        "branches": list(select_branches(found_branches, branches_config.max_age - warning_delay)),
     }
 
 
-def group_reports_by_email(reports, config):
-    by_email = collections.defaultdict(dict)
+def select_annotations(repository, annotations_, max_age):
+    """Yield annotations that are older than ``max_age`` or whose age
+    could not be retrieved in time.
+    """
+    for annotation in annotations_:
+        annotation.is_old = annotation.age > max_age
+        if annotation.must_warn:
+            annotation.repository = repository
+            yield annotation
+
+
+def select_branches(branches_, max_age):
+    """Yield branches that are older than ``max_age``."""
+    for branch in branches_:
+        branch.is_old = branch.age > max_age
+        if branch.is_old:
+            yield branch
+
+
+def group_reports_by_email(findings, config):
+    """Resolve the e-mail address of each assignee and author.
+
+    Return the list of recipients (in order of first appearance) and
+    the set of unknown users (whose reports will be sent to the
+    catch-all address).
+    """
+    recipients = {}  # used as an ordered set
     unknown_users = set()
 
-    for report_key, recipient_getter in (
-        ("annotations", lambda ann: ann.assignee),
-        ("branches", lambda branch: branch.author),
-    ):
-        for warning in reports[report_key]:
-            recipient = recipient_getter(warning)
+    for report_key in ("annotations", "branches"):
+        for recipient in findings.get_recipients(report_key):
             email = config.recipients.get_email(recipient)
             if not email:
-                unknown_users.add(recipient)
-                email = CATCH_ALL
-            by_email[email].setdefault(report_key, []).append(warning)
+                unknown_users.add(recipient or NO_ASSIGNEE)
+            findings.set_email(report_key, recipient, email or spool.CATCH_ALL_EMAIL)
+        for email in findings.get_emails(report_key):
+            recipients[CATCH_ALL if email == spool.CATCH_ALL_EMAIL else email] = None
 
-    return by_email, unknown_users
+    return list(recipients), unknown_users
 
 
-def generate_emails(reports_by_email, config):
+def generate_emails(findings, recipients, config):
     week_number = datetime.date.today().isocalendar()[1]
     email_subject = config.email_subject.format(week_number=week_number)
-    for recipient, reports in reports_by_email.items():
+    for recipient in recipients:
+        email = spool.CATCH_ALL_EMAIL if recipient == CATCH_ALL else recipient
+        # If no user is assigned, promote oldest lines because they
+        # are the most urgent to fix. Otherwise, keep the original
+        # order (by repository, filename and line number) because it
+        # makes more sense to group annotations in each repository.
+        sort_by_age = recipient == CATCH_ALL
         body = config.email_body_intro
-        all_annotations = reports.get("annotations")
-        if all_annotations:
-            # If no user is assigned, promote oldest lines because
-            # they are the most urgent to fix. Otherwise, keep the
-            # original order (by repository, filename and line number)
-            # because it makes more sense to group annotations in each
-            # repository.
-            if recipient == CATCH_ALL:
-                all_annotations.sort(key=lambda ann: ann.age)
-            lines = []
-            for annotation in all_annotations:
-                lines.append(
-                    config.email_body_annotation_line_template.format(
-                        age=annotation.age,
-                        repo=annotation.repository,
-                        path=annotation.path,
-                        line_no=annotation.line_no,
-                        line_content=annotation.line_content.strip(),
-                    )
-                )
+        annotation_lines = [
+            (
+                config.email_body_timed_out_annotation_line_template
+                if annotation.timed_out
+                else config.email_body_annotation_line_template
+            ).format(
+                age=annotation.age,
+                repo=annotation.repository,
+                path=annotation.path,
+                line_no=annotation.line_no,
+                line_content=annotation.line_content.strip(),
+            )
+            for annotation in findings.iter_annotations(email, sort_by_age=sort_by_age)
+        ]
+        if annotation_lines:
             body += config.email_body_annotations.format(
-                count=len(lines),
+                count=len(annotation_lines),
                 warning_delay=config.warning_delay,
-                lines="\n".join(lines)
+                lines="\n".join(annotation_lines)
             )
 
-        all_branches = reports.get("branches")
-        if all_branches:
-            # Sort as we did for annotations above.
-            if recipient == CATCH_ALL:
-                all_branches.sort(key=lambda ann: ann.age)
-            lines = [
-                config.email_body_branch_line_template.format(
-                    age=branch.age,
-                    repo=branch.repo,
-                    branch_details=branch.name_and_details,
-                )
-                for branch in all_branches
-            ]
-            if all_annotations:
+        branch_lines = [
+            config.email_body_branch_line_template.format(
+                age=branch.age,
+                repo=branch.repo,
+                branch_details=branch.name_and_details,
+            )
+            for branch in findings.iter_branches(email, sort_by_age=sort_by_age)
+        ]
+        if branch_lines:
+            if annotation_lines:
                 body += '\n\n'
             body += config.email_body_branches.format(
-                count=len(lines),
+                count=len(branch_lines),
                 warning_delay=config.warning_delay,
-                lines='\n'.join(lines),
+                lines='\n'.join(branch_lines),
             )
 
         body += config.email_body_outro
@@ -271,12 +337,44 @@ def get_parser():
     parser.add_argument(
         '--output', choices=['mail', 'stdout'], action='append', default=['stdout'],
     )
+    parser.add_argument(
+        "--metrics-file",
+        help=(
+            "Path of an OpenMetrics text file to write metrics to "
+            "(e.g. for the textfile collector of the Prometheus node exporter)."
+        ),
+    )
+    parser.add_argument(
+        "--cache-file",
+        help=(
+            "Path of a SQLite database where lines found in each file content are cached, "
+            "so that only new file contents are searched on the next runs."
+        ),
+    )
+    parser.add_argument(
+        "--history-file",
+        help=(
+            "Path of a SQLite database where results of each run are recorded, "
+            "to follow trends with check-oldies-report."
+        ),
+    )
+    parser.add_argument(
+        "--profile",
+        nargs="?",
+        const="-",
+        metavar="JSON_FILE",
+        help=(
+            "Report durations of each phase, subprocess and request. "
+            "The report is written to the standard error, or to JSON_FILE if given."
+        ),
+    )
     return parser
 
 
 def main(argv=None):
     if argv is None:
         argv = sys.argv[1:]
+    profiling.reset()
     parser = get_parser()
     config = configuration.get_config(
         None,
@@ -286,28 +384,59 @@ def main(argv=None):
         'forget-me-not.toml',
     )
 
-    reports = check_repositories(config)
-    reports_by_email, unknown_users = group_reports_by_email(reports, config)
-    emails = list(generate_emails(reports_by_email, config))
-
-    if unknown_users:
-        catch_all = config.recipients.catch_all
-        print(
-            f"Found annotations or old branches of unknown authors "
-            f"(forwarded to {catch_all}):"
-        )
-        print('\n'.join(sorted(unknown_users)))
-
-    if "stdout" in config.output:
-        for email in emails:
-            print(email["To"])
-            print(email.get_content())
-            print("-" * 20)
+    mail_outbox = None
     if "mail" in config.output:
-        with config.smtp.make_connection() as smtp:
-            for email in emails:
-                smtp.send_message(email)
-                print(f"Sent e-mail to {email['To']}")
+        mail_outbox = delivery.Outbox(config.outbox)
+        resumed = len(mail_outbox.pending())
+        if resumed:
+            print(f"Found {resumed} unsent e-mail(s) from a previous run in {config.outbox}")
+
+    collector = metrics.Metrics("forget-me-not")
+    history_store = history.History(config.history_file) if config.history_file else None
+    with spool.FindingSpool() as findings:
+        with profiling.phase("check repositories"):
+            check_repositories(config, findings, collector, history_store)
+        if history_store is not None:
+            history_store.close()
+        recipients, unknown_users = group_reports_by_email(findings, config)
+
+        if unknown_users:
+            catch_all = config.recipients.catch_all
+            print(
+                f"Found annotations or old branches of unknown authors "
+                f"(forwarded to {catch_all}):"
+            )
+            print('\n'.join(sorted(unknown_users)))
+
+        # E-mails are generated on the fly (and twice if we both print
+        # and send them) to avoid holding all of them in memory.
+        with profiling.phase("e-mails"):
+            if "stdout" in config.output:
+                for email in generate_emails(findings, recipients, config):
+                    print(email["To"])
+                    print(email.get_content())
+                    print("-" * 20)
+            if mail_outbox is not None:
+                for email in generate_emails(findings, recipients, config):
+                    mail_outbox.add(email)
+
+    failed = []
+    if mail_outbox is not None:
+        with profiling.phase("delivery"):
+            report = delivery.deliver(mail_outbox, config.smtp)
+        for recipient in report.sent:
+            print(f"Sent e-mail to {recipient}")
+        for recipient, error in report.failed:
+            print(f"Could not send e-mail to {recipient}: {error}")
+        failed = report.failed
+
+    profiling.report(config.profile)
+    metrics.write(config.metrics_file, collector, profiling.current)
+    if failed:
+        sys.exit(
+            f"{len(failed)} e-mail(s) could not be sent. "
+            f"They have been kept in {config.outbox} and will be sent on the next run."
+        )
 
 
 if __name__ == "__main__":  # pragma: no cover
@@ -1,8 +1,24 @@
 import dataclasses
 import json
+import socket
+import time
+import urllib.error
 import urllib.parse
 import urllib.request
 
+from . import profiling
+
+
+# ``urlopen()`` raises ``TimeoutError`` if reading the response times
+# out, but wraps it in an ``URLError`` if connecting times out.
+TIMEOUT_ERRORS = (TimeoutError, urllib.error.URLError)
+
+
+def is_timeout(exc: Exception) -> bool:
+    if isinstance(exc, urllib.error.URLError) and not isinstance(exc, urllib.error.HTTPError):
+        return isinstance(exc.reason, (TimeoutError, socket.timeout))
+    return isinstance(exc, TimeoutError)
+
 
 @dataclasses.dataclass
 class PullRequestInfo:
@@ -11,23 +27,25 @@ class PullRequestInfo:
     url: str
 
 
-def PullRequestGetter(platform, host_owner, api_access):
+def PullRequestGetter(platform, host_owner, api_access, timeout=0, retries=0):
     if platform.lower() == "github":
         klass = GitHubApi
     elif platform.lower() == "gitlab":
         klass = GitLabApi
     else:
         raise ValueError("Unsupported Git host platform." "")
-    return klass(host_owner, api_access)
+    return klass(host_owner, api_access, timeout=timeout, retries=retries)
 
 
 class GitHubApi:
     authentication_header = 'token'
 
-    def __init__(self, host_owner, api_access):
+    def __init__(self, host_owner, api_access, timeout=0, retries=0):
         self.api_base_url = api_access.api_base_url
         self.owner = host_owner
         self.auth_token = api_access.auth_token
+        self.timeout = timeout  # seconds, 0 means no timeout
+        self.retries = retries
 
     def get_pull_request(self, repo, branch):
         url = f"{self.api_base_url}/repos/{self.owner}/{repo}/pulls"
@@ -57,14 +75,41 @@ class GitHubApi:
             "Content-Type": "application/json",
         }
         request = urllib.request.Request(url, headers=headers)
-        response = urllib.request.urlopen(request)  # pylint: disable=consider-using-with
-        return json.loads(response.read())
+        timeout = self.timeout or None
+        for attempt in range(self.retries + 1):
+            start = time.perf_counter()
+            try:
+                response = urllib.request.urlopen(request, timeout=timeout)  # pylint: disable=consider-using-with
+                content = response.read()
+            except TIMEOUT_ERRORS as exc:
+                if not is_timeout(exc):
+                    raise
+                profiling.record("request timeout", f"GET {url}", time.perf_counter() - start)
+                if attempt == self.retries:
+                    raise
+                continue
+            profiling.record("request", f"GET {url}", time.perf_counter() - start, len(content))
+            break
+        return json.loads(content)
 
 
 class GitLabApi(GitHubApi):
     authentication_header = 'Bearer'
 
+    def __init__(self, host_owner, api_access, timeout=0, retries=0):
+        super().__init__(host_owner, api_access, timeout=timeout, retries=retries)
+        self._projects = {}  # repo -> project (or None if not found)
+
     def _get_project(self, repo):
+        # ``check-branches`` looks up merge requests of all branches
+        # of the same repository: search its project only once.
+        hit = repo in self._projects
+        profiling.record_cache("gitlab projects", hit)
+        if not hit:
+            self._projects[repo] = self._search_project(repo)
+        return self._projects[repo]
+
+    def _search_project(self, repo):
         query = {
             "search": f"{repo}",
             "scope": "projects",
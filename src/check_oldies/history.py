@@ -0,0 +1,231 @@
+"""A persistent store of findings of all runs, to follow trends.
+
+Each run of a command on a repository is recorded in the ``runs``
+table. A finding (an annotation, a branch or an orphan FUTURE tag) is
+stored only once in the ``findings`` table, however many runs see it,
+and each run records in the small ``observations`` table which
+findings it saw, with their age at that time. Trend queries (see
+``History.trend()``) only read indexed columns and never rescan
+repositories.
+
+A finding is identified by its repository, path (or branch name),
+content and assignee (or author), so that it is still the same
+finding if lines are added above it.
+"""
+
+import dataclasses
+import datetime
+import sqlite3
+import typing
+
+from . import commands
+
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS runs (
+    id INTEGER PRIMARY KEY,
+    command TEXT NOT NULL,
+    repository TEXT NOT NULL,
+    revision TEXT NOT NULL,
+    started_at TEXT NOT NULL,
+    week TEXT NOT NULL
+);
+CREATE INDEX IF NOT EXISTS runs_week ON runs (week);
+CREATE INDEX IF NOT EXISTS runs_repository ON runs (repository, started_at);
+
+CREATE TABLE IF NOT EXISTS findings (
+    id INTEGER PRIMARY KEY,
+    kind TEXT NOT NULL,
+    repository TEXT NOT NULL,
+    path TEXT NOT NULL,
+    content TEXT NOT NULL,
+    assignee TEXT NOT NULL,
+    tag TEXT NOT NULL,
+    UNIQUE (kind, repository, path, content, assignee)
+);
+CREATE INDEX IF NOT EXISTS findings_assignee ON findings (assignee);
+
+CREATE TABLE IF NOT EXISTS observations (
+    run_id INTEGER NOT NULL REFERENCES runs (id),
+    finding_id INTEGER NOT NULL REFERENCES findings (id),
+    line_no INTEGER NOT NULL,
+    age INTEGER,
+    is_old INTEGER NOT NULL,
+    PRIMARY KEY (run_id, finding_id)
+) WITHOUT ROWID;
+CREATE INDEX IF NOT EXISTS observations_finding ON observations (finding_id, run_id);
+"""
+
+ANNOTATION = "annotation"
+BRANCH = "branch"
+ORPHAN_FUTURE_TAG = "orphan"
+KINDS = (ANNOTATION, BRANCH, ORPHAN_FUTURE_TAG)
+
+# Columns that trends can be grouped by.
+GROUP_BY_COLUMNS = {
+    "week": "runs.week",
+    "repository": "findings.repository",
+    "assignee": "findings.assignee",
+    "tag": "findings.tag",
+}
+
+
+def get_week(date: datetime.date) -> str:
+    """Return the ISO week of ``date``, e.g. "2026-W07"."""
+    year, week, _day = date.isocalendar()
+    return f"{year}-W{week:02}"
+
+
+def get_revision(path, rev="") -> str:
+    """Return the commit hash of ``rev`` (HEAD by default), or an empty
+    string if the repository has no commit.
+    """
+    lines = commands.get_output(
+        ("git", "rev-parse", "--verify", "--quiet", f"{rev or 'HEAD'}^{{commit}}"),
+        cwd=path,
+        valid_return_codes=(0, 1),
+    )
+    return lines[0] if lines else ""
+
+
+@dataclasses.dataclass
+class Trend:
+    group: tuple
+    findings: int
+    old_findings: int
+
+
+class History:
+    """Store findings in a persistent SQLite database.
+
+    Use it as a context manager, so that findings are committed when
+    done::
+
+        with History("history.sqlite") as history:
+            run_id = history.start_run("check-fixmes", "my-repo", revision)
+            for annotation in history.track_annotations(run_id, annotations, ...):
+                ...
+    """
+
+    def __init__(self, path):
+        self.connection = sqlite3.connect(path)
+        self.connection.executescript(SCHEMA)
+        self._run_repositories = {}  # run id -> repository
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, *exc_info):
+        if exc_type is not None:
+            self.connection.rollback()
+        self.close()
+
+    def close(self):
+        """Commit recorded findings and close the database."""
+        self.connection.commit()
+        self.connection.close()
+
+    def start_run(self, command, repository, revision, started_at=None):
+        started_at = started_at or datetime.datetime.now(datetime.timezone.utc)
+        cursor = self.connection.execute(
+            "INSERT INTO runs (command, repository, revision, started_at, week) "
+            "VALUES (?, ?, ?, ?, ?)",
+            (command, repository, revision, started_at.isoformat(), get_week(started_at)),
+        )
+        self._run_repositories[cursor.lastrowid] = repository
+        return cursor.lastrowid
+
+    def _observe(self, run_id, kind, path, content, assignee, tag, line_no, age, is_old):
+        key = (kind, self._run_repositories[run_id], commands.escape_path(path), content, assignee)
+        self.connection.execute(
+            "INSERT OR IGNORE INTO findings (kind, repository, path, content, assignee, tag) "
+            "VALUES (?, ?, ?, ?, ?, ?)",
+            key + (tag, ),
+        )
+        finding_id = self.connection.execute(
+            "SELECT id FROM findings "
+            "WHERE kind = ? AND repository = ? AND path = ? AND content = ? AND assignee = ?",
+            key,
+        ).fetchone()[0]
+        # Identical lines in the same file are the same finding.
+        self.connection.execute(
+            "INSERT OR IGNORE INTO observations (run_id, finding_id, line_no, age, is_old) "
+            "VALUES (?, ?, ?, ?, ?)",
+            (run_id, finding_id, line_no, age, is_old),
+        )
+
+    def track_annotations(
+        self,
+        run_id: int,
+        annotations: typing.Iterable,
+        max_age: int,
+        get_tag: typing.Callable[[str], str],
+    ) -> typing.Iterator:
+        """Record annotations as they go through.
+
+        An annotation is old if it is older than ``max_age``. Its tag
+        is the annotation itself (e.g. "todo"), as returned by
+        ``get_tag`` (see ``annotations.Config.get_tag``).
+        """
+        for annotation in annotations:
+            content = annotation.line_content.strip()
+            tag = get_tag(content)
+            self._observe(
+                run_id, ANNOTATION, annotation.path, content, annotation.assignee, tag,
+                annotation.line_no, annotation.age, annotation.age > max_age,
+            )
+            yield annotation
+
+    def track_branches(self, run_id: int, branches: typing.Iterable, max_age: int) -> typing.Iterator:
+        for branch in branches:
+            self._observe(
+                run_id, BRANCH, branch.name, "", branch.author, "",
+                0, branch.age, branch.age > max_age,
+            )
+            yield branch
+
+    def track_orphan_futures(self, run_id: int, orphan_futures: typing.Iterable) -> typing.Iterator:
+        for orphan in orphan_futures:
+            self._observe(
+                run_id, ORPHAN_FUTURE_TAG, orphan.path, orphan.tag, orphan.author, orphan.tag,
+                orphan.line_no, None, True,
+            )
+            yield orphan
+
+    def trend(
+        self,
+        group_by: typing.Sequence[str] = ("week", ),
+        kind: str = ANNOTATION,
+        repository: str = "",
+        since: datetime.date | None = None,
+    ) -> list[Trend]:
+        """Return the number of distinct findings (and old findings)
+        seen by runs, grouped by ``group_by`` columns (see
+        ``GROUP_BY_COLUMNS``).
+        """
+        columns = [GROUP_BY_COLUMNS[column] for column in group_by]
+        conditions = ["findings.kind = ?"]
+        params: list = [kind]
+        if repository:
+            conditions.append("runs.repository = ?")
+            params.append(repository)
+        if since:
+            conditions.append("runs.week >= ?")
+            params.append(get_week(since))
+        selected = ", ".join(columns + [
+            "COUNT(DISTINCT findings.id)",
+            "COUNT(DISTINCT CASE WHEN observations.is_old THEN findings.id END)",
+        ])
+        query = (
+            f"SELECT {selected} "
+            "FROM observations "
+            "JOIN runs ON runs.id = observations.run_id "
+            "JOIN findings ON findings.id = observations.finding_id "
+            f"WHERE {' AND '.join(conditions)}"
+        )
+        if columns:
+            query += f" GROUP BY {', '.join(columns)} ORDER BY {', '.join(columns)}"
+        return [
+            Trend(group=tuple(row[:-2]), findings=row[-2], old_findings=row[-1])
+            for row in self.connection.execute(query, params)
+        ]
@@ -0,0 +1,220 @@
+"""Export of scan metrics as an OpenMetrics text file.
+
+The file is meant to be read by the textfile collector of the
+Prometheus node exporter. It holds per-repository counts of findings,
+age histograms, and the durations, calls and cache statistics
+recorded by the ``profiling`` module. Values are those of the last
+run, hence all of them (except histograms) are gauges.
+"""
+
+import dataclasses
+import math
+import os
+import pathlib
+import tempfile
+import time
+import typing
+
+from . import profiling
+
+
+AGE_BUCKETS = (7, 30, 90, 180, 365, 730, math.inf)  # days
+
+
+@dataclasses.dataclass
+class Histogram:
+    buckets: tuple = AGE_BUCKETS
+    counts: list = dataclasses.field(init=False)  # not cumulative
+    sum: float = 0
+    count: int = 0
+
+    def __post_init__(self):
+        self.counts = [0] * len(self.buckets)
+
+    def observe(self, value):
+        for i, bound in enumerate(self.buckets):
+            if value <= bound:
+                self.counts[i] += 1
+                break
+        self.sum += value
+        self.count += 1
+
+    def cumulative_counts(self):
+        total = 0
+        for bound, count in zip(self.buckets, self.counts):
+            total += count
+            yield bound, total
+
+
+@dataclasses.dataclass
+class RepositoryMetrics:
+    annotations: int = 0
+    old_annotations: int = 0
+    annotation_ages: Histogram = dataclasses.field(default_factory=Histogram)
+    orphan_future_tags: int = 0
+    branches: int = 0
+    old_branches: int = 0
+    branch_ages: Histogram = dataclasses.field(default_factory=Histogram)
+
+
+class Metrics:
+    """Collect metrics of findings as they go through ``track_*()``
+    methods, without keeping findings in memory.
+    """
+
+    def __init__(self, command: str):
+        self.command = command
+        self.repositories: dict[str, RepositoryMetrics] = {}
+
+    def _get(self, repository):
+        return self.repositories.setdefault(repository, RepositoryMetrics())
+
+    def track_annotations(self, repository: str, annotations: typing.Iterable, max_age: int):
+        metrics = self._get(repository)
+        for annotation in annotations:
+            metrics.annotations += 1
+            if annotation.age > max_age:
+                metrics.old_annotations += 1
+            metrics.annotation_ages.observe(annotation.age)
+            yield annotation
+
+    def track_orphan_futures(self, repository: str, orphan_futures: typing.Iterable):
+        metrics = self._get(repository)
+        for orphan in orphan_futures:
+            metrics.orphan_future_tags += 1
+            yield orphan
+
+    def track_branches(self, repository: str, branches: typing.Iterable, max_age: int):
+        metrics = self._get(repository)
+        for branch in branches:
+            metrics.branches += 1
+            if branch.age > max_age:
+                metrics.old_branches += 1
+            metrics.branch_ages.observe(branch.age)
+            yield branch
+
+    def to_text(self, profiler: profiling.Profiler) -> str:
+        writer = _Writer(command=self.command)
+
+        repositories = sorted(self.repositories.items())
+        for name, attribute, help_text in (
+            ("annotations", "annotations", "Number of annotations."),
+            ("old_annotations", "old_annotations", "Number of annotations that are too old."),
+            ("orphan_future_tags", "orphan_future_tags", "Number of orphan FUTURE tags."),
+            ("branches", "branches", "Number of branches."),
+            ("old_branches", "old_branches", "Number of branches that are too old."),
+        ):
+            writer.family(name, "gauge", help_text)
+            for repository, metrics in repositories:
+                writer.sample(name, getattr(metrics, attribute), repository=repository)
+        for name, attribute, help_text in (
+            ("annotation_age_days", "annotation_ages", "Age of annotations."),
+            ("branch_age_days", "branch_ages", "Age of branches."),
+        ):
+            writer.family(name, "histogram", help_text, unit="days")
+            for repository, metrics in repositories:
+                writer.histogram(name, getattr(metrics, attribute), repository=repository)
+
+        writer.family("duration_seconds", "gauge", "Duration of the run.", unit="seconds")
+        writer.sample("duration_seconds", profiler.total_duration)
+        writer.family(
+            "last_run_timestamp_seconds", "gauge", "Time of the end of the run.", unit="seconds"
+        )
+        writer.sample("last_run_timestamp_seconds", time.time())
+        writer.family(
+            "phase_duration_seconds", "gauge", "Cumulated duration of each phase.", unit="seconds"
+        )
+        for phase, stat in profiler.phases.items():
+            writer.sample("phase_duration_seconds", stat.duration, phase=phase)
+        writer.family("calls", "gauge", "Number of subprocesses and HTTP requests.")
+        for kind, stat in profiler.calls.items():
+            writer.sample("calls", stat.count, kind=kind)
+        writer.family(
+            "calls_duration_seconds",
+            "gauge",
+            "Cumulated duration of subprocesses and HTTP requests.",
+            unit="seconds",
+        )
+        for kind, stat in profiler.calls.items():
+            writer.sample("calls_duration_seconds", stat.duration, kind=kind)
+        writer.family(
+            "calls_read_bytes",
+            "gauge",
+            "Number of bytes returned by subprocesses and HTTP requests.",
+            unit="bytes",
+        )
+        for kind, stat in profiler.calls.items():
+            writer.sample("calls_read_bytes", stat.bytes_read, kind=kind)
+        writer.family("cache_hits", "gauge", "Number of cache hits.")
+        for cache, stat in profiler.caches.items():
+            writer.sample("cache_hits", stat.hits, cache=cache)
+        writer.family("cache_misses", "gauge", "Number of cache misses.")
+        for cache, stat in profiler.caches.items():
+            writer.sample("cache_misses", stat.misses, cache=cache)
+
+        return writer.getvalue()
+
+
+def get_repository_name(path) -> str:
+    return pathlib.Path(path).resolve().name
+
+
+def _escape(value: str) -> str:
+    return value.replace("\\", r"\\").replace('"', r"\"").replace("\n", r"\n")
+
+
+def _format_value(value) -> str:
+    if value == math.inf:
+        return "+Inf"
+    if isinstance(value, float):
+        return repr(value)
+    return str(value)
+
+
+class _Writer:
+    prefix = "check_oldies_"
+
+    def __init__(self, **common_labels):
+        self.common_labels = common_labels
+        self.lines = []
+
+    def family(self, name, metric_type, help_text, unit=""):
+        name = self.prefix + name
+        self.lines.append(f"# TYPE {name} {metric_type}")
+        if unit:
+            self.lines.append(f"# UNIT {name} {unit}")
+        self.lines.append(f"# HELP {name} {help_text}")
+
+    def sample(self, name, value, suffix="", **labels):
+        labels = {**self.common_labels, **labels}
+        formatted_labels = ",".join(
+            f'{label}="{_escape(str(label_value))}"' for label, label_value in labels.items()
+        )
+        self.lines.append(
+            f"{self.prefix}{name}{suffix}{{{formatted_labels}}} {_format_value(value)}"
+        )
+
+    def histogram(self, name, histogram, **labels):
+        for bound, count in histogram.cumulative_counts():
+            self.sample(name, count, suffix="_bucket", **labels, le=_format_value(float(bound)))
+        self.sample(name, histogram.count, suffix="_count", **labels)
+        self.sample(name, histogram.sum, suffix="_sum", **labels)
+
+    def getvalue(self):
+        return "\n".join(self.lines + ["# EOF", ""])
+
+
+def write(path, metrics: Metrics, profiler: profiling.Profiler):
+    """Write metrics to ``path``, atomically so that the collector
+    never reads a partial file. Do nothing if ``path`` is empty.
+    """
+    if not path:
+        return
+    path = pathlib.Path(path)
+    path.parent.mkdir(parents=True, exist_ok=True)
+    fd, tmp_path = tempfile.mkstemp(dir=path.parent, prefix=f".{path.name}.", suffix=".tmp")
+    with os.fdopen(fd, "w", encoding="utf-8") as fp:
+        fp.write(metrics.to_text(profiler))
+    # ``mkstemp()`` creates a file that only we can read.
+    os.chmod(tmp_path, 0o644)
+    os.replace(tmp_path, path)
@@ -1,19 +1,32 @@
+import contextlib
 import csv
 import enum
-import io
+import json
 import os
+import sys
 import typing
-import xml.etree.ElementTree
 
 from . import compat
+from . import xunit
 
 
 class OutputFormat(compat.StrEnum):
     CSV = enum.auto()
+    NDJSON = enum.auto()
     TEXT = enum.auto()
     XUNIT = enum.auto()
 
 
+def _itself(text: str) -> str:
+    return text
+
+
+def _get_warn_function(colorize_errors: bool) -> typing.Callable[[str], str]:
+    if colorize_errors:
+        return "\033[91m{}\033[0m".format
+    return _itself
+
+
 def text_formatter(
     objects: list,
     ok_message: str,
@@ -21,14 +34,7 @@ def text_formatter(
     colorize_errors=True,
     **unsupported_options,
 ) -> str:
-
-    def itself(text: str) -> str:
-        return text
-
-    if colorize_errors:
-        warn = "\033[91m{}\033[0m".format
-    else:
-        warn = itself
+    warn = _get_warn_function(colorize_errors)
 
     lines = []
     if ok_message:
@@ -43,46 +49,37 @@ def text_formatter(
     return os.linesep.join(lines)
 
 
-def xunit_formatter(
-    objects: list,
-    error_message: str,
+def _get_error_message_getter(
+    error_message: str = "",
+    get_messages: typing.Callable[[], tuple[str, str]] | None = None,
+    **unsupported_options,
+) -> typing.Callable[[], str]:
+    # When objects are streamed, the error message is only known once
+    # all of them have been consumed.
+    if get_messages is not None:
+        return lambda: get_messages()[1]
+    return lambda: error_message
+
+
+def xunit_writer(
+    objects: typing.Iterable,
+    out: typing.TextIO,
     xunit_suite_name: str,
     xunit_case_name: str,
     xunit_class_name: str,
-    **unsupported_options,
-) -> str:
-    stdout = os.linesep.join(obj.to_text() for obj in objects)
-    suite = xml.etree.ElementTree.Element(
-        "testsuite",
-        {
-            "name": xunit_suite_name,
-            "tests": "1",
-            "errors": "0",
-            "failures": "1" if error_message else "0",
-        },
-    )
-    case = xml.etree.ElementTree.SubElement(
-        suite,
-        "testcase",
-        {"classname": xunit_class_name, "name": xunit_case_name},
+    **options,
+):
+    """Write objects as an xUnit report, with one test case per object
+    (and a test case in error if there is an error message).
+    """
+    xunit.write_xunit(
+        objects,
+        out,
+        suite_name=xunit_suite_name,
+        case_name=xunit_case_name,
+        class_name=xunit_class_name,
+        get_error_message=_get_error_message_getter(**options),
     )
-    if error_message:
-        failure = xml.etree.ElementTree.SubElement(
-            case,
-            "failure",
-            {"message": error_message},
-        )
-        failure.text = stdout
-
-    system_out = xml.etree.ElementTree.SubElement(case, "system-out")
-    system_out.text = stdout
-
-    # FIXME (dbaty, 2026-05-21): this element is always empty and
-    # could be removed (because the schema says it's optional).
-    system_err = xml.etree.ElementTree.SubElement(case, "system-err")
-    system_err.text = ""
-
-    return xml.etree.ElementTree.tostring(suite, encoding="utf-8").decode("utf-8")
 
 
 def _csv_values_converter(values: dict) -> dict:
@@ -97,29 +94,133 @@ def _csv_values_converter(values: dict) -> dict:
     return converted
 
 
-def csv_formatter(objects: list, **unsupported_options) -> str:
-    if not objects:
-        return ""
-    out = io.StringIO()
-    writer = csv.DictWriter(out, fieldnames=objects[0].to_dict().keys())
-    writer.writeheader()
+def csv_writer(objects: typing.Iterable, out: typing.TextIO, **unsupported_options):
+    """Write objects as CSV, one row at a time."""
+    writer = None
+    for obj in objects:
+        values = obj.to_dict()
+        if writer is None:  # the header is taken from the first object
+            writer = csv.DictWriter(out, fieldnames=values.keys())
+            writer.writeheader()
+        writer.writerow(_csv_values_converter(values))
+
+
+def ndjson_writer(objects: typing.Iterable, out: typing.TextIO, **unsupported_options):
+    """Write objects as newline-delimited JSON, one object per line."""
     for obj in objects:
-        writer.writerow(_csv_values_converter(obj.to_dict()))
-    return out.getvalue()
+        out.write(json.dumps(obj.to_dict()))
+        out.write("\n")
+
+
+def text_streamer(
+    objects: typing.Iterable,
+    out: typing.TextIO,
+    get_messages: typing.Callable[[], tuple[str, str]],
+    colorize_errors=True,
+    **unsupported_options,
+):
+    warn = _get_warn_function(colorize_errors)
+    for obj in objects:
+        print(warn(obj.to_text()) if obj.must_warn else obj.to_text(), file=out, flush=True)
+    ok_message, error_message = get_messages()
+    if ok_message:
+        print(ok_message, file=out)
+    if error_message:
+        print(warn(error_message), file=out)
+
+
+# Writers write each object as soon as it is produced. Formatters
+# return the whole output as a single string.
+WRITERS = {
+    OutputFormat.CSV: csv_writer,
+    OutputFormat.NDJSON: ndjson_writer,
+    OutputFormat.XUNIT: xunit_writer,
+}
 
 
 def get_formatter(output_format) -> typing.Callable:
-    if output_format == OutputFormat.CSV:
-        return csv_formatter
     if output_format == OutputFormat.TEXT:
         return text_formatter
-    if output_format == OutputFormat.XUNIT:
-        return xunit_formatter
     raise ValueError(f"Unknown output format: '{output_format}'")
 
 
-def printer(objects: list, output_format: OutputFormat, **options):
-    formatter = get_formatter(output_format)
-    formatted = formatter(objects, **options)
-    if formatted:
-        print(formatted)
+@contextlib.contextmanager
+def open_output(output_file: str = "") -> typing.Iterator[typing.TextIO]:
+    """Open ``output_file`` for writing, or use the standard output if
+    no file is given.
+    """
+    if not output_file:
+        yield sys.stdout
+        return
+    with open(output_file, "w", encoding="utf-8", newline="") as out:
+        yield out
+
+
+def printer(objects: typing.Iterable, output_format: OutputFormat, output_file: str = "", **options):
+    if output_format == OutputFormat.XUNIT and output_file:
+        xunit.create_xunit_file(
+            output_file,
+            objects,
+            suite_name=options["xunit_suite_name"],
+            case_name=options["xunit_case_name"],
+            class_name=options["xunit_class_name"],
+            get_error_message=_get_error_message_getter(**options),
+        )
+        return
+    with open_output(output_file) as out:
+        writer = WRITERS.get(output_format)
+        if writer:
+            writer(objects, out, **options)
+            return
+        formatter = get_formatter(output_format)
+        formatted = formatter(list(objects), **options)
+        if formatted:
+            print(formatted, file=out)
+
+
+class Tally:
+    """Count objects (and objects that must warn, or that could not be
+    checked in time) as they go through ``track()``.
+    """
+
+    def __init__(self):
+        self.count = 0
+        self.warnings = 0
+        self.timeouts = 0
+
+    def track(self, objects: typing.Iterable) -> typing.Iterator:
+        for obj in objects:
+            self.count += 1
+            if obj.must_warn:
+                self.warnings += 1
+            if getattr(obj, "timed_out", False):
+                self.timeouts += 1
+            yield obj
+
+
+def first_warning(objects: typing.Iterable) -> typing.Iterator:
+    """Yield the first object that must warn (if any), and stop."""
+    for obj in objects:
+        if obj.must_warn:
+            yield obj
+            return
+
+
+def stream_printer(
+    objects: typing.Iterable,
+    output_format: OutputFormat,
+    get_messages: typing.Callable[[], tuple[str, str]],
+    output_file: str = "",
+    **options,
+):
+    """Print objects as soon as they are produced.
+
+    Since OK and error messages depend on all objects, they are
+    retrieved with ``get_messages()`` once all objects have been
+    consumed. With the text format, they are hence printed last.
+    """
+    if output_format == OutputFormat.TEXT:
+        with open_output(output_file) as out:
+            text_streamer(objects, out, get_messages, **options)
+    else:
+        printer(objects, output_format, output_file=output_file, get_messages=get_messages, **options)
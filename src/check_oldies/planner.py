@@ -0,0 +1,130 @@
+"""Choose how ``git grep`` searches annotations and FUTURE tags.
+
+``git grep`` is much faster with fixed strings than with extended
+regular expressions. Annotations are usually plain words (e.g.
+"todo"), which are then given as fixed strings, one ``-e`` option per
+annotation. If ``git`` supports Perl-compatible regular expressions,
+plain words are instead searched with the rule of
+``annotations.Config.py_annotation_regex`` (annotations must start a
+line or follow "#", "/", "*", "<", "{" or a space), so that ``git
+grep`` only gives lines that really have an annotation: they do not
+have to be checked again in Python (see ``GrepPlan.is_exact()``).
+
+All modes give the same annotations (and the same FUTURE tags) once
+lines are checked.
+"""
+
+import dataclasses
+import enum
+import functools
+import subprocess
+
+from . import commands
+from . import compat
+
+
+# Characters that have a special meaning in POSIX extended regular
+# expressions.
+ERE_SPECIAL_CHARACTERS = frozenset("\\^$.[]|()*+?{}")
+
+
+class GrepMode(compat.StrEnum):
+    FIXED = enum.auto()
+    EXTENDED = enum.auto()
+    PERL = enum.auto()
+
+
+GREP_OPTIONS = {
+    GrepMode.FIXED: "--fixed-strings",
+    GrepMode.EXTENDED: "--extended-regexp",
+    GrepMode.PERL: "--perl-regexp",
+}
+
+
+@dataclasses.dataclass(frozen=True)
+class GrepPlan:
+    """Patterns given to ``git grep`` (a line is found if it matches
+    any of them) and how they are interpreted.
+    """
+    mode: GrepMode
+    patterns: tuple[str, ...]
+
+    @property
+    def options(self) -> list[str]:
+        """Return ``git grep`` options, as a group of patterns that can
+        be combined with others (e.g. with ``--and``).
+        """
+        options = [GREP_OPTIONS[self.mode], "("]
+        for pattern in self.patterns:
+            options.extend(["-e", pattern])
+        options.append(")")
+        return options
+
+    def is_exact(self, line_content) -> bool:
+        """Return whether ``git grep`` only gives this line if it has
+        an annotation, i.e. whether the line does not have to be
+        checked with ``annotations.Config.py_annotation_regex``.
+        """
+        # On other lines, Unicode word characters and spaces are not
+        # the same for ``git grep`` and Python.
+        return self.mode == GrepMode.PERL and line_content.isascii()
+
+
+def is_literal(regex: str) -> bool:
+    """Return whether ``regex`` (a POSIX extended regular expression)
+    only matches itself.
+    """
+    return not ERE_SPECIAL_CHARACTERS.intersection(regex)
+
+
+@functools.lru_cache()
+def has_perl_regexp(directory) -> bool:
+    """Return whether ``git`` has been built with support of
+    Perl-compatible regular expressions (``git grep --perl-regexp``).
+    """
+    try:
+        commands.get_output(
+            # The empty tree exists in all repositories, even bare ones.
+            ["git", "grep", "--quiet", "--perl-regexp", "-e", "(?<=#)", commands.EMPTY_TREE],
+            cwd=directory,
+            valid_return_codes=(0, 1),
+        )
+    except subprocess.CalledProcessError:
+        return False
+    return True
+
+
+def choose_annotations_mode(annotations, perl_regexp=False) -> GrepMode:
+    """Return the fastest mode that gives the same annotations as
+    extended regular expressions.
+    """
+    if not annotations or not all(is_literal(annotation) for annotation in annotations):
+        return GrepMode.EXTENDED
+    if perl_regexp and all(annotation.isascii() for annotation in annotations):
+        return GrepMode.PERL
+    return GrepMode.FIXED
+
+
+def get_annotations_plan(annotations, mode: GrepMode) -> GrepPlan:
+    """Return how ``annotations`` are searched in ``mode``, which must
+    be ``GrepMode.EXTENDED`` if they are not all literal.
+    """
+    annotations = [annotation.lower() for annotation in annotations]
+    if mode == GrepMode.FIXED:
+        return GrepPlan(mode, tuple(annotations))
+    if mode == GrepMode.PERL:
+        words = "|".join(fr"\b{annotation}\b" for annotation in annotations)
+        # Like ``annotations.Config.py_annotation_regex``, where "\s"
+        # also matches "\x1c" to "\x1f". Annotations that follow a
+        # non-ASCII character are checked again in Python.
+        return GrepPlan(mode, (fr"(?:(?<=[#/*<{{\s\x1c-\x1f])|(?<=[^\x00-\x7f])|^)(?:{words})",))
+    return GrepPlan(mode, ("|".join(annotations),))
+
+
+def get_future_tags_plan(future_tag_regex) -> GrepPlan:
+    """Return how FUTURE tags are searched (with ``--only-matching``,
+    so that Perl-compatible regular expressions, whose quantifiers are
+    lazy, are never used).
+    """
+    mode = GrepMode.FIXED if is_literal(future_tag_regex) else GrepMode.EXTENDED
+    return GrepPlan(mode, (future_tag_regex,))
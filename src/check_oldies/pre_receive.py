@@ -0,0 +1,223 @@
+"""A server-side ``pre-receive`` Git hook.
+
+Git runs this hook before updating references of a push, with one
+"<old-rev> <new-rev> <ref-name>" line per updated reference on the
+standard input. Pushed objects are already in the object database,
+but references have not been updated yet. Only lines added by the push
+are checked, directly in the object database, so that the hook works
+in bare repositories and its duration does not depend on the size of
+the repository. The push is rejected if it adds annotations without
+assignee or orphan FUTURE tags.
+"""
+
+import argparse
+import dataclasses
+import os
+import re
+import subprocess
+import sys
+
+from . import annotations
+from . import commands
+from . import configuration
+
+
+HUNK_HEADER = re.compile(rb"^@@ -\S+ \+(?P<start>\d+)(?:,(?P<count>\d+))? @@")
+
+
+@dataclasses.dataclass
+class Problem:
+    refname: str
+    path: str
+    line_no: int
+    message: str
+
+    must_warn = True
+
+    def to_text(self):
+        return f"{self.refname}: {self.path}:{self.line_no}: {self.message}"
+
+
+def is_null(rev):
+    """Return whether ``rev`` is the null hash that Git gives for
+    created and deleted references.
+    """
+    return set(rev) == {"0"}
+
+
+def get_bases(directory, newrev, timeout=0):
+    """Return revisions to compare a new reference with: known parents
+    of its new commits (several ones if a new commit merges known
+    branches). Return an empty list if it points to commits that are
+    already known.
+    """
+    lines = commands.get_output(
+        ["git", "rev-list", "--boundary", newrev, "--not", "--all"],
+        cwd=directory,
+        timeout=timeout,
+    )
+    if not lines:
+        return []
+    # Boundary commits (prefixed by "-") are known parents of new commits.
+    boundaries = [line[1:] for line in lines if line.startswith("-")]
+    # The first commits of a repository are compared to an empty tree.
+    return boundaries or [commands.EMPTY_TREE]
+
+
+def get_added_lines(directory, base, newrev, timeout=0):
+    """Return the numbers of lines that have been added (or modified)
+    between ``base`` and ``newrev``, for each path.
+    """
+    # The output is not decoded: added lines may be in any encoding.
+    output = commands.get_raw_output(
+        [
+            "git",
+            "diff",
+            "--no-color",
+            "--no-ext-diff",
+            "--unified=0",
+            "--diff-filter=d",  # deleted files have no added line
+            base,
+            newrev,
+        ],
+        cwd=directory,
+        timeout=timeout,
+    )
+    added = {}
+    path = None
+    in_header = False
+    for line in output.split(b"\n"):
+        if line.startswith(b"diff --git "):
+            path = None
+            in_header = True
+            continue
+        if in_header and line.startswith(b"+++ "):
+            # Git ends the header with a TAB if the path has a space
+            # (the path is quoted if it really ends with a TAB).
+            name = os.fsdecode(line[len(b"+++ "):].removesuffix(b"\t"))
+            # Strip the "b/" prefix, which is inside quotes if any.
+            path = commands.unquote_path(f'"{name[3:]}' if name.startswith('"') else name[2:])
+            added[path] = set()
+            continue
+        match = HUNK_HEADER.match(line)
+        if match:
+            # Other lines are added or removed lines until the next
+            # "diff --git" line, even if they look like file headers.
+            in_header = False
+        if match and path is not None:
+            start = int(match.group("start"))
+            count = int(match.group("count") or 1)
+            added[path].update(range(start, start + count))
+    return {path: line_nos for path, line_nos in added.items() if line_nos}
+
+
+def check_update(config: annotations.Config, oldrev, newrev, refname):
+    """Return problems of lines added by the update of ``refname``."""
+    if is_null(newrev):  # deleted reference
+        return []
+    bases = get_bases(config.path, newrev, config.timeouts.log) if is_null(oldrev) else [oldrev]
+    if not bases:
+        return []
+    added = get_added_lines(config.path, bases[0], newrev, config.timeouts.log)
+    for base in bases[1:]:
+        # Lines that come from another known parent are not added by the push.
+        other = get_added_lines(config.path, base, newrev, config.timeouts.log)
+        added = {path: line_nos & other.get(path, set()) for path, line_nos in added.items()}
+    paths = [path for path in added if not config.compiled_whitelist.matches(path)]
+    # Only modified files are checked, not the whole tree.
+    pruned = config.get_pruned_paths(newrev, paths=paths)
+    paths = sorted(path for path in paths if path not in pruned)
+
+    problems = []
+    futures = []
+    for start in range(0, len(paths), annotations.PATHSPEC_CHUNK_SIZE):
+        chunk = paths[start:start + annotations.PATHSPEC_CHUNK_SIZE]
+        candidates = annotations.iter_annotation_candidates(
+            config.path,
+            config.annotation_regex,
+            (),  # whitelisted paths are not given
+            timeout=config.timeouts.grep,
+            rev=newrev,
+            paths=chunk,
+            plan=config.annotation_plan,
+        )
+        for candidate in candidates:
+            if candidate.line_no not in added.get(candidate.path, ()):
+                continue
+            if not config.is_annotation(candidate.content):
+                continue
+            if not config.py_assignee_regex.search(candidate.content):
+                message = f"Annotation without assignee: {candidate.content.strip()}"
+                problems.append(Problem(refname, candidate.path, candidate.line_no, message))
+        occurrences = annotations.get_all_futures(
+            config.path,
+            config.future_tag_regex,
+            (),  # whitelisted paths are not given
+            timeout=config.timeouts.grep,
+            rev=newrev,
+            paths=chunk,
+        )
+        for tag_occurrences in occurrences.values():
+            futures.extend(occ for occ in tag_occurrences if occ.line_no in added.get(occ.path, ()))
+
+    if futures:
+        # A tag is known if it appears along an annotation anywhere in
+        # the new revision, not only in added lines.
+        known_tags = annotations.grep_known_future_tags(config, newrev)
+        problems.extend(
+            Problem(refname, occ.path, occ.line_no, f"Unknown tag {occ.tag}")
+            for occ in futures
+            if occ.tag not in known_tags
+        )
+    return sorted(problems, key=lambda problem: (problem.path, problem.line_no))
+
+
+def get_parser():
+    parser = argparse.ArgumentParser(
+        prog="check-oldies-pre-receive",
+        description=(
+            "Reject pushes that add annotations without assignee or orphan FUTURE tags. "
+            "Meant to be run as (or from) a pre-receive Git hook, which gives "
+            "\"<old-rev> <new-rev> <ref-name>\" lines on the standard input."
+        ),
+    )
+    parser.add_argument(
+        "--conf",
+        help=(
+            f"Path of the configuration file (where options of check-fixmes are read). "
+            f"Defaults to {configuration.PYPROJECT_FILENAME} if it exists."
+        ),
+    )
+    return parser
+
+
+def main(argv=None, stdin=None):
+    if argv is None:
+        argv = sys.argv[1:]
+    stdin = stdin or sys.stdin
+    parser = get_parser()
+    config = configuration.get_config("check-fixmes", parser, argv, annotations.Config)
+
+    problems = []
+    for line in stdin:
+        if not line.strip():
+            continue
+        try:
+            oldrev, newrev, refname = line.split()
+        except ValueError:
+            sys.exit(f"NOK: Unexpected line on the standard input: {line.strip()}")
+        try:
+            problems.extend(check_update(config, oldrev, newrev, refname))
+        except subprocess.TimeoutExpired as exc:
+            # Better reject the push than accept it unchecked.
+            sys.exit(f"NOK: Could not check {refname} in time: {exc}")
+
+    if problems:
+        print("NOK: The push adds annotations without assignee or orphan FUTURE tags.")
+        for problem in problems:
+            print(problem.to_text())
+        sys.exit(os.EX_DATAERR)
+
+
+if __name__ == "__main__":  # pragma: no cover
+    main()
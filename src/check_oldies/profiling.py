@@ -0,0 +1,185 @@
+"""Lightweight profiling of commands.
+
+Durations of phases (grep, blame, etc.), subprocesses and HTTP
+requests are always recorded, because it is cheap: a couple of calls
+to ``time.perf_counter()`` for each. They are reported only if asked
+with the ``--profile`` argument of commands.
+"""
+
+import contextlib
+import dataclasses
+import heapq
+import json
+import sys
+import time
+
+
+SLOWEST_CALLS = 10
+
+
+@dataclasses.dataclass
+class Stat:
+    count: int = 0
+    duration: float = 0  # seconds
+    bytes_read: int = 0
+
+    def add(self, duration, bytes_read=0):
+        self.count += 1
+        self.duration += duration
+        self.bytes_read += bytes_read
+
+
+@dataclasses.dataclass
+class CacheStat:
+    hits: int = 0
+    misses: int = 0
+
+    @property
+    def hit_rate(self):
+        lookups = self.hits + self.misses
+        return self.hits / lookups if lookups else 0
+
+
+class Profiler:
+    def __init__(self, slowest_calls=SLOWEST_CALLS):
+        self.started_at = time.perf_counter()
+        self.phases = {}  # name -> Stat
+        self.calls = {}  # kind ("command" or "request") -> Stat
+        self.caches = {}  # name -> CacheStat
+        self.slowest_calls_count = slowest_calls
+        self._slowest = []  # heap of (duration, kind, description)
+
+    @contextlib.contextmanager
+    def phase(self, name):
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.phases.setdefault(name, Stat()).add(time.perf_counter() - start)
+
+    def iterate(self, name, iterable):
+        """Yield items of ``iterable``, recording the time spent to get
+        them (but not the time spent by the consumer between items) as
+        a phase named ``name``.
+        """
+        iterator = iter(iterable)
+        duration = 0
+        try:
+            while True:
+                start = time.perf_counter()
+                try:
+                    item = next(iterator)
+                except StopIteration:
+                    return
+                finally:
+                    duration += time.perf_counter() - start
+                yield item
+        finally:
+            self.phases.setdefault(name, Stat()).add(duration)
+
+    def record(self, kind, description, duration, bytes_read=0):
+        """Record a subprocess or an HTTP request."""
+        self.calls.setdefault(kind, Stat()).add(duration, bytes_read)
+        item = (duration, kind, description)
+        if len(self._slowest) < self.slowest_calls_count:
+            heapq.heappush(self._slowest, item)
+        elif duration > self._slowest[0][0]:
+            heapq.heapreplace(self._slowest, item)
+
+    def record_cache(self, name, hit):
+        """Record a lookup in the cache named ``name``."""
+        stat = self.caches.setdefault(name, CacheStat())
+        if hit:
+            stat.hits += 1
+        else:
+            stat.misses += 1
+
+    @property
+    def total_duration(self):
+        return time.perf_counter() - self.started_at
+
+    @property
+    def slowest_calls(self):
+        return sorted(self._slowest, reverse=True)
+
+    def to_dict(self):
+        return {
+            "total_duration": self.total_duration,
+            "phases": {name: dataclasses.asdict(stat) for name, stat in self.phases.items()},
+            "calls": {kind: dataclasses.asdict(stat) for kind, stat in self.calls.items()},
+            "caches": {name: dataclasses.asdict(stat) for name, stat in self.caches.items()},
+            "slowest_calls": [
+                {"kind": kind, "description": description, "duration": duration}
+                for duration, kind, description in self.slowest_calls
+            ],
+        }
+
+    def to_text(self):
+        lines = [f"Profile: {self.total_duration:.3f} s in total"]
+        lines.append("Phases:")
+        for name, stat in self.phases.items():
+            lines.append(f"  {name: <20} {stat.duration: >9.3f} s {stat.count: >7} time(s)")
+        lines.append("Subprocesses and requests:")
+        for kind, stat in self.calls.items():
+            lines.append(
+                f"  {kind: <20} {stat.duration: >9.3f} s {stat.count: >7} call(s) "
+                f"{stat.bytes_read: >12} bytes read"
+            )
+        if self.caches:
+            lines.append("Caches:")
+        for name, stat in self.caches.items():
+            lines.append(
+                f"  {name: <20} {stat.hits: >7} hit(s) {stat.misses: >7} miss(es) "
+                f"{stat.hit_rate: >7.1%} hit rate"
+            )
+        lines.append("Slowest subprocesses and requests:")
+        for duration, kind, description in self.slowest_calls:
+            if len(description) > 100:
+                description = description[:97] + "..."
+            lines.append(f"  {duration: >9.3f} s {kind: <8} {description}")
+        return "\n".join(lines)
+
+
+# The profiler of the current run.
+current = Profiler()
+
+
+def reset():
+    global current  # pylint: disable=global-statement
+    current = Profiler()
+
+
+def phase(name):
+    """Return a context manager that records the duration of a phase
+    named ``name``.
+    """
+    return current.phase(name)
+
+
+def iterate(name, iterable):
+    """Yield items of ``iterable``, recording the time spent to get
+    them as a phase named ``name`` (see ``Profiler.iterate()``).
+    """
+    return current.iterate(name, iterable)
+
+
+def record(kind, description, duration, bytes_read=0):
+    current.record(kind, description, duration, bytes_read)
+
+
+def record_cache(name, hit):
+    current.record_cache(name, hit)
+
+
+def report(destination):
+    """Report the profile to the given destination: ``-`` for the
+    standard error, or the path of a JSON file. Do nothing if it is
+    empty.
+    """
+    if not destination:
+        return
+    if destination == "-":
+        print(current.to_text(), file=sys.stderr)
+        return
+    with open(destination, "w", encoding="utf-8") as fp:
+        json.dump(current.to_dict(), fp, indent=2)
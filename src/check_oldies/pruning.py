@@ -0,0 +1,113 @@
+"""Skip files that are not worth searching.
+
+Minified bundles, lock files, generated or vendored code are read by
+each ``git grep`` and give annotations (or FUTURE tags) that nobody
+will fix, and that are slow to blame. Files larger than a given size,
+and files that have given attributes (e.g. ``linguist-generated`` or
+``linguist-vendored``, see ``gitattributes(5)``) are pruned: they are
+neither searched nor blamed.
+"""
+
+import functools
+import os
+import subprocess
+import sys
+import typing
+
+from . import commands
+
+
+# Values of ``git check-attr`` for attributes that are not set.
+UNSET_VALUES = {b"unspecified", b"unset", b"false"}
+
+
+def get_sizes(directory, blob_ids: dict, rev="", timeout=0) -> dict:
+    """Return the size of each file of ``blob_ids`` (a mapping of paths
+    to blob ids), in the working tree or in the ``rev`` revision.
+    """
+    if rev:
+        objects = commands.get_cat_file(directory, "--batch-check").get_objects(
+            list(blob_ids.values()), timeout=timeout,
+        )
+        return {path: obj.size for path, obj in zip(blob_ids, objects)}
+    sizes = {}
+    for path in blob_ids:
+        try:
+            sizes[path] = os.lstat(os.path.join(directory, path)).st_size
+        except FileNotFoundError:  # deleted from the working tree
+            continue
+    return sizes
+
+
+@functools.lru_cache()
+def has_attributes_source(directory) -> bool:
+    """Return whether ``git check-attr`` can read attributes of a given
+    revision (with ``--source``, since Git 2.40).
+    """
+    try:
+        commands.get_output(
+            # The empty tree exists in all repositories, even bare ones.
+            ["git", "check-attr", f"--source={commands.EMPTY_TREE}", "--all", "--", "probe"],
+            cwd=directory,
+        )
+    except subprocess.CalledProcessError:
+        return False
+    return True
+
+
+def get_paths_with_attributes(
+    directory, paths: typing.Sequence[str], attributes: typing.Sequence[str], rev="", timeout=0, retries=0,
+) -> set:
+    """Return paths (among ``paths``) that have any of ``attributes``.
+
+    All paths are given to a single ``git check-attr`` command.
+    Attributes are read from ``.gitattributes`` files of the working
+    tree, or of ``rev`` if ``git`` supports it (and from
+    ``$GIT_DIR/info/attributes``). Otherwise, a warning is printed,
+    since files of ``rev`` may then not be pruned as expected (e.g. in
+    a bare repository, which has no working tree).
+    """
+    if not paths or not attributes:
+        return set()
+    source = []
+    if rev:
+        if has_attributes_source(directory):
+            source = [f"--source={rev}"]
+        else:
+            print(
+                f"Warning: this version of git cannot read attributes of {rev} (Git 2.40 is required). "
+                f"Attributes of the working tree are used instead, if any.",
+                file=sys.stderr,
+            )
+    output = commands.get_raw_output(
+        ["git", "check-attr", "-z", "--stdin", *source, *attributes],
+        cwd=directory,
+        timeout=timeout,
+        retries=retries,
+        input_data=b"".join(os.fsencode(path) + b"\0" for path in paths),
+    )
+    # "<path>\0<attribute>\0<value>\0" for each path and attribute
+    fields = output.split(b"\0")
+    return {
+        os.fsdecode(path)
+        for path, value in zip(fields[0::3], fields[2::3])
+        if value not in UNSET_VALUES
+    }
+
+
+def get_pruned_paths(
+    directory, blob_ids: dict, max_size=0, attributes=(), rev="", timeout=0, retries=0,
+) -> set:
+    """Return paths (among ``blob_ids``, a mapping of paths to blob
+    ids) of files that are larger than ``max_size`` bytes (if set), or
+    that have any of ``attributes``.
+    """
+    pruned = set()
+    if max_size:
+        sizes = get_sizes(directory, blob_ids, rev, timeout=timeout)
+        pruned.update(path for path, size in sizes.items() if size > max_size)
+    remaining = [path for path in blob_ids if path not in pruned]
+    pruned.update(
+        get_paths_with_attributes(directory, remaining, attributes, rev=rev, timeout=timeout, retries=retries)
+    )
+    return pruned
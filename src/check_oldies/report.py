@@ -0,0 +1,82 @@
+import argparse
+import datetime
+import os
+import sys
+
+from . import history
+
+
+def get_parser():
+    parser = argparse.ArgumentParser(
+        prog="check-oldies-report",
+        description=(
+            "Show trends of annotations, branches or orphan FUTURE tags recorded "
+            "in a history file (see the history-file option of other commands)."
+        ),
+    )
+    parser.add_argument(
+        "history_file",
+        help="Path of the history file.",
+    )
+    parser.add_argument(
+        "--by",
+        action="append",
+        choices=sorted(history.GROUP_BY_COLUMNS),
+        dest="group_by",
+        help=(
+            "Group results by this column. Can be given more than once. "
+            "Defaults to week."
+        ),
+    )
+    parser.add_argument(
+        "--kind",
+        choices=history.KINDS,
+        default=history.ANNOTATION,
+        help=f"Kind of findings to report. Defaults to {history.ANNOTATION}.",
+    )
+    parser.add_argument(
+        "--repository",
+        default="",
+        help="Report only findings of this repository. By default, all repositories are reported.",
+    )
+    parser.add_argument(
+        "--since",
+        type=datetime.date.fromisoformat,
+        help="Report only runs of the week of this date (YYYY-MM-DD) and later weeks.",
+    )
+    return parser
+
+
+def format_trends(trends, group_by):
+    headers = [*group_by, "findings", "old findings"]
+    rows = [
+        [*(str(value) for value in trend.group), str(trend.findings), str(trend.old_findings)]
+        for trend in trends
+    ]
+    widths = [max(len(cell) for cell in column) for column in zip(headers, *rows)]
+    lines = []
+    for row in [headers, *rows]:
+        lines.append("  ".join(cell.ljust(width) for cell, width in zip(row, widths)).rstrip())
+    return os.linesep.join(lines)
+
+
+def main(argv=None):
+    if argv is None:
+        argv = sys.argv[1:]
+    args = get_parser().parse_args(argv)
+    if not os.path.exists(args.history_file):
+        sys.exit(f'Invalid path: "{args.history_file}" does not exist.')
+    group_by = args.group_by or ["week"]
+
+    with history.History(args.history_file) as store:
+        trends = store.trend(
+            group_by=group_by,
+            kind=args.kind,
+            repository=args.repository,
+            since=args.since,
+        )
+    print(format_trends(trends, group_by))
+
+
+if __name__ == "__main__":  # pragma: no cover
+    main()
@@ -0,0 +1,328 @@
+"""An in-process alternative to ``git grep``.
+
+Annotations and FUTURE tags are usually searched with several ``git
+grep`` commands (see the ``annotations`` module), which each read all
+files of the repository. The scanner lists files once (with a single
+``git ls-files`` or ``git ls-tree`` command), reads each file once
+(memory-mapped from the working tree, or from a long-lived ``git
+cat-file`` process for files of a revision, see ``commands.CatFile``),
+and searches annotations, occurrences of FUTURE tags and known FUTURE
+tags in a single pass, with a combined regular expression that quickly
+skips lines that match none of them. Files are scanned in parallel by
+several processes.
+
+It gives the same lines as ``git grep`` (see ``ScanResult``). Patterns
+are POSIX extended regular expressions, like those given to ``git
+grep``: they are translated to Python regular expressions (see
+``translate_regex()``).
+"""
+
+import concurrent.futures
+import dataclasses
+import enum
+import functools
+import mmap
+import multiprocessing
+import os
+import re
+
+from . import commands
+from . import compat
+
+
+# ``git grep -I`` considers a file as binary if there is a NUL byte
+# in its first 8000 bytes.
+BINARY_CHECK_SIZE = 8000
+# Number of files scanned by a process at once.
+CHUNK_SIZE = 500
+# Modes (in the index) of files that ``git grep`` searches (i.e. not
+# symbolic links nor submodules).
+REGULAR_FILE_MODES = {"100644", "100755"}
+
+POSIX_CLASSES = {
+    "[:alnum:]": "a-zA-Z0-9",
+    "[:alpha:]": "a-zA-Z",
+    "[:blank:]": " \\t",
+    "[:cntrl:]": "\\x00-\\x1f\\x7f",
+    "[:digit:]": "0-9",
+    "[:graph:]": "!-~",
+    "[:lower:]": "a-z",
+    "[:print:]": " -~",
+    "[:punct:]": "!-/:-@\\[-`{-~",
+    "[:space:]": " \\t\\n\\r\\f\\v",
+    "[:upper:]": "A-Z",
+    "[:xdigit:]": "0-9A-Fa-f",
+}
+
+
+class Engine(compat.StrEnum):
+    GIT = enum.auto()
+    PYTHON = enum.auto()
+
+
+def translate_regex(regex: str) -> str:
+    """Translate a POSIX extended regular expression (as given to
+    ``git grep --extended-regexp``) to a Python regular expression.
+
+    POSIX character classes (e.g. ``[:alnum:]``) are expanded, and
+    quantifiers followed by ``?`` (e.g. ``+?``), which are not lazy
+    in POSIX regular expressions but optional, are made greedy. As
+    POSIX regular expressions match the longest text, this gives the
+    same matches for usual patterns.
+    """
+    translated = []
+    i = 0
+    in_brackets = False
+    while i < len(regex):
+        char = regex[i]
+        if in_brackets:
+            for posix_class, chars in POSIX_CLASSES.items():
+                if regex.startswith(posix_class, i):
+                    translated.append(chars)
+                    i += len(posix_class)
+                    break
+            else:
+                in_brackets = char != "]"
+                # Backslashes are literal in POSIX bracket expressions.
+                translated.append({"\\": "\\\\", "[": "\\["}.get(char, char))
+                i += 1
+            continue
+        if char == "\\" and i + 1 < len(regex):
+            escaped = regex[i + 1]
+            # GNU extensions for the start and the end of a word
+            translated.append({"<": r"\b(?=\w)", ">": r"\b(?<=\w)"}.get(escaped, char + escaped))
+            i += 2
+            continue
+        if char == "[":
+            in_brackets = True
+            translated.append(char)
+            i += 1
+            if regex.startswith("^", i):
+                translated.append("^")
+                i += 1
+            if regex.startswith("]", i):  # a literal, not the end of the expression
+                translated.append("\\]")
+                i += 1
+            continue
+        if char == "?" and translated and translated[-1] in ("+", "*", "?"):
+            # "x+?" is "(x+)?", i.e. "x*"; "x*?" is "x*" and "x??" is "x?".
+            if translated[-1] == "+":
+                translated[-1] = "*"
+            i += 1
+            continue
+        translated.append(char)
+        i += 1
+    return "".join(translated)
+
+
+@dataclasses.dataclass(frozen=True)
+class Patterns:
+    """POSIX extended regular expressions that are searched (see
+    ``git grep`` commands of the ``annotations`` module).
+    """
+    annotation: str  # case-insensitive
+    ignore_pragma: str  # lines with this pragma are ignored
+    future_tag: str  # case-sensitive
+    known_future_tag: str  # case-insensitive, lines with known tags
+
+
+@dataclasses.dataclass(frozen=True)
+class _CompiledPatterns:
+    combined: re.Pattern
+    annotation: re.Pattern
+    ignore_pragma: re.Pattern
+    ignore_pragma_case: re.Pattern
+    future_tag: re.Pattern
+    known_future_tag: re.Pattern
+    known_future_tag_extractor: re.Pattern
+
+
+@functools.lru_cache()
+def _compile(patterns: Patterns) -> _CompiledPatterns:
+    annotation = translate_regex(patterns.annotation)
+    future_tag = translate_regex(patterns.future_tag)
+    known_future_tag = translate_regex(patterns.known_future_tag)
+    return _CompiledPatterns(
+        # Lines that match none of these patterns are skipped.
+        combined=re.compile(
+            f"(?i:{annotation})|{future_tag}|(?i:{known_future_tag})".encode("utf-8"),
+            re.MULTILINE,
+        ),
+        annotation=re.compile(annotation, re.IGNORECASE),
+        ignore_pragma=re.compile(translate_regex(patterns.ignore_pragma), re.IGNORECASE),
+        ignore_pragma_case=re.compile(translate_regex(patterns.ignore_pragma)),
+        future_tag=re.compile(future_tag),
+        known_future_tag=re.compile(known_future_tag, re.IGNORECASE),
+        # Like the ``sed`` command of ``annotations.get_known_future_tags()``.
+        known_future_tag_extractor=re.compile(translate_regex(f".*?({patterns.future_tag}).*?")),
+    )
+
+
+@dataclasses.dataclass
+class ScanResult:
+    """Lines found by the scanner, as ``git grep`` gives them."""
+    # like ``annotations.get_annotation_candidates()``
+    annotation_lines: list[commands.GrepLine] = dataclasses.field(default_factory=list)
+    # like ``annotations.get_future_lines()``
+    future_lines: list[commands.GrepLine] = dataclasses.field(default_factory=list)
+    # like ``annotations.get_known_future_tags()``
+    known_future_tags: set = dataclasses.field(default_factory=set)
+
+    def update(self, other):
+        self.annotation_lines.extend(other.annotation_lines)
+        self.future_lines.extend(other.future_lines)
+        self.known_future_tags.update(other.known_future_tags)
+
+
+def _scan_line(result: ScanResult, compiled: _CompiledPatterns, path, line_no, raw_line):
+    line = commands.decode(raw_line)
+    if line.endswith("\r"):
+        line = line[:-1]
+    if compiled.annotation.search(line) and not compiled.ignore_pragma.search(line):
+        result.annotation_lines.append(commands.GrepLine(path, line_no, line))
+    if not compiled.ignore_pragma_case.search(line):
+        result.future_lines.extend(
+            commands.GrepLine(path, line_no, match.group())
+            for match in compiled.future_tag.finditer(line)
+            if match.group()
+        )
+    if compiled.known_future_tag.search(line):
+        result.known_future_tags.add(compiled.known_future_tag_extractor.sub(r"\1", f"{path}:{line}"))
+
+
+def _scan_content(result: ScanResult, compiled: _CompiledPatterns, path, content):
+    if content.find(b"\0", 0, BINARY_CHECK_SIZE) != -1:
+        return
+    line_no = 1
+    counted = 0  # position up to which newlines have been counted
+    position = 0
+    while match := compiled.combined.search(content, position):
+        line_start = content.rfind(b"\n", 0, match.start()) + 1
+        line_end = content.find(b"\n", match.start())
+        if line_end == -1:
+            line_end = len(content)
+        line_no += content[counted:line_start].count(b"\n")
+        counted = line_start
+        _scan_line(result, compiled, path, line_no, content[line_start:line_end])
+        position = line_end + 1
+
+
+def scan_file(directory, path, patterns: Patterns) -> ScanResult:
+    """Search ``patterns`` in the file at ``path`` (relative to
+    ``directory``).
+    """
+    result = ScanResult()
+    try:
+        with open(os.path.join(directory, path), "rb") as fp:
+            if not os.fstat(fp.fileno()).st_size:
+                return result  # an empty file cannot be mapped
+            with mmap.mmap(fp.fileno(), 0, access=mmap.ACCESS_READ) as content:
+                _scan_content(result, _compile(patterns), path, content)
+    except (FileNotFoundError, NotADirectoryError):  # deleted from the working tree
+        pass
+    except (IsADirectoryError, PermissionError):  # e.g. a submodule, skipped like ``git grep`` does
+        pass
+    return result
+
+
+def _scan_files(directory, files, patterns: Patterns, rev="", timeout=0) -> ScanResult:
+    """Scan ``files``, a list of (path, blob id) tuples. Files of the
+    working tree are read, unless ``rev`` is given: blobs are then
+    read from the repository (by the ``git cat-file`` process of the
+    current process).
+    """
+    result = ScanResult()
+    if not rev:
+        for path, _blob_id in files:
+            result.update(scan_file(directory, path, patterns))
+        return result
+    cat_file = commands.get_cat_file(directory)
+    blobs = cat_file.get_objects([blob_id for _path, blob_id in files], timeout=timeout)
+    compiled = _compile(patterns)
+    for (path, _blob_id), blob in zip(files, blobs):
+        _scan_content(result, compiled, path, blob.content or b"")
+    return result
+
+
+class Scanner:
+    """Search ``patterns`` in tracked files of the working tree of
+    ``directory``, or in files of the ``rev`` revision.
+
+    Files are listed once, and the result of a scan of all files is
+    kept, so that searching annotations and FUTURE tags reads files
+    only once. ``jobs`` is the number of processes that scan files (by
+    default, the number of processors).
+    """
+
+    def __init__(self, directory, patterns: Patterns, excluded=None, timeout=0, retries=0, jobs=0, rev=""):
+        self.directory = directory
+        self.patterns = patterns
+        self.excluded = excluded or (lambda path: False)
+        self.timeout = timeout
+        self.retries = retries
+        self.jobs = jobs or os.cpu_count() or 1
+        self.rev = rev
+        self._blob_ids = None
+        self._result = None
+
+    def get_blob_ids(self):
+        """Return the blob id of each path of regular files,
+        in the order of ``git ls-files`` (or ``git ls-tree``).
+        """
+        if self._blob_ids is not None:
+            return self._blob_ids
+        if self.rev:
+            cmd_list = ["git", "ls-tree", "-r", "-z", self.rev]
+        else:
+            cmd_list = ["git", "ls-files", "-z", "--stage"]
+        output = commands.get_raw_output(
+            cmd_list, cwd=self.directory, timeout=self.timeout, retries=self.retries,
+        )
+        self._blob_ids = {}
+        for entry in output.split(b"\0"):
+            if not entry:
+                continue
+            info, _sep, path = entry.partition(b"\t")
+            # "<mode> <blob id> <stage>" or "<mode> <type> <blob id>"
+            mode, *fields = info.decode().split()
+            if mode in REGULAR_FILE_MODES:
+                # Unmerged files have several entries, the first one is kept.
+                blob_id = fields[1] if self.rev else fields[0]
+                self._blob_ids.setdefault(os.fsdecode(path), blob_id)
+        return self._blob_ids
+
+    def scan(self, paths=None) -> ScanResult:
+        """Scan all files that are not excluded, or only ``paths`` if
+        given.
+        """
+        if paths is None and self._result is not None:
+            return self._result
+        blob_ids = self.get_blob_ids()
+        if paths is None:
+            scanned = [(path, blob_id) for path, blob_id in blob_ids.items() if not self.excluded(path)]
+        else:
+            paths = set(paths)
+            scanned = [(path, blob_id) for path, blob_id in blob_ids.items() if path in paths]
+        chunks = [scanned[start:start + CHUNK_SIZE] for start in range(0, len(scanned), CHUNK_SIZE)]
+        result = ScanResult()
+        if self.jobs == 1 or len(chunks) <= 1:
+            for chunk in chunks:
+                result.update(_scan_files(self.directory, chunk, self.patterns, self.rev, self.timeout))
+        else:
+            # Forked processes would inherit threads and child processes
+            # (e.g. ``git cat-file``) of the current process.
+            context = multiprocessing.get_context("spawn")
+            with concurrent.futures.ProcessPoolExecutor(min(self.jobs, len(chunks)), mp_context=context) as executor:
+                # Results are in the order of chunks, i.e. in the order of files.
+                for chunk_result in executor.map(
+                    _scan_files,
+                    [self.directory] * len(chunks),
+                    chunks,
+                    [self.patterns] * len(chunks),
+                    [self.rev] * len(chunks),
+                    [self.timeout] * len(chunks),
+                ):
+                    result.update(chunk_result)
+        if paths is None:
+            self._result = result
+        return result
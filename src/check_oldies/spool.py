@@ -0,0 +1,210 @@
+"""An on-disk spool of findings.
+
+``forget-me-not`` may check hundreds of repositories. Instead of
+keeping all findings in memory until all repositories have been
+checked, findings are written to a temporary SQLite database as soon
+as a repository has been checked, and read back one recipient at a
+time.
+"""
+
+import os
+import sqlite3
+import tempfile
+
+from . import annotations
+from . import branches
+from . import commands
+from . import githost
+
+
+SCHEMA = """
+CREATE TABLE annotations (
+    id INTEGER PRIMARY KEY,
+    repository TEXT NOT NULL,
+    path TEXT NOT NULL,
+    line_no INTEGER NOT NULL,
+    line_content TEXT NOT NULL,
+    age INTEGER NOT NULL,
+    assignee TEXT NOT NULL,
+    is_old INTEGER NOT NULL,
+    timed_out INTEGER NOT NULL,
+    email TEXT
+);
+CREATE INDEX annotations_assignee ON annotations (assignee);
+CREATE INDEX annotations_email ON annotations (email, age, id);
+
+CREATE TABLE branches (
+    id INTEGER PRIMARY KEY,
+    repo TEXT NOT NULL,
+    name TEXT NOT NULL,
+    url TEXT NOT NULL,
+    author TEXT NOT NULL,
+    age INTEGER NOT NULL,
+    is_old INTEGER NOT NULL,
+    pull_request_number TEXT,
+    pull_request_state TEXT,
+    pull_request_url TEXT,
+    email TEXT
+);
+CREATE INDEX branches_author ON branches (author);
+CREATE INDEX branches_email ON branches (email, age, id);
+"""
+
+# Value of the ``email`` column for findings that must be sent to the
+# catch-all address.
+CATCH_ALL_EMAIL = ""
+
+_RECIPIENT_COLUMNS = {
+    "annotations": "assignee",
+    "branches": "author",
+}
+
+
+class FindingSpool:
+    """Store findings in a temporary SQLite database.
+
+    Use it as a context manager, so that the database is removed when
+    done::
+
+        with FindingSpool() as spool:
+            spool.add_annotations("my-repo", annotations)
+            ...
+    """
+
+    def __init__(self, directory=None):
+        self._tmp_dir = tempfile.TemporaryDirectory(  # pylint: disable=consider-using-with
+            prefix="forget-me-not-", dir=directory
+        )
+        self.connection = sqlite3.connect(os.path.join(self._tmp_dir.name, "spool.sqlite"))
+        self.connection.executescript(SCHEMA)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
+
+    def close(self):
+        self.connection.close()
+        self._tmp_dir.cleanup()
+
+    def add_annotations(self, repository, annotations_):
+        with self.connection:
+            self.connection.executemany(
+                "INSERT INTO annotations "
+                "(repository, path, line_no, line_content, age, assignee, is_old, timed_out) "
+                "VALUES (?, ?, ?, ?, ?, ?, ?, ?)",
+                (
+                    (
+                        repository,
+                        commands.escape_path(str(ann.path)),
+                        ann.line_no,
+                        ann.line_content,
+                        ann.age,
+                        ann.assignee,
+                        ann.is_old,
+                        ann.timed_out,
+                    )
+                    for ann in annotations_
+                ),
+            )
+
+    def add_branches(self, branches_):
+        with self.connection:
+            self.connection.executemany(
+                "INSERT INTO branches "
+                "(repo, name, url, author, age, is_old, "
+                "pull_request_number, pull_request_state, pull_request_url) "
+                "VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)",
+                (
+                    (
+                        branch.repo,
+                        branch.name,
+                        branch.url,
+                        branch.author,
+                        branch.age,
+                        branch.is_old,
+                        *(
+                            (
+                                str(branch.pull_request.number),
+                                branch.pull_request.state,
+                                branch.pull_request.url,
+                            )
+                            if branch.pull_request
+                            else (None, None, None)
+                        ),
+                    )
+                    for branch in branches_
+                ),
+            )
+
+    def get_recipients(self, report_key):
+        """Return distinct recipients (assignees of annotations or
+        authors of branches), in order of first appearance.
+        """
+        column = _RECIPIENT_COLUMNS[report_key]
+        rows = self.connection.execute(
+            f"SELECT {column} FROM {report_key} GROUP BY {column} ORDER BY MIN(id)"
+        )
+        return [row[0] for row in rows]
+
+    def set_email(self, report_key, recipient, email):
+        column = _RECIPIENT_COLUMNS[report_key]
+        with self.connection:
+            self.connection.execute(
+                f"UPDATE {report_key} SET email = ? WHERE {column} = ?",
+                (email, recipient),
+            )
+
+    def get_emails(self, report_key):
+        """Return distinct e-mail addresses, in order of first
+        appearance.
+        """
+        rows = self.connection.execute(
+            f"SELECT email FROM {report_key} GROUP BY email ORDER BY MIN(id)"
+        )
+        return [row[0] for row in rows]
+
+    def iter_annotations(self, email, sort_by_age=False):
+        order_by = "age, id" if sort_by_age else "id"
+        rows = self.connection.execute(
+            "SELECT repository, path, line_no, line_content, age, assignee, is_old, timed_out "
+            f"FROM annotations WHERE email = ? ORDER BY {order_by}",
+            (email,),
+        )
+        for repository, path, line_no, line_content, age, assignee, is_old, timed_out in rows:
+            annotation = annotations.Annotation(
+                path=path,
+                line_no=line_no,
+                line_content=line_content,
+                age=age,
+                assignee=assignee,
+                is_old=bool(is_old),
+                timed_out=bool(timed_out),
+            )
+            annotation.repository = repository
+            yield annotation
+
+    def iter_branches(self, email, sort_by_age=False):
+        order_by = "age, id" if sort_by_age else "id"
+        rows = self.connection.execute(
+            "SELECT repo, name, url, author, age, is_old, "
+            "pull_request_number, pull_request_state, pull_request_url "
+            f"FROM branches WHERE email = ? ORDER BY {order_by}",
+            (email,),
+        )
+        for repo, name, url, author, age, is_old, pr_number, pr_state, pr_url in rows:
+            pull_request = None
+            if pr_number is not None:
+                pull_request = githost.PullRequestInfo(
+                    number=pr_number, state=pr_state, url=pr_url,
+                )
+            yield branches.BranchInfo(
+                repo=repo,
+                name=name,
+                url=url,
+                author=author,
+                age=age,
+                is_old=bool(is_old),
+                pull_request=pull_request,
+            )
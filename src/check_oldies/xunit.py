@@ -1,43 +1,130 @@
 import os
-from xml.etree import ElementTree
+import re
+import shutil
+import tempfile
+import typing
+from xml.sax.saxutils import escape
+from xml.sax.saxutils import quoteattr
+
+
+# Characters that are not allowed in XML 1.0 documents, even escaped.
+INVALID_XML_CHARS = re.compile("[\x00-\x08\x0b\x0c\x0e-\x1f\ufffe\uffff]")
+
+
+def _text(value: str) -> str:
+    return escape(INVALID_XML_CHARS.sub("", value))
+
+
+def _attr(value: str) -> str:
+    return quoteattr(INVALID_XML_CHARS.sub("", value))
+
+
+class XunitWriter:
+    """Write an xUnit report with one test case per object.
+
+    Objects must have ``location`` and ``must_warn`` attributes and a
+    ``to_text()`` method. Test cases of objects that must warn are
+    failures. An error (e.g. results are incomplete) is reported as a
+    test case in error (see ``add_error()``).
+
+    The ``testsuite`` element comes first, but its attributes (the
+    number of tests and failures) are only known at the end. Test
+    cases are hence written to a temporary file as they are added, and
+    copied after the ``testsuite`` element by ``write()``.
+    """
+
+    def __init__(self, suite_name: str, case_name: str, class_name: str):
+        self.suite_name = suite_name
+        self.case_name = case_name
+        self.class_name = class_name
+        self.tests = 0
+        self.failures = 0
+        self.errors = 0
+        self._cases = tempfile.TemporaryFile(  # pylint: disable=consider-using-with
+            mode="w+", encoding="utf-8"
+        )
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self._cases.close()
+
+    def _write_case(self, name: str, text: str = "", failure: bool = False):
+        self.tests += 1
+        case = f"<testcase classname={_attr(self.class_name)} name={_attr(name)}"
+        if not text:
+            self._cases.write(f"{case} />")
+            return
+        if failure:
+            self.failures += 1
+            self._cases.write(
+                f"{case}><failure message={_attr(text)}>{_text(text)}</failure></testcase>"
+            )
+        else:
+            self._cases.write(f"{case}><system-out>{_text(text)}</system-out></testcase>")
+
+    def add(self, obj):
+        self._write_case(obj.location, obj.to_text(), failure=obj.must_warn)
+
+    def add_error(self, message: str):
+        self.tests += 1
+        self.errors += 1
+        self._cases.write(
+            f"<testcase classname={_attr(self.class_name)} name={_attr(self.case_name)}>"
+            f"<error message={_attr(message)}>{_text(message)}</error></testcase>"
+        )
+
+    def write(self, out: typing.TextIO):
+        # If there is no object, write a single successful test case so
+        # that the report is not empty.
+        if not self.tests:
+            self._write_case(self.case_name)
+        out.write('<?xml version="1.0" encoding="utf-8"?>\n')
+        out.write(
+            f"<testsuite name={_attr(self.suite_name)} tests=\"{self.tests}\" "
+            f"errors=\"{self.errors}\" failures=\"{self.failures}\">"
+        )
+        self._cases.seek(0)
+        shutil.copyfileobj(self._cases, out)
+        out.write("</testsuite>\n")
+
+
+def write_xunit(
+    objects: typing.Iterable,
+    out: typing.TextIO,
+    suite_name: str,
+    case_name: str,
+    class_name: str,
+    get_error_message: typing.Callable[[], str] | None = None,
+):
+    """Write an xUnit report of ``objects`` to the ``out`` stream.
+
+    ``get_error_message()`` is called once all objects have been
+    added, since the error (if any) may depend on them.
+    """
+    with XunitWriter(suite_name, case_name, class_name) as writer:
+        for obj in objects:
+            writer.add(obj)
+        error_message = get_error_message() if get_error_message else ""
+        if error_message:
+            writer.add_error(error_message)
+        writer.write(out)
 
 
 def create_xunit_file(
     output_path,
+    objects,
     suite_name,
     case_name,
     class_name,
-    err_msg,
-    stdout,
-    stderr,
+    get_error_message=None,
 ):
     """Create an xUnit file.
 
     If the parent directory of ``output_path`` does not exist, it is
     transparently created.
     """
-    suite = ElementTree.Element(
-        "testsuite",
-        {
-            "name": suite_name,
-            "tests": "1",
-            "errors": "0",
-            "failures": "1" if err_msg else "0",
-        },
-    )
-
-    case = ElementTree.SubElement(
-        suite, "testcase", {"classname": class_name, "name": case_name}
-    )
-    if err_msg:
-        failure = ElementTree.SubElement(case, 'failure', {'message': err_msg})
-        failure.text = f"{stdout}\n{stderr}" if stdout and stderr else stdout or stderr
-
-    system_out = ElementTree.SubElement(case, "system-out")
-    system_out.text = stdout
-
-    system_err = ElementTree.SubElement(case, "system-err")
-    system_err.text = stderr
-
-    os.makedirs(os.path.dirname(output_path), exist_ok=True)
-    ElementTree.ElementTree(suite).write(output_path, encoding="utf-8")
+    os.makedirs(os.path.dirname(os.path.abspath(output_path)), exist_ok=True)
+    with open(output_path, "w", encoding="utf-8") as out:
+        write_xunit(objects, out, suite_name, case_name, class_name, get_error_message)
@@ -1,6 +1,7 @@
 import datetime
 import os
 import pathlib
+import subprocess
 
 
 TEST_DIR_PATH = pathlib.Path(os.path.dirname(__file__))
@@ -12,13 +13,26 @@ TESTING_ANNOTATIONS = ["TIMEBOMB"]
 TESTING_FUTURE_TAG = r"FEWTURE-[-[:alnum:]\._]+?"
 TESTING_IGNORED_ORPHANS_ANNOTATIONS = ["NOFIX"]
 
+
+def git(cwd, *args):
+    """Run a git command (as a known committer) and return its output."""
+    result = subprocess.run(
+        ["git", "-c", "user.name=John", "-c", "user.email=john@example.com", *args],
+        cwd=cwd,
+        check=True,
+        capture_output=True,
+        encoding="utf-8",
+    )
+    return result.stdout.strip()
+
+
 # We need to force the age of each line (i.e. the datetime of the
 # latest commit that touched each line) that we want to display,
 # otherwise we would not be able to control the output. With more work
 # we could perhaps mock only the output of `git blame`, but
 # `get_line_blame` is appropriately tested already. So we'll settle on
 # less work.
-def fake_get_line_blame(filename, line, cwd):
+def fake_get_line_blame(filename, line, cwd, timeout=0, retries=0, rev=""):
     committer_email = "<jane.doe@example.com>"
     commit_datetime = datetime.datetime.now() - datetime.timedelta(days=2)
     return committer_email, commit_datetime.astimezone(datetime.timezone.utc)
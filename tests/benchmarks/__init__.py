@@ -0,0 +1,6 @@
+"""Benchmarks of check-oldies commands on generated repositories.
+
+Run them with::
+
+    $ python -m tests.benchmarks --help
+"""
@@ -0,0 +1,4 @@
+from . import runner
+
+
+runner.main()
@@ -0,0 +1,192 @@
+"""Generate reproducible Git repositories for benchmarks.
+
+Repositories are built with ``git fast-import``, which is much faster
+than running ``git commit`` for each commit. Given the same
+``RepoSpec``, the generated repository is the same (down to commit
+hashes).
+"""
+
+import dataclasses
+import datetime
+import pathlib
+import random
+import subprocess
+
+
+# Annotations and FUTURE tags are built at runtime so that
+# check-fixmes and check-future-tags do not report this file.
+ANNOTATIONS = ("TODO", "FIXME")  # no-check-fixmes
+FUTURE_TAG_PREFIX = "FUTURE" + "-BENCH"
+AUTHOR_NAMES = (
+    "Ada Lovelace", "Alan Turing", "Barbara Liskov", "Donald Knuth",
+    "Edsger Dijkstra", "Frances Allen", "Grace Hopper", "John Backus",
+    "Ken Thompson", "Margaret Hamilton", "Radia Perlman", "Tony Hoare",
+)
+
+
+@dataclasses.dataclass
+class RepoSpec:
+    files: int = 100
+    lines_per_file: int = 200
+    commits: int = 50
+    authors: int = 5
+    history_days: int = 1000  # age of the first commit
+    annotation_density: float = 0.01  # probability that a line is an annotation
+    assigned_ratio: float = 0.5  # ratio of annotations with an assignee
+    future_tags: int = 10  # number of distinct FUTURE tags
+    future_tag_density: float = 0.002  # probability that a line has a FUTURE tag
+    orphan_ratio: float = 0.3  # ratio of FUTURE tags that are not on an annotation line
+    changed_lines_ratio: float = 0.1  # ratio of lines changed in each modified file
+    files_per_commit: int = 5
+    remote_branches: int = 10
+    end_date: datetime.datetime = datetime.datetime(2026, 1, 1, tzinfo=datetime.timezone.utc)
+    seed: int = 0
+
+
+@dataclasses.dataclass
+class RepoSummary:
+    """What has been generated, to validate the results of commands."""
+    path: pathlib.Path
+    commits: int = 0
+    annotations: int = 0
+    future_tag_lines: int = 0
+    orphan_tags: set = dataclasses.field(default_factory=set)
+    remote_branches: int = 0
+
+
+def get_authors(spec):
+    authors = []
+    for i in range(spec.authors):
+        name = AUTHOR_NAMES[i % len(AUTHOR_NAMES)]
+        if i >= len(AUTHOR_NAMES):
+            name = f"{name} {i // len(AUTHOR_NAMES)}"
+        email = name.lower().replace(" ", ".") + "@example.com"
+        authors.append((name, email))
+    return authors
+
+
+class _ContentGenerator:
+    def __init__(self, spec, rng, authors):
+        self.spec = spec
+        self.rng = rng
+        self.authors = authors
+        tags = [f"{FUTURE_TAG_PREFIX}{i}" for i in range(spec.future_tags)]
+        # Tags that are never written along an annotation are orphans.
+        orphan_count = round(len(tags) * spec.orphan_ratio)
+        self.known_tags = tags[orphan_count:]
+        self.all_tags = tags
+
+    def line(self, line_no):
+        rng = self.rng
+        draw = rng.random()
+        if draw < self.spec.annotation_density:
+            annotation = rng.choice(ANNOTATIONS)
+            if rng.random() < self.spec.assigned_ratio:
+                login = rng.choice(self.authors)[1].split("@")[0]
+                annotation = f"{annotation} ({login})"
+            if self.known_tags and rng.random() < 0.5:
+                return f"# {annotation}: remove when {rng.choice(self.known_tags)} is done"
+            return f"# {annotation}: clean up line {line_no}"
+        draw -= self.spec.annotation_density
+        if self.all_tags and draw < self.spec.future_tag_density:
+            return f"call_{line_no}()  # {rng.choice(self.all_tags)}"
+        return f"value_{line_no} = {rng.randrange(10 ** 6)}"
+
+    def file(self):
+        return [self.line(line_no) for line_no in range(self.spec.lines_per_file)]
+
+
+def _data(content):
+    encoded = content.encode("utf-8")
+    return b"data %d\n%s\n" % (len(encoded), encoded)
+
+
+def _commit_header(ref, mark, author, timestamp, message, parent_mark):
+    name, email = author
+    header = (
+        f"commit {ref}\n"
+        f"mark :{mark}\n"
+        f"author {name} <{email}> {timestamp} +0000\n"
+        f"committer {name} <{email}> {timestamp} +0000\n"
+    ).encode("utf-8")
+    header += _data(message)
+    if parent_mark:
+        header += f"from :{parent_mark}\n".encode("utf-8")
+    return header
+
+
+def _file_modification(path, lines):
+    return f"M 100644 inline {path}\n".encode("utf-8") + _data("\n".join(lines) + "\n")
+
+
+def generate_repository(path, spec=None):
+    """Generate a Git repository in ``path`` (which must not exist) and
+    return a ``RepoSummary``.
+    """
+    spec = spec or RepoSpec()
+    path = pathlib.Path(path)
+    rng = random.Random(spec.seed)
+    authors = get_authors(spec)
+    content = _ContentGenerator(spec, rng, authors)
+
+    start = spec.end_date - datetime.timedelta(days=spec.history_days)
+    step = (spec.end_date - start) / max(1, spec.commits)
+    timestamps = [int((start + step * i).timestamp()) for i in range(spec.commits)]
+
+    paths = [f"pkg{i % 10}/module{i}.py" for i in range(spec.files)]
+    files = {}
+    stream = bytearray()
+    for i, timestamp in enumerate(timestamps):
+        mark = i + 1
+        stream += _commit_header(
+            "refs/heads/main", mark, rng.choice(authors), timestamp, f"Commit {i}", mark - 1
+        )
+        if i == 0:
+            for file_path in paths:
+                files[file_path] = content.file()
+                stream += _file_modification(file_path, files[file_path])
+            continue
+        for file_path in rng.sample(paths, min(spec.files_per_commit, len(paths))):
+            lines = files[file_path]
+            changed = max(1, int(len(lines) * spec.changed_lines_ratio))
+            for line_no in rng.sample(range(len(lines)), min(changed, len(lines))):
+                lines[line_no] = content.line(line_no)
+            stream += _file_modification(file_path, lines)
+
+    for i in range(spec.remote_branches):
+        mark = spec.commits + i + 1
+        parent = rng.randrange(spec.commits)
+        stream += _commit_header(
+            f"refs/remotes/origin/feature-{i}", mark, rng.choice(authors), timestamps[parent],
+            f"Work on feature {i}", parent + 1,
+        )
+        stream += _file_modification(f"features/feature{i}.py", [f"feature = {i}"])
+
+    path.mkdir(parents=True)
+    _git(path, "init", "--quiet")
+    _git(path, "symbolic-ref", "HEAD", "refs/heads/main")
+    subprocess.run(
+        ("git", "fast-import", "--quiet"), cwd=path, input=bytes(stream), check=True
+    )
+    _git(path, "reset", "--quiet", "--hard", "main")
+    # ``check-branches`` needs an origin remote to build URLs. It is
+    # never contacted.
+    _git(path, "remote", "add", "origin", f"git@github.com:benchmarks/{path.name}.git")
+
+    summary = RepoSummary(path=path, commits=spec.commits, remote_branches=spec.remote_branches)
+    used_tags = set()
+    known_tags = set()
+    for lines in files.values():
+        for line in lines:
+            if line.startswith("# ") and any(ann in line for ann in ANNOTATIONS):
+                summary.annotations += 1
+                known_tags.update(tag for tag in content.all_tags if f"{tag} " in line)
+            elif FUTURE_TAG_PREFIX in line:
+                summary.future_tag_lines += 1
+                used_tags.add(line.rsplit(" ", 1)[-1])
+    summary.orphan_tags = used_tags - known_tags
+    return summary
+
+
+def _git(path, *args):
+    subprocess.run(("git", *args), cwd=path, check=True)
@@ -0,0 +1,246 @@
+"""Time check-oldies functions on generated repositories.
+
+For each benchmark, we report the wall time (best of ``--repeat``
+runs), the number of spawned subprocesses and the peak memory
+allocated by Python (measured in a separate run, because
+``tracemalloc`` slows things down).
+"""
+
+import argparse
+import contextlib
+import dataclasses
+import io
+import json
+import os
+import pathlib
+import subprocess
+import tempfile
+import time
+import tracemalloc
+import typing
+from unittest import mock
+
+from check_oldies import annotations
+from check_oldies import branches
+from check_oldies import forget_me_not
+
+from .. import githost_simulator
+from . import repo_generator
+
+
+FORGET_ME_NOT_CONFIGURATION = """
+recipients.catch-all = "catch-all@example.com"
+recipients.list = [{recipients}]
+"""
+
+
+@dataclasses.dataclass
+class Result:
+    name: str
+    wall_time: float  # seconds
+    subprocesses: int
+    peak_memory: int  # bytes
+
+    def to_text(self):
+        return (
+            f"{self.name: <20} {self.wall_time: >9.3f} s "
+            f"{self.subprocesses: >8} subprocesses "
+            f"{self.peak_memory / 1024 / 1024: >9.2f} MiB"
+        )
+
+
+@contextlib.contextmanager
+def count_subprocesses():
+    """Count calls to ``subprocess.Popen`` (which ``subprocess.run``
+    uses under the hood).
+    """
+    counter = {"count": 0}
+    popen = subprocess.Popen
+
+    class CountingPopen(popen):  # type: ignore [valid-type, misc]
+        def __init__(self, *args, **kwargs):
+            counter["count"] += 1
+            super().__init__(*args, **kwargs)
+
+    with mock.patch("subprocess.Popen", CountingPopen):
+        yield counter
+
+
+def measure(name: str, func: typing.Callable, repeat: int = 1) -> Result:
+    wall_times = []
+    for _ in range(repeat):
+        with count_subprocesses() as counter:
+            start = time.perf_counter()
+            func()
+            wall_times.append(time.perf_counter() - start)
+
+    tracemalloc.start()
+    try:
+        func()
+        _current, peak = tracemalloc.get_traced_memory()
+    finally:
+        tracemalloc.stop()
+
+    return Result(
+        name=name,
+        wall_time=min(wall_times),
+        subprocesses=counter["count"],
+        peak_memory=peak,
+    )
+
+
+def run_forget_me_not(directory: pathlib.Path):
+    with contextlib.redirect_stdout(io.StringIO()):
+        forget_me_not.main(argv=[str(directory), "--conf", str(directory / "forget-me-not.toml")])
+
+
+@contextlib.contextmanager
+def api_simulator(summary: repo_generator.RepoSummary, platform: str, behaviour: githost_simulator.Behaviour):
+    """Start a simulator of the API of ``platform`` where half of the
+    remote branches of the repository have a pull request. Yield the
+    ``host_api_access`` configuration of ``check-branches``.
+    """
+    simulator = githost_simulator.Simulator(behaviour)
+    repo = summary.path.name
+    project = simulator.add_project(repo, namespace="benchmarks")
+    for i in range(0, summary.remote_branches, 2):
+        if platform == "gitlab":
+            simulator.add_merge_request(project, f"feature-{i}", iid=i + 1)
+        else:
+            simulator.add_pull_request("benchmarks", repo, f"feature-{i}", number=i + 1)
+    simulator.start()
+    try:
+        with mock.patch.dict(os.environ, {"BENCHMARK_API_TOKEN": "secret"}):
+            yield {"api_base_url": simulator.url, "auth_token_env_var": "BENCHMARK_API_TOKEN"}
+    finally:
+        simulator.stop()
+
+
+def run_benchmarks(
+    spec: repo_generator.RepoSpec,
+    repositories: int,
+    repeat: int,
+    work_dir: pathlib.Path,
+    api_platform: str = "github",
+    api_behaviour: githost_simulator.Behaviour | None = None,
+):
+    """Generate repositories in ``work_dir`` and return a list of
+    ``Result``.
+    """
+    summaries = [
+        repo_generator.generate_repository(
+            work_dir / f"repo{i}", dataclasses.replace(spec, seed=spec.seed + i)
+        )
+        for i in range(repositories)
+    ]
+    first = summaries[0].path
+    recipients = ", ".join(
+        f'"{email}"' for _name, email in repo_generator.get_authors(spec)
+    )
+    (work_dir / "forget-me-not.toml").write_text(
+        FORGET_ME_NOT_CONFIGURATION.format(recipients=recipients)
+    )
+
+    ann_config = annotations.Config(path=str(first))
+    branches_config = branches.Config(path=str(first))
+    results = [
+        measure("get_annotations", lambda: annotations.get_annotations(ann_config), repeat),
+        measure("get_orphan_futures", lambda: annotations.get_orphan_futures(ann_config), repeat),
+        measure("get_branches", lambda: branches.get_branches(branches_config), repeat),
+    ]
+    api_behaviour = api_behaviour or githost_simulator.Behaviour()
+    with api_simulator(summaries[0], api_platform, api_behaviour) as host_api_access:
+        api_config = branches.Config(
+            path=str(first), platform=api_platform, host_api_access=host_api_access,
+        )
+        results.append(
+            measure(f"get_branches+{api_platform}", lambda: branches.get_branches(api_config), repeat)
+        )
+    results.append(measure("forget-me-not", lambda: run_forget_me_not(work_dir), repeat))
+    return results
+
+
+def get_parser():
+    parser = argparse.ArgumentParser(
+        prog="python -m tests.benchmarks",
+        description="Benchmark check-oldies on generated Git repositories.",
+    )
+    defaults = repo_generator.RepoSpec()
+    for field in dataclasses.fields(repo_generator.RepoSpec):
+        if field.name == "end_date":
+            continue
+        parser.add_argument(
+            f"--{field.name.replace('_', '-')}",
+            type=type(getattr(defaults, field.name)),
+            default=getattr(defaults, field.name),
+            help=f"Defaults to {getattr(defaults, field.name)}.",
+        )
+    parser.add_argument(
+        "--repositories",
+        type=int,
+        default=3,
+        help="Number of generated repositories (checked by forget-me-not). Defaults to 3.",
+    )
+    parser.add_argument(
+        "--repeat",
+        type=int,
+        default=3,
+        help="Number of runs of each benchmark. The best wall time is reported. Defaults to 3.",
+    )
+    parser.add_argument(
+        "--api-platform",
+        choices=("github", "gitlab"),
+        default="github",
+        help="Platform of the simulated Git host API. Defaults to github.",
+    )
+    parser.add_argument(
+        "--api-latency",
+        type=float,
+        default=0.05,
+        help="Latency (in seconds) of each response of the simulated API. Defaults to 0.05.",
+    )
+    parser.add_argument(
+        "--api-page-size",
+        type=int,
+        default=30,
+        help="Number of items per page of the simulated API. Defaults to 30.",
+    )
+    parser.add_argument("--json", action="store_true", help="Output results as JSON.")
+    parser.add_argument(
+        "--keep",
+        metavar="DIRECTORY",
+        help="Generate repositories in this directory and keep them. By default, they are removed.",
+    )
+    return parser
+
+
+def main(argv=None):
+    args = get_parser().parse_args(argv)
+    spec_fields = {field.name for field in dataclasses.fields(repo_generator.RepoSpec)}
+    spec = repo_generator.RepoSpec(
+        **{key: value for key, value in vars(args).items() if key in spec_fields}
+    )
+
+    with contextlib.ExitStack() as stack:
+        if args.keep:
+            work_dir = pathlib.Path(args.keep)
+            work_dir.mkdir(parents=True)
+        else:
+            work_dir = pathlib.Path(stack.enter_context(tempfile.TemporaryDirectory()))
+        api_behaviour = githost_simulator.Behaviour(
+            latency=args.api_latency, page_size=args.api_page_size,
+        )
+        results = run_benchmarks(
+            spec,
+            args.repositories,
+            args.repeat,
+            work_dir,
+            api_platform=args.api_platform,
+            api_behaviour=api_behaviour,
+        )
+
+    if args.json:
+        print(json.dumps([dataclasses.asdict(result) for result in results], indent=2))
+    else:
+        for result in results:
+            print(result.to_text())
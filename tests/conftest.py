@@ -1 +1,21 @@
-pytest_plugins = ("tests.requests_mocker",)
+import pytest
+
+from . import base
+
+
+pytest_plugins = (
+    "tests.githost_simulator",
+    "tests.requests_mocker",
+    "tests.smtp_server",
+)
+
+
+@pytest.fixture(name="repo")
+def fixture_repo(tmp_path):
+    """Return the path of an empty Git repository.
+
+    Test modules that need files in it override this fixture (and
+    request it to get the repository).
+    """
+    base.git(tmp_path, "init", "--quiet")
+    return tmp_path
@@ -0,0 +1,248 @@
+"""A local HTTP server that simulates GitHub and GitLab APIs.
+
+Contrary to ``requests_mocker``, requests go through the network
+stack, and the server can be configured to behave like a real one:
+latency, pagination, rate limiting and errors. It implements the
+subset of endpoints that ``check_oldies.githost`` uses:
+
+- GitHub: ``GET /repos/<owner>/<repo>/pulls``;
+- GitLab: ``GET /search/`` (projects only) and
+  ``GET /projects/<id>/merge_requests``.
+"""
+
+import dataclasses
+import http.server
+import json
+import random
+import re
+import threading
+import time
+import urllib.parse
+
+import pytest
+
+
+@pytest.fixture(name="githost_simulator")
+def get_simulator():
+    """Return a running instance of ``Simulator`` to be used as a
+    fixture.
+
+    Example::
+
+        def test_api(githost_simulator):
+            githost_simulator.add_pull_request("owner", "repo", "branch", number=1)
+            # call code that uses ``githost_simulator.url`` as the API base URL
+            assert githost_simulator.stats.requests == 1
+    """
+    simulator = Simulator()
+    simulator.start()
+    try:
+        yield simulator
+    finally:
+        simulator.stop()
+
+
+@dataclasses.dataclass
+class Behaviour:
+    latency: float = 0  # seconds, added to each response
+    page_size: int = 30  # default number of items per page (like GitHub)
+    rate_limit: int = 0  # number of requests allowed per window, 0 means no limit
+    rate_limit_window: float = 60  # seconds
+    error_rate: float = 0  # probability that a request fails with a 502 error
+    seed: int = 0
+
+
+@dataclasses.dataclass
+class Stats:
+    requests: int = 0
+    rate_limited: int = 0
+    errors: int = 0
+
+
+class Simulator:
+    def __init__(self, behaviour=None):
+        self.behaviour = behaviour or Behaviour()
+        self.stats = Stats()
+        self.pull_requests = {}  # (owner, repo) -> list of pull requests (newest first)
+        self.projects = []
+        self.merge_requests = {}  # project id -> list of merge requests (newest first)
+        self._lock = threading.Lock()
+        self._random = random.Random(self.behaviour.seed)
+        self._window_start = time.monotonic()
+        self._window_requests = 0
+        self._server = None
+        self._thread = None
+
+    @property
+    def url(self):
+        host, port = self._server.server_address[:2]
+        return f"http://{host}:{port}"
+
+    def start(self):
+        handler = type("BoundHandler", (Handler,), {"simulator": self})
+        self._server = http.server.ThreadingHTTPServer(("127.0.0.1", 0), handler)
+        self._server.daemon_threads = True
+        self._thread = threading.Thread(
+            target=self._server.serve_forever, kwargs={"poll_interval": 0.05}, daemon=True
+        )
+        self._thread.start()
+
+    def stop(self):
+        self._server.shutdown()
+        self._server.server_close()
+        self._thread.join()
+
+    # Data
+    def add_pull_request(self, owner, repo, branch, number, state="open"):
+        self.pull_requests.setdefault((owner, repo), []).insert(0, {
+            "number": number,
+            "state": state,
+            "head": {"label": f"{owner}:{branch}", "ref": branch},
+            "html_url": f"https://github.com/{owner}/{repo}/pull/{number}",
+        })
+
+    def add_project(self, name, namespace="group"):
+        project = {
+            "id": len(self.projects) + 1,
+            "name": name,
+            "path_with_namespace": f"{namespace}/{name}",
+        }
+        self.projects.append(project)
+        return project
+
+    def add_merge_request(self, project, branch, iid, state="opened"):
+        self.merge_requests.setdefault(project["id"], []).insert(0, {
+            "iid": iid,
+            "state": state,
+            "source_branch": branch,
+            "web_url": f"https://gitlab.com/{project['path_with_namespace']}/-/merge_requests/{iid}",
+        })
+
+    # Behaviour
+    def check_rate_limit(self):
+        """Return remaining requests in the current window and the
+        time of its reset, or ``None`` if rate limiting is disabled.
+        """
+        if not self.behaviour.rate_limit:
+            return None
+        with self._lock:
+            now = time.monotonic()
+            if now - self._window_start >= self.behaviour.rate_limit_window:
+                self._window_start = now
+                self._window_requests = 0
+            self._window_requests += 1
+            remaining = self.behaviour.rate_limit - self._window_requests
+            reset = self._window_start + self.behaviour.rate_limit_window - now
+        return remaining, reset
+
+    def should_fail(self):
+        with self._lock:
+            return self._random.random() < self.behaviour.error_rate
+
+    def count(self, stat):
+        with self._lock:
+            setattr(self.stats, stat, getattr(self.stats, stat) + 1)
+
+
+GITHUB_PULLS = re.compile(r"^/repos/(?P<owner>[^/]+)/(?P<repo>[^/]+)/pulls$")
+GITLAB_SEARCH = re.compile(r"^/search/?$")
+GITLAB_MERGE_REQUESTS = re.compile(r"^/projects/(?P<id>\d+)/merge_requests$")
+
+
+class Handler(http.server.BaseHTTPRequestHandler):
+    simulator: Simulator
+
+    def log_message(self, format, *args):  # pylint: disable=redefined-builtin
+        pass  # keep test output clean
+
+    def do_GET(self):  # pylint: disable=invalid-name
+        simulator = self.simulator
+        simulator.count("requests")
+        if simulator.behaviour.latency:
+            time.sleep(simulator.behaviour.latency)
+
+        headers = {}
+        rate_limit = simulator.check_rate_limit()
+        if rate_limit is not None:
+            remaining, reset = rate_limit
+            headers = {
+                "X-RateLimit-Limit": str(simulator.behaviour.rate_limit),
+                "X-RateLimit-Remaining": str(max(0, remaining)),
+                "X-RateLimit-Reset": str(int(time.time() + reset)),
+            }
+            if remaining < 0:
+                simulator.count("rate_limited")
+                headers["Retry-After"] = str(int(reset) + 1)
+                self.send_json(429, {"message": "API rate limit exceeded"}, headers)
+                return
+
+        if simulator.should_fail():
+            simulator.count("errors")
+            self.send_json(502, {"message": "Bad Gateway"}, headers)
+            return
+
+        if not self.headers.get("Authorization"):
+            self.send_json(401, {"message": "Requires authentication"}, headers)
+            return
+
+        parsed = urllib.parse.urlparse(self.path)
+        query = dict(urllib.parse.parse_qsl(parsed.query))
+        items = self.route(parsed.path, query)
+        if items is None:
+            self.send_json(404, {"message": "Not Found"}, headers)
+            return
+        self.send_page(parsed.path, query, items, headers)
+
+    def route(self, path, query):
+        simulator = self.simulator
+        match = GITHUB_PULLS.match(path)
+        if match:
+            pulls = simulator.pull_requests.get((match.group("owner"), match.group("repo")), [])
+            if "head" in query:
+                pulls = [pull for pull in pulls if pull["head"]["label"] == query["head"]]
+            if query.get("state", "open") != "all":
+                pulls = [pull for pull in pulls if pull["state"] == query.get("state", "open")]
+            return pulls
+        if GITLAB_SEARCH.match(path):
+            if query.get("scope") != "projects":
+                return None
+            return [
+                project for project in simulator.projects
+                if query.get("search", "") in project["name"]
+            ]
+        match = GITLAB_MERGE_REQUESTS.match(path)
+        if match:
+            merge_requests = simulator.merge_requests.get(int(match.group("id")), [])
+            if "source_branch" in query:
+                merge_requests = [
+                    mr for mr in merge_requests if mr["source_branch"] == query["source_branch"]
+                ]
+            return merge_requests
+        return None
+
+    def send_page(self, path, query, items, headers):
+        page_size = int(query.get("per_page", self.simulator.behaviour.page_size))
+        page = int(query.get("page", 1))
+        start = (page - 1) * page_size
+        total_pages = max(1, -(-len(items) // page_size))
+        headers = dict(headers)
+        headers["X-Page"] = str(page)
+        headers["X-Per-Page"] = str(page_size)
+        headers["X-Total"] = str(len(items))
+        headers["X-Total-Pages"] = str(total_pages)
+        if page < total_pages:
+            headers["X-Next-Page"] = str(page + 1)
+            next_query = urllib.parse.urlencode({**query, "page": page + 1})
+            host = self.headers.get("Host")
+            headers["Link"] = f'<http://{host}{path}?{next_query}>; rel="next"'
+        self.send_json(200, items[start:start + page_size], headers)
+
+    def send_json(self, status, content, headers):
+        body = json.dumps(content).encode("utf-8")
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(body)))
+        for name, value in headers.items():
+            self.send_header(name, value)
+        self.end_headers()
+        self.wfile.write(body)
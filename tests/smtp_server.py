@@ -0,0 +1,113 @@
+"""A local stand-in SMTP server.
+
+It understands just enough of the protocol for ``smtplib`` to send
+messages, and can be told to fail to test retries.
+"""
+
+import email
+import email.policy
+import socketserver
+import threading
+
+import pytest
+
+
+@pytest.fixture(name="smtp_server")
+def get_server():
+    """Return a running instance of ``Server`` to be used as a fixture.
+
+    Example::
+
+        def test_send(smtp_server):
+            smtp_server.fail_next(2)  # first 2 messages get a 451 reply
+            # send messages to ``smtp_server.host`` and ``smtp_server.port``
+            assert len(smtp_server.messages) == 1
+    """
+    server = Server()
+    thread = threading.Thread(
+        target=server.serve_forever, kwargs={"poll_interval": 0.05}, daemon=True
+    )
+    thread.start()
+    try:
+        yield server
+    finally:
+        server.shutdown()
+        server.server_close()
+        thread.join()
+
+
+class Handler(socketserver.StreamRequestHandler):
+    server: "Server"
+
+    def reply(self, line):
+        self.wfile.write(f"{line}\r\n".encode("ascii"))
+
+    def handle(self):
+        with self.server.lock:
+            self.server.connections += 1
+        self.reply("220 localhost stand-in SMTP server")
+        while True:
+            line = self.rfile.readline()
+            if not line:
+                return
+            command = line.decode("ascii").strip().split(" ", 1)[0].upper()
+            if command in ("EHLO", "HELO"):
+                self.reply("250 localhost")
+            elif command in ("MAIL", "RCPT", "RSET", "NOOP"):
+                self.reply("250 OK")
+            elif command == "DATA":
+                self.reply("354 End data with <CR><LF>.<CR><LF>")
+                self.receive_data()
+            elif command == "QUIT":
+                self.reply("221 Bye")
+                return
+            else:
+                self.reply("502 Command not implemented")
+
+    def receive_data(self):
+        lines = []
+        while True:
+            line = self.rfile.readline()
+            if line in (b".\r\n", b""):
+                break
+            if line.startswith(b".."):
+                line = line[1:]
+            lines.append(line)
+        with self.server.lock:
+            failures = self.server.failures
+            if failures:
+                self.server.failures -= 1
+        if failures:
+            self.reply(f"{self.server.failure_code} Try again later")
+            return
+        message = email.message_from_bytes(b"".join(lines), policy=email.policy.default)
+        with self.server.lock:
+            self.server.messages.append(message)
+        self.reply("250 OK: queued")
+
+
+class Server(socketserver.ThreadingTCPServer):
+    daemon_threads = True
+    allow_reuse_address = True
+
+    def __init__(self):
+        super().__init__(("127.0.0.1", 0), Handler)
+        self.lock = threading.Lock()
+        self.messages = []
+        self.connections = 0
+        self.failures = 0
+        self.failure_code = 451
+
+    @property
+    def host(self):
+        return self.server_address[0]
+
+    @property
+    def port(self):
+        return self.server_address[1]
+
+    def fail_next(self, count, code=451):
+        """Reply with an error to the next ``count`` messages."""
+        with self.lock:
+            self.failures = count
+            self.failure_code = code
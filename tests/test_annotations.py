@@ -1,7 +1,18 @@
+import dataclasses
 import datetime
+import fnmatch
+import os
 from unittest import mock
 
+import pytest
+
 from check_oldies import annotations
+from check_oldies import baseline
+from check_oldies import budget
+from check_oldies import history
+from check_oldies import profiling
+from check_oldies import scanner
+from check_oldies import spool
 
 from . import base
 
@@ -20,16 +31,16 @@ and-a-final value
 
 class TestGetLineBlame:
 
-    # Return a function that mimics what `commands.get_output()`
+    # Return a function that mimics what `commands.get_raw_output()`
     # returns for `git blame`.
     def mock_git_blame(self, mail, timestamp, offset):
-        def mocked_func(cmd_list, cwd):
+        def mocked_func(cmd_list, cwd, **kwargs):
             assert " ".join(cmd_list) == "git blame -L 12,12 --porcelain -- file.py"
             assert cwd == "dir"
             output = FAKE_GIT_BLAME_OUTPUT.format(
                 mail=mail, timestamp=timestamp, offset=offset
             )
-            return output.split("\n")
+            return output.encode("utf-8")
 
         return mocked_func
 
@@ -40,7 +51,7 @@ class TestGetLineBlame:
         timestamp = 1466179874  # 2016-06-17 17:11:14
         git_blame = self.mock_git_blame("john@example.com", timestamp, "+0100")
         dt = datetime.datetime(2016, 6, 17, 16, 11, 14, tzinfo=datetime.timezone.utc)
-        with mock.patch("check_oldies.commands.get_output", git_blame):
+        with mock.patch("check_oldies.commands.get_raw_output", git_blame):
             commit_mail, commit_datetime = annotations.get_line_blame(
                 "file.py", "12", cwd="dir"
             )
@@ -52,7 +63,7 @@ class TestGetLineBlame:
         timestamp = 1467382795  # 2016-06-17 10:19:55
         git_blame = self.mock_git_blame("john@example.com", timestamp, "-0400")
         dt = datetime.datetime(2016, 7, 1, 14, 19, 55, tzinfo=datetime.timezone.utc)
-        with mock.patch("check_oldies.commands.get_output", git_blame):
+        with mock.patch("check_oldies.commands.get_raw_output", git_blame):
             commit_mail, commit_datetime = annotations.get_line_blame(
                 "file.py", "12", cwd="dir"
             )
@@ -90,3 +101,226 @@ class TestGetKnownFutureTag:
             whitelist=["file2.py"],
         )
         assert tags == {"FEWTURE-BOOM1"}
+
+
+def test_is_whitelisted():
+    whitelist = ["docs", "*.min.js", "vendor/lib.py"]
+    assert annotations.is_whitelisted("docs/index.rst", whitelist)
+    assert annotations.is_whitelisted("static/js/app.min.js", whitelist)
+    assert annotations.is_whitelisted("vendor/lib.py", whitelist)
+    assert not annotations.is_whitelisted("documentation.txt", whitelist)
+    assert not annotations.is_whitelisted("vendor/lib.pyc.py", whitelist)
+
+
+def test_whitelist():
+    patterns = ["docs/", "*.min.js", "vendor/lib.py", "static/*/gen", "file[12].py", "a/b"]
+    whitelist = annotations.Whitelist(patterns)
+    paths = [
+        "docs/index.rst", "docs", "documentation.txt", "app.min.js", "static/js/app.min.js",
+        "vendor/lib.py", "vendor/lib.py/sub.py", "vendor/lib.pyc.py", "static/js/gen/main.js",
+        "static/gen", "file1.py", "file3.py", "dir/file1.py", "a/b", "a/b/c/d.py", "a/bc.py", "x/a/b",
+    ]
+    # The same paths match as with the original, pattern by pattern, matching.
+    expected = [
+        path for path in paths
+        if any(
+            fnmatch.fnmatchcase(path, pattern) or path.startswith(pattern.rstrip("/") + "/")
+            for pattern in patterns
+        )
+    ]
+    assert [path for path in paths if whitelist.matches(path)] == expected
+    assert "docs" not in expected and "a/b/c/d.py" in expected and "x/a/b" not in expected
+    assert not annotations.Whitelist([])
+
+
+def test_read_whitelist_file(tmp_path):
+    (tmp_path / "lines.txt").write_text("docs\n\n*.min.js \n", encoding="utf-8")
+    assert annotations.read_whitelist_file(tmp_path / "lines.txt") == ["docs", "*.min.js"]
+    (tmp_path / "nul.txt").write_text("docs\0weird\nname.py\0", encoding="utf-8")
+    assert annotations.read_whitelist_file(tmp_path / "nul.txt") == ["docs", "weird\nname.py"]
+
+
+def test_iter_annotations_of_several_refs(tmp_path):
+    base.git(tmp_path, "init", "--quiet", "--initial-branch=main")
+    (tmp_path / "common.py").write_text("# TIMEBOMB: on all branches\n", encoding="utf-8")
+    (tmp_path / "changed.py").write_text("# TIMEBOMB: before release\n", encoding="utf-8")
+    base.git(tmp_path, "add", ".")
+    base.git(tmp_path, "commit", "--quiet", "-m", "Initial commit")
+    base.git(tmp_path, "branch", "release/1.x")
+    (tmp_path / "changed.py").write_text("# TIMEBOMB: after release\n", encoding="utf-8")
+    base.git(tmp_path, "commit", "--quiet", "--all", "-m", "Change")
+    config = annotations.Config(
+        path=tmp_path,
+        annotations=base.TESTING_ANNOTATIONS,
+        refs=["main", "release/1.x"],
+    )
+    profiling.reset()
+
+    found = annotations.get_annotations(config)
+
+    assert [(ann.ref, ann.path, ann.line_content) for ann in found] == [
+        ("main", "changed.py", "# TIMEBOMB: after release"),
+        ("main", "common.py", "# TIMEBOMB: on all branches"),
+        ("release/1.x", "changed.py", "# TIMEBOMB: before release"),
+        ("release/1.x", "common.py", "# TIMEBOMB: on all branches"),
+    ]
+    assert found[0].location == "main:changed.py:1"
+    assert all(ann.assignee == "john" for ann in found)
+    # "common.py" is searched and blamed only once.
+    blobs = profiling.current.caches["blobs"]
+    assert (blobs.hits, blobs.misses) == (1, 3)
+    blames = profiling.current.caches["blames"]
+    assert (blames.hits, blames.misses) == (1, 3)
+
+
+def test_cache_file(tmp_path):
+    repo = tmp_path / "repo"
+    repo.mkdir()
+    base.git(repo, "init", "--quiet")
+    (repo / "file1.py").write_text("# TIMEBOMB: initial\nFEWTURE-ORPHAN\n", encoding="utf-8")
+    (repo / "file2.py").write_text("# TIMEBOMB: unchanged\n", encoding="utf-8")
+    base.git(repo, "add", ".")
+    base.git(repo, "commit", "--quiet", "-m", "Initial commit")
+    options = {
+        "path": repo,
+        "annotations": base.TESTING_ANNOTATIONS,
+        "future_tag_regex": base.TESTING_FUTURE_TAG,
+    }
+    config = annotations.Config(**options, cache_file=str(tmp_path / "cache.sqlite"))
+    expected = [
+        (ann.path, ann.line_no, ann.line_content)
+        for ann in annotations.iter_unblamed_annotations(annotations.Config(**options))
+    ]
+
+    profiling.reset()
+    first = annotations.iter_unblamed_annotations(config)
+    assert [(ann.path, ann.line_no, ann.line_content) for ann in first] == expected
+    assert profiling.current.caches["blobs"].misses == 2
+
+    # Only the file that is modified in the working tree is searched.
+    (repo / "file1.py").write_text("# TIMEBOMB: modified\n", encoding="utf-8")
+    profiling.reset()
+    second = annotations.iter_unblamed_annotations(config)
+    assert [(ann.path, ann.line_content) for ann in second] == [
+        ("file1.py", "# TIMEBOMB: modified"),
+        ("file2.py", "# TIMEBOMB: unchanged"),
+    ]
+    blobs = profiling.current.caches["blobs"]
+    assert (blobs.hits, blobs.misses) == (1, 0)
+
+    # FUTURE tags are cached separately.
+    base.git(repo, "checkout", "--quiet", "file1.py")
+    orphans = annotations.get_orphan_futures(config)
+    assert [(orphan.path, orphan.tag) for orphan in orphans] == [("file1.py", "FEWTURE-ORPHAN")]
+
+    # Lines found by an engine are not reused by the other one.
+    profiling.reset()
+    python_config = dataclasses.replace(config, engine=scanner.Engine.PYTHON)
+    orphans = annotations.get_orphan_futures(python_config)
+    assert [(orphan.path, orphan.tag) for orphan in orphans] == [("file1.py", "FEWTURE-ORPHAN")]
+    blobs = profiling.current.caches["blobs"]
+    assert (blobs.hits, blobs.misses) == (0, 2)
+
+
+def test_annotations_are_blamed_as_they_are_found():
+    def iter_unblamed_annotations(config):
+        yield annotations.Annotation("file1.py", 1, "# TIMEBOMB: first")
+        raise AssertionError("The search should not be consumed further")
+
+    config = annotations.Config(annotations=base.TESTING_ANNOTATIONS)
+    with mock.patch.object(annotations, "iter_unblamed_annotations", iter_unblamed_annotations):
+        with mock.patch.object(annotations, "get_blame", return_value=base.fake_get_line_blame("file1.py", 1, ".")):
+            found = annotations.iter_annotations(config, budget.TimeBudget(config.time_budget))
+            assert next(found).path == "file1.py"
+
+
+def test_uncommitted_files_are_the_newest(tmp_path):
+    base.git(tmp_path, "init", "--quiet")
+    for name in ("committed.py", "modified.py"):
+        (tmp_path / name).write_text(f"# TIMEBOMB: {name}\n", encoding="utf-8")
+    base.git(tmp_path, "add", ".")
+    base.git(tmp_path, "commit", "--quiet", "-m", "Initial commit")
+    (tmp_path / "added.py").write_text("# TIMEBOMB: added.py\n", encoding="utf-8")
+    base.git(tmp_path, "add", "added.py")
+    (tmp_path / "modified.py").write_text("# TIMEBOMB: modified.py, again\n", encoding="utf-8")
+    (tmp_path / "untracked.py").write_text("# TIMEBOMB: untracked.py\n", encoding="utf-8")
+    config = annotations.Config(path=tmp_path, annotations=base.TESTING_ANNOTATIONS, fail_fast=True)
+
+    assert annotations.get_uncommitted_paths(tmp_path) == {"added.py", "modified.py"}
+    with mock.patch.object(annotations, "get_blame", return_value=base.fake_get_line_blame("file1.py", 1, ".")):
+        found = annotations.get_annotations(config)
+    assert [ann.path for ann in found] == ["committed.py", "added.py", "modified.py"]
+
+
+def test_paths_and_contents_are_not_decoded_as_utf8(tmp_path):
+    base.git(tmp_path, "init", "--quiet")
+    (tmp_path / "a:b.py").write_bytes("# TIMEBOMB: café\n".encode("latin-1"))
+    (tmp_path / "new\nline.py").write_text("# TIMEBOMB (jsmith): newline\n", encoding="utf-8")
+    base.git(tmp_path, "add", ".")
+    base.git(tmp_path, "commit", "--quiet", "-m", "Initial commit")
+    # Oldest files first, so that last modifications are looked up too.
+    config = annotations.Config(path=tmp_path, annotations=base.TESTING_ANNOTATIONS, fail_fast=True)
+
+    found = annotations.get_annotations(config)
+
+    assert [(ann.path, ann.line_no, ann.line_content, ann.assignee) for ann in found] == [
+        ("a:b.py", 1, "# TIMEBOMB: caf�", "john"),
+        ("new\nline.py", 1, "# TIMEBOMB (jsmith): newline", "jsmith"),
+    ]
+    times = annotations.get_last_modification_times(tmp_path, ["a:b.py", "new\nline.py"])
+    assert sorted(times) == ["a:b.py", "new\nline.py"]
+    assert all(times.values())
+
+
+def test_paths_that_are_not_utf8_can_be_stored(tmp_path):
+    repo = tmp_path / "repo"
+    repo.mkdir()
+    base.git(repo, "init", "--quiet")
+    with open(os.path.join(os.fsencode(repo), b"caf\xe9.py"), "wb") as fp:
+        fp.write(b"# TIMEBOMB: in a Latin-1 path\n")
+    base.git(repo, "add", ".")
+    base.git(repo, "commit", "--quiet", "-m", "Initial commit")
+    config = annotations.Config(path=repo, annotations=base.TESTING_ANNOTATIONS)
+    found = annotations.get_annotations(config)
+    assert [ann.path for ann in found] == [os.fsdecode(b"caf\xe9.py")]
+
+    config.baseline = str(tmp_path / "baseline.txt")
+    assert annotations.update_baseline(config) == 1
+    assert list(baseline.read(config.baseline)) == ["timebomb 41140afd69ceda88 caf\\xe9.py"]
+    assert annotations.get_annotations(config) == []
+
+    with history.History(str(tmp_path / "history.sqlite")) as store:
+        run_id = store.start_run("check-fixmes", "repo", "HEAD")
+        list(store.track_annotations(run_id, found, config.max_age, config.get_tag))
+        paths = store.connection.execute("SELECT path FROM findings").fetchall()
+    assert paths == [("caf\\xe9.py", )]
+
+    with spool.FindingSpool() as findings:
+        findings.add_annotations("repo", found)
+        paths = findings.connection.execute("SELECT path FROM annotations").fetchall()
+    assert paths == [("caf\\xe9.py", )]
+
+
+@pytest.mark.parametrize("engine", list(scanner.Engine))
+def test_whitelist_file(tmp_path, engine):
+    repo = tmp_path / "repo"
+    repo.mkdir()
+    base.git(repo, "init", "--quiet")
+    for path in ("file1.py", "vendor/lib.py", "static/app.min.js"):
+        (repo / path).parent.mkdir(exist_ok=True)
+        (repo / path).write_text("# TIMEBOMB: FEWTURE-TAG\nFEWTURE-ORPHAN\n", encoding="utf-8")
+    base.git(repo, "add", ".")
+    base.git(repo, "commit", "--quiet", "-m", "Initial commit")
+    (tmp_path / "whitelist.txt").write_text("vendor\n*.min.js\n", encoding="utf-8")
+    config = annotations.Config(
+        path=repo,
+        engine=engine,
+        annotations=base.TESTING_ANNOTATIONS,
+        future_tag_regex=base.TESTING_FUTURE_TAG,
+        whitelist_file=str(tmp_path / "whitelist.txt"),
+    )
+
+    found = annotations.iter_unblamed_annotations(config)
+    assert [(ann.path, ann.line_no) for ann in found] == [("file1.py", 1)]
+    orphans = annotations.get_orphan_futures(config)
+    assert [(orphan.path, orphan.tag) for orphan in orphans] == [("file1.py", "FEWTURE-ORPHAN")]
@@ -0,0 +1,63 @@
+"""Check that benchmark tools work (not a benchmark itself)."""
+
+import subprocess
+
+from check_oldies import annotations
+from check_oldies import branches
+
+from . import githost_simulator
+from .benchmarks import repo_generator
+from .benchmarks import runner
+
+
+SMALL_SPEC = repo_generator.RepoSpec(
+    files=10,
+    lines_per_file=50,
+    commits=5,
+    annotation_density=0.05,
+    future_tag_density=0.05,
+    remote_branches=2,
+)
+
+
+def get_head(path):
+    return subprocess.run(
+        ("git", "rev-parse", "HEAD"), cwd=path, capture_output=True, check=True, text=True
+    ).stdout
+
+
+def test_generate_repository(tmp_path):
+    summary = repo_generator.generate_repository(tmp_path / "repo", SMALL_SPEC)
+
+    config = annotations.Config(path=str(summary.path))
+    assert len(annotations.get_annotations(config)) == summary.annotations
+    orphans = annotations.get_orphan_futures(config)
+    assert {orphan.tag for orphan in orphans} == summary.orphan_tags
+    assert len(branches.get_branches(branches.Config(path=str(summary.path)))) == 2
+
+
+def test_generate_repository_is_reproducible(tmp_path):
+    repo_generator.generate_repository(tmp_path / "repo1", SMALL_SPEC)
+    repo_generator.generate_repository(tmp_path / "repo2", SMALL_SPEC)
+    assert get_head(tmp_path / "repo1") == get_head(tmp_path / "repo2")
+
+
+def test_run_benchmarks(tmp_path):
+    results = runner.run_benchmarks(SMALL_SPEC, repositories=2, repeat=1, work_dir=tmp_path)
+    assert [result.name for result in results] == [
+        "get_annotations",
+        "get_orphan_futures",
+        "get_branches",
+        "get_branches+github",
+        "forget-me-not",
+    ]
+    assert all(result.subprocesses > 0 for result in results)
+
+
+def test_api_simulator(tmp_path):
+    summary = repo_generator.generate_repository(tmp_path / "repo", SMALL_SPEC)
+    with runner.api_simulator(summary, "gitlab", githost_simulator.Behaviour()) as host_api_access:
+        config = branches.Config(path=str(summary.path), platform="gitlab", host_api_access=host_api_access)
+        found = {branch.name: branch.pull_request for branch in branches.get_branches(config)}
+    assert found["feature-0"].number == 1
+    assert found["feature-1"] is None
@@ -128,3 +128,39 @@ def test_xunit_file_generation(capfd: pytest.CaptureFixture):
 
     assert caught_exit.value.code == 0
     assert 'failures="0"' in captured.out
+
+
+def test_fail_fast(capfd: pytest.CaptureFixture):
+    config = branches.Config(
+        path=base.TEST_DIR_PATH.parent,
+        colorize_errors=False,
+        fail_fast=True,
+    )
+
+    today = datetime.date.today()
+    long_ago = today - datetime.timedelta(days=100)
+    replacements = {
+        # Oldest branches first
+        "git for-each-ref --sort=committerdate --format=%(refname:short) refs/remotes/origin/": (
+            "origin/jsmith/old",
+            "origin/jsmith/older",
+            "origin/HEAD",
+        ),
+        "git log origin/jsmith/old -1 --format=%ae %ci": (
+            f"john.smith@example.com {long_ago.strftime('%Y-%m-%d')} 12:00:00 +0200",
+        ),
+    }
+    with intercept_commands(replacements):
+        with mock.patch("check_oldies.configuration.get_config", return_value=config):
+            with pytest.raises(SystemExit) as caught_exit:
+                check_branches.main()
+    captured = capfd.readouterr()
+
+    # "jsmith/older" is not checked (and its age would not be known).
+    assert caught_exit.value.code == os.EX_DATAERR
+    stdout = captured.out.rstrip().split(os.linesep)
+    # pylint: disable=line-too-long
+    assert stdout == [
+        "NOK: Some branches are too old.",
+        "john.smith@example.com         -  100 days - jsmith/old (https://github.com/Polyconseil/check-oldies/tree/jsmith/old)",
+    ]
@@ -1,6 +1,8 @@
 """Integration tests for the ``check-fixmes`` command."""
 
+import json
 import os
+import subprocess
 from unittest import mock
 
 import pytest
@@ -70,3 +72,227 @@ def test_xunit_file_generation(capfd: pytest.CaptureFixture):
 
     assert caught_exit.value.code == 0
     assert 'failures="0"' in captured.out
+
+
+@mock.patch("check_oldies.annotations.get_line_blame", base.fake_get_line_blame)
+def test_stream_output(capfd: pytest.CaptureFixture):
+    config = annotations.Config(
+        path=base.TEST_DIR_PATH / "data/project1",
+        max_age=1,
+        colorize_errors=False,
+        annotations=base.TESTING_ANNOTATIONS,
+        stream=True,
+    )
+
+    with mock.patch("check_oldies.configuration.get_config", return_value=config):
+        with pytest.raises(SystemExit) as caught_exit:
+            check_fixmes.main()
+    captured = capfd.readouterr()
+
+    assert caught_exit.value.code == 65
+    stdout = captured.out.rstrip().split(os.linesep)
+    # Results are not sorted, and the status comes last.
+    expected = [
+        "jane.doe        -    2 days - file1.py:1: # TIMEBOMB: report me",
+        "jsmith          -    2 days - file1.py:2: a = 1  # TIMEBOMB (jsmith): report me",
+        "jsmith          -    2 days - file1.py:4: # TIMEBOMB(jsmith - 2020-04-25): report me",
+        "jane.doe        -    2 days - file1.py:8: # TIMEBOMB - FEWTURE-BOOM: report me",
+        "jane.doe        -    2 days - file2.py:1: # TIMEBOMB: report me",
+        "NOK: Some annotations are too old.",
+    ]
+    assert stdout == expected
+
+
+@mock.patch("check_oldies.annotations.get_line_blame", base.fake_get_line_blame)
+def test_ndjson_output_file(tmp_path):
+    output_file = tmp_path / "annotations.ndjson"
+    config = annotations.Config(
+        path=base.TEST_DIR_PATH / "data/project1",
+        annotations=base.TESTING_ANNOTATIONS,
+        output_format=output.OutputFormat.NDJSON,
+        output_file=str(output_file),
+    )
+
+    with mock.patch("check_oldies.configuration.get_config", return_value=config):
+        with pytest.raises(SystemExit) as caught_exit:
+            check_fixmes.main()
+
+    assert caught_exit.value.code == 0
+    lines = [json.loads(line) for line in output_file.read_text().splitlines()]
+    assert len(lines) == 5
+    assert lines[0] == {
+        "path": "file1.py",
+        "line_no": 1,
+        "assignee": "jane.doe",
+        "line_content": "# TIMEBOMB: report me",
+        "age": 2,
+        "is_old": False,
+        "timed_out": False,
+        "ref": "",
+    }
+
+
+@mock.patch("check_oldies.annotations.get_line_blame", base.fake_get_line_blame)
+def test_baseline(tmp_path, capfd: pytest.CaptureFixture):
+    baseline_path = tmp_path / "baseline.txt"
+    config = annotations.Config(
+        path=base.TEST_DIR_PATH / "data/project1",
+        max_age=1,
+        colorize_errors=False,
+        annotations=base.TESTING_ANNOTATIONS,
+        future_tag_regex=base.TESTING_FUTURE_TAG,
+        baseline=str(baseline_path),
+        update_baseline=True,
+    )
+    with mock.patch("check_oldies.configuration.get_config", return_value=config):
+        with pytest.raises(SystemExit) as caught_exit:
+            check_fixmes.main()
+    assert caught_exit.value.code == 0
+    assert capfd.readouterr().out == f"Wrote 5 annotation(s) to {baseline_path}.\n"
+
+    # Forget one annotation: it is the only one to be blamed and reported.
+    lines = baseline_path.read_text().splitlines()
+    forgotten = [line for line in lines if line.endswith("file2.py")]
+    assert len(forgotten) == 1
+    baseline_path.write_text("\n".join(line for line in lines if line not in forgotten))
+    config.update_baseline = False
+    with mock.patch("check_oldies.annotations.get_line_blame", wraps=base.fake_get_line_blame) as blame:
+        with mock.patch("check_oldies.configuration.get_config", return_value=config):
+            with pytest.raises(SystemExit) as caught_exit:
+                check_fixmes.main()
+    assert caught_exit.value.code == os.EX_DATAERR
+    assert blame.call_count == 1
+    assert capfd.readouterr().out.splitlines() == [
+        "NOK: Some annotations are too old.",
+        "jane.doe        -    2 days - file2.py:1: # TIMEBOMB: report me",
+    ]
+
+
+def test_fail_fast(capfd: pytest.CaptureFixture):
+    config = annotations.Config(
+        path=base.TEST_DIR_PATH / "data/project1",
+        max_age=1,
+        colorize_errors=False,
+        annotations=base.TESTING_ANNOTATIONS,
+        future_tag_regex=base.TESTING_FUTURE_TAG,
+        fail_fast=True,
+    )
+
+    with mock.patch("check_oldies.annotations.get_line_blame", wraps=base.fake_get_line_blame) as blame:
+        with mock.patch("check_oldies.configuration.get_config", return_value=config):
+            with pytest.raises(SystemExit) as caught_exit:
+                check_fixmes.main()
+    captured = capfd.readouterr()
+
+    assert caught_exit.value.code == os.EX_DATAERR
+    assert blame.call_count == 1
+    stdout = captured.out.rstrip().split(os.linesep)
+    assert stdout[0] == "NOK: Some annotations are too old."
+    assert len(stdout) == 2
+
+
+def test_time_budget(capfd: pytest.CaptureFixture):
+    config = annotations.Config(
+        path=base.TEST_DIR_PATH / "data/project1",
+        max_age=9999,
+        colorize_errors=False,
+        annotations=base.TESTING_ANNOTATIONS,
+        future_tag_regex=base.TESTING_FUTURE_TAG,
+        time_budget=10,
+    )
+
+    with mock.patch("check_oldies.annotations.get_line_blame", wraps=base.fake_get_line_blame) as blame:
+        # Pretend that the budget is spent after 2 blames.
+        with mock.patch("check_oldies.budget.TimeBudget.is_spent", lambda self: blame.call_count >= 2):
+            with mock.patch("check_oldies.configuration.get_config", return_value=config):
+                with pytest.raises(SystemExit) as caught_exit:
+                    check_fixmes.main()
+    captured = capfd.readouterr()
+
+    assert caught_exit.value.code == os.EX_TEMPFAIL
+    stdout = captured.out.rstrip().split(os.linesep)
+    assert stdout[0] == "Incomplete: 2 of 5 annotations evaluated within the time budget of 10 seconds."
+    assert len(stdout) == 3
+
+
+def test_time_budget_spent_while_searching(capfd: pytest.CaptureFixture):
+    config = annotations.Config(
+        path=base.TEST_DIR_PATH / "data/project1",
+        colorize_errors=False,
+        annotations=base.TESTING_ANNOTATIONS,
+        time_budget=10,
+    )
+
+    def iter_unblamed_annotations(config):
+        # The timeout of `git grep` has been shortened to the remaining budget.
+        assert config.timeouts.grep <= 10
+        assert config.timeouts.retries == 0
+        raise subprocess.TimeoutExpired(["git", "grep"], config.timeouts.grep)
+        yield  # pylint: disable=unreachable
+
+    with mock.patch("check_oldies.annotations.iter_unblamed_annotations", iter_unblamed_annotations):
+        with mock.patch("check_oldies.budget.TimeBudget.is_spent", lambda self: True):
+            with mock.patch("check_oldies.configuration.get_config", return_value=config):
+                with pytest.raises(SystemExit) as caught_exit:
+                    check_fixmes.main()
+    captured = capfd.readouterr()
+
+    assert caught_exit.value.code == os.EX_TEMPFAIL
+    stdout = captured.out.rstrip().split(os.linesep)
+    assert stdout == ["Incomplete: annotations could not be searched within the time budget of 10 seconds."]
+
+
+def test_blame_timeout(capfd: pytest.CaptureFixture):
+    config = annotations.Config(
+        path=base.TEST_DIR_PATH / "data/project1",
+        max_age=9999,
+        colorize_errors=False,
+        annotations=base.TESTING_ANNOTATIONS,
+        future_tag_regex=base.TESTING_FUTURE_TAG,
+    )
+
+    def fake_get_line_blame(filename, line, cwd, timeout=0, retries=0, rev=""):
+        if filename == "file1.py" and line == 1:
+            raise subprocess.TimeoutExpired(["git", "blame"], timeout)
+        return base.fake_get_line_blame(filename, line, cwd)
+
+    with mock.patch("check_oldies.annotations.get_line_blame", fake_get_line_blame):
+        with mock.patch("check_oldies.configuration.get_config", return_value=config):
+            with pytest.raises(SystemExit) as caught_exit:
+                check_fixmes.main()
+    captured = capfd.readouterr()
+
+    assert caught_exit.value.code == os.EX_DATAERR
+    stdout = captured.out.rstrip().split(os.linesep)
+    assert stdout[0] == "NOK: Some annotations could not be checked in time."
+    timed_out = [line for line in stdout if " TIMEOUT " in line]
+    assert len(timed_out) == 1
+    assert len(stdout) == 6
+
+
+def test_bare_repository(tmp_path, capfd: pytest.CaptureFixture):
+    work = tmp_path / "work"
+    work.mkdir()
+    (work / "file.py").write_text("# TIMEBOMB (jsmith): report me\n", encoding="utf-8")
+    base.git(work, "init", "--quiet")
+    base.git(work, "add", "file.py")
+    base.git(work, "commit", "--quiet", "-m", "Add file")
+    base.git(tmp_path, "clone", "--quiet", "--bare", work, tmp_path / "bare.git")
+    config = annotations.Config(
+        path=tmp_path / "bare.git",
+        colorize_errors=False,
+        annotations=base.TESTING_ANNOTATIONS,
+    )
+
+    with mock.patch("check_oldies.configuration.get_config", return_value=config):
+        with pytest.raises(SystemExit) as caught_exit:
+            check_fixmes.main()
+    captured = capfd.readouterr()
+
+    assert caught_exit.value.code == os.EX_OK
+    assert config.rev == "HEAD"
+    stdout = captured.out.rstrip().split(os.linesep)
+    assert stdout == [
+        "OK: All annotations are fresh.",
+        "jsmith          -    0 days - file.py:1: # TIMEBOMB (jsmith): report me",
+    ]
@@ -3,6 +3,7 @@ import subprocess
 import pytest
 
 from check_oldies import commands
+from check_oldies import profiling
 
 from . import base
 
@@ -28,6 +29,46 @@ class TestGetCommandOutput:
                 cwd=base.TEST_DIR_PATH,
             )
 
+    def test_timeout(self):
+        profiling.reset()
+        with pytest.raises(subprocess.TimeoutExpired):
+            commands.get_output(
+                ["sleep", "10"], cwd=base.TEST_DIR_PATH, timeout=0.1, retries=1,
+            )
+        assert profiling.current.calls["command timeout"].count == 2  # 1 retry
+
+
+class TestIterOutput:
+    def test_lines_are_yielded_before_the_end(self):
+        lines = commands.iter_output(
+            ["sh", "-c", "echo first; echo; echo second; exec sleep 10"], cwd=base.TEST_DIR_PATH,
+        )
+        assert next(lines) == b"first"
+        assert next(lines) == b"second"  # empty lines are skipped
+        lines.close()  # kills the command
+
+    def test_unexpected_return_code(self):
+        lines = commands.iter_output(
+            ["sh", "-c", "echo output; echo error >&2; exit 3"], cwd=base.TEST_DIR_PATH,
+        )
+        assert next(lines) == b"output"
+        with pytest.raises(subprocess.CalledProcessError) as caught:
+            next(lines)
+        assert (caught.value.returncode, caught.value.stderr) == (3, b"error\n")
+
+    def test_timeout(self):
+        profiling.reset()
+        with pytest.raises(subprocess.TimeoutExpired):
+            list(commands.iter_output(["sleep", "10"], cwd=base.TEST_DIR_PATH, timeout=0.1, retries=1))
+        assert profiling.current.calls["command timeout"].count == 2  # 1 retry
+        # A command is not run again once lines have been yielded.
+        profiling.reset()
+        with pytest.raises(subprocess.TimeoutExpired):
+            list(commands.iter_output(
+                ["sh", "-c", "echo line; exec sleep 10"], cwd=base.TEST_DIR_PATH, timeout=0.1, retries=1,
+            ))
+        assert profiling.current.calls["command timeout"].count == 1
+
 
 def test_get_pipe_command_output():
     lines = commands.get_pipe_command_output(
@@ -39,3 +80,42 @@ def test_get_pipe_command_output():
         "import subprocess",
     ]
     assert lines == expected
+
+
+def test_get_pipe_command_output_timeout():
+    profiling.reset()
+    with pytest.raises(subprocess.TimeoutExpired):
+        commands.get_pipe_command_output(
+            ["sleep", "10"], piped_to=["cat"], cwd=base.TEST_DIR_PATH, timeout=0.1, retries=1,
+        )
+    assert profiling.current.calls["command timeout"].count == 2  # 1 retry
+
+
+def test_cat_file(tmp_path):
+    subprocess.run(["git", "init", "--quiet"], cwd=tmp_path, check=True)
+    contents = [b"x" * 2000 * i + b"\n" for i in range(100)]  # more than pipe buffers
+    for i, content in enumerate(contents):
+        (tmp_path / f"file{i}").write_bytes(content)
+    blob_ids = commands.get_output(
+        ["git", "hash-object", "-w"] + [f"file{i}" for i in range(len(contents))], cwd=tmp_path,
+    )
+    missing = "0" * 40
+
+    cat_file = commands.get_cat_file(tmp_path)
+    assert commands.get_cat_file(tmp_path) is cat_file  # one process per repository
+    objects = cat_file.get_objects(blob_ids + [missing])
+    assert [obj.content for obj in objects[:-1]] == contents
+    assert objects[0].type == "blob"
+    assert (objects[-1].name, objects[-1].type) == (missing, "missing")
+    # Objects can be requested again, from the same process.
+    assert cat_file.get_objects(blob_ids[1:2])[0].content == contents[1]
+
+    with commands.CatFile(tmp_path, batch="--batch-check") as checker:
+        sizes = [obj.size for obj in checker.get_objects(blob_ids)]
+    assert sizes == [len(content) for content in contents]
+    assert checker.process.returncode == 0
+
+    commands.close_cat_files()
+    assert cat_file.process.returncode == 0
+    assert commands.get_cat_file(tmp_path) is not cat_file
+    commands.close_cat_files()
@@ -1,4 +1,5 @@
 import argparse
+import dataclasses
 
 import pytest
 
@@ -39,6 +40,14 @@ def test_get_config_override_from_command_line(arg_parser):
     assert config.max_age == 1
 
 
+def test_copy_config(arg_parser):
+    argv = [str(base.TEST_DIR_PATH)]
+    config = configuration.get_config("check-fixmes", arg_parser, argv, annotations.Config)
+    copy = dataclasses.replace(config, max_age=1)
+    assert copy.max_age == 1
+    assert copy.timeouts == config.timeouts
+
+
 def test_is_git_repository(tmp_path):  # tmp_path is a pytest fixture
     assert configuration.is_git_directory(base.TEST_DIR_PATH)
     assert not configuration.is_git_directory(tmp_path)
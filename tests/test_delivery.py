@@ -0,0 +1,117 @@
+from email.message import EmailMessage
+
+import pytest
+
+from check_oldies import delivery
+from check_oldies import forget_me_not
+
+
+def make_message(recipient):
+    msg = EmailMessage()
+    msg.set_content("You have old annotations.")
+    msg["Subject"] = "W1: Old annotations and old branches"
+    msg["From"] = "forget-me-not@example.com"
+    msg["To"] = recipient
+    return msg
+
+
+def make_smtp_config(server, **options):
+    options.setdefault("retry_delay", 0)
+    return forget_me_not.SmtpConfig(host=server.host, port=server.port, **options)
+
+
+def test_deliver(smtp_server, tmp_path):
+    outbox = delivery.Outbox(tmp_path / "outbox")
+    recipients = [f"user{i}@example.com" for i in range(10)]
+    for recipient in recipients:
+        outbox.add(make_message(recipient))
+
+    report = delivery.deliver(outbox, make_smtp_config(smtp_server, connections=3))
+
+    assert report.sent == recipients
+    assert not report.failed
+    assert sorted(msg["To"] for msg in smtp_server.messages) == sorted(recipients)
+    assert smtp_server.connections <= 3
+    assert not outbox.pending()
+
+
+def test_deliver_retries_transient_errors(smtp_server, tmp_path):
+    outbox = delivery.Outbox(tmp_path / "outbox")
+    outbox.add(make_message("john.smith@example.com"))
+    smtp_server.fail_next(2)
+
+    report = delivery.deliver(outbox, make_smtp_config(smtp_server, max_retries=2))
+
+    assert report.sent == ["john.smith@example.com"]
+    assert len(smtp_server.messages) == 1
+
+
+def test_deliver_keeps_failed_messages(smtp_server, tmp_path):
+    outbox = delivery.Outbox(tmp_path / "outbox")
+    outbox.add(make_message("john.smith@example.com"))
+    smtp_server.fail_next(1, code=550)  # permanent error, not retried
+
+    report = delivery.deliver(outbox, make_smtp_config(smtp_server))
+
+    assert not report.sent
+    ((recipient, error),) = report.failed
+    assert recipient == "john.smith@example.com"
+    assert error.smtp_code == 550
+    assert len(outbox.pending()) == 1
+
+    # Next run resumes the message that could not be sent.
+    report = delivery.deliver(outbox, make_smtp_config(smtp_server))
+    assert report.sent == ["john.smith@example.com"]
+    assert not outbox.pending()
+
+
+def test_rate_limiter():
+    limiter = delivery.RateLimiter(0)
+    assert limiter.interval == 0
+    limiter = delivery.RateLimiter(4)
+    assert limiter.interval == 0.25
+
+
+class FakeClock:
+    def __init__(self):
+        self.now = 100.0
+
+    def monotonic(self):
+        return self.now
+
+    def sleep(self, delay):
+        self.now += delay
+
+
+def test_rate_limiter_throttles_calls(monkeypatch):
+    clock = FakeClock()
+    monkeypatch.setattr(delivery.time, "monotonic", clock.monotonic)
+    monkeypatch.setattr(delivery.time, "sleep", clock.sleep)
+    limiter = delivery.RateLimiter(4)
+
+    times = []
+    for _ in range(3):
+        limiter.wait()
+        times.append(clock.now)
+    clock.now += 1  # idle: the next call is not delayed
+    limiter.wait()
+    times.append(clock.now)
+
+    assert times == [100.0, 100.25, 100.5, 101.5]
+
+
+def test_programming_errors_are_not_retried(smtp_server, tmp_path, monkeypatch):
+    outbox = delivery.Outbox(tmp_path / "outbox")
+    outbox.add(make_message("john.smith@example.com"))
+    sent = []
+
+    def send_message(self, message):
+        sent.append(message)
+        raise TypeError("a bug")
+
+    monkeypatch.setattr(delivery.smtplib.SMTP, "send_message", send_message)
+
+    with pytest.raises(TypeError):
+        delivery.deliver(outbox, make_smtp_config(smtp_server, max_retries=3))
+    assert len(sent) == 1
+    assert len(outbox.pending()) == 1
@@ -2,6 +2,7 @@
 
 import contextlib
 import os
+import subprocess
 from unittest import mock
 
 import pytest
@@ -59,3 +60,33 @@ def test_forget_me_not(capfd: pytest.CaptureFixture):
         "--------------------",
     ]
     assert stdout == expected
+
+
+def test_timed_out_annotations_are_reported(capfd: pytest.CaptureFixture):
+    def fake_get_line_blame(filename, line, cwd, timeout=0, retries=0, rev=""):
+        if filename == "file1.py" and line in (1, 3):
+            raise subprocess.TimeoutExpired(["git", "blame"], timeout)
+        return base.fake_get_line_blame(filename, line, cwd)
+
+    with mock.patch("check_oldies.annotations.get_line_blame", fake_get_line_blame):
+        with in_working_directory(base.TEST_DIR_PATH / 'data'):
+            forget_me_not.main(argv=[])
+    captured = capfd.readouterr()
+
+    stdout = captured.out.rstrip().split(os.linesep)
+    assert stdout[:4] == [
+        "Found annotations or old branches of unknown authors (forwarded to catch-all@example.com):",
+        "(no assignee)",
+        "unknown",
+        "catch-all@example.com",
+    ]
+    start = stdout.index("john.smith@example.com")
+    assert stdout[start:start + 7] == [
+        "john.smith@example.com",
+        "    Hello,",
+        "",
+        "You have 3 old annotation(s) that will block builds in less than 15 days:",
+        "",
+        "TIMEOUT: project5:file1.py:3: # TIMEBOMB (jsmith): report me to john.smith@example.com",
+        "2 days: project5:file1.py:4: # TIMEBOMB (js): report me to john.smith@example.com (alias)",
+    ]
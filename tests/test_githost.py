@@ -1,8 +1,12 @@
 import os
 from unittest import mock
+import urllib.error
+
+import pytest
 
 from check_oldies import branches
 from check_oldies import githost
+from check_oldies import profiling
 
 
 FAKE_GITHUB_API_RESPONSE = [
@@ -26,3 +30,89 @@ def test_github_api(requests_mocker):
     assert pull_request.number == 1234
     assert pull_request.state == "open"
     assert pull_request.url == "https://github.com/polyconseil/check-oldies/pull/1234"
+
+
+@mock.patch.dict(os.environ, {"TOKEN": "secret"}, clear=True)
+def test_github_api_with_simulator(githost_simulator):
+    githost_simulator.add_pull_request("polyconseil", "check-oldies", "my-branch", number=1, state="closed")
+    githost_simulator.add_pull_request("polyconseil", "check-oldies", "my-branch", number=2)
+    githost_simulator.add_pull_request("polyconseil", "check-oldies", "other-branch", number=3)
+    api_access = branches.GitHostApiAccessInfo(
+        api_base_url=githost_simulator.url, auth_token_env_var="TOKEN"
+    )
+    api = githost.GitHubApi("polyconseil", api_access)
+
+    pull_request = api.get_pull_request("check-oldies", "my-branch")
+    assert pull_request.number == 2  # the most recent one
+    assert pull_request.state == "open"
+    assert api.get_pull_request("check-oldies", "unknown-branch") is None
+    assert githost_simulator.stats.requests == 2
+
+
+@mock.patch.dict(os.environ, {"TOKEN": "secret"}, clear=True)
+def test_gitlab_api_with_simulator(githost_simulator):
+    project = githost_simulator.add_project("check-oldies")
+    githost_simulator.add_merge_request(project, "my-branch", iid=12)
+    api_access = branches.GitHostApiAccessInfo(
+        api_base_url=githost_simulator.url, auth_token_env_var="TOKEN"
+    )
+    api = githost.GitLabApi("polyconseil", api_access)
+
+    merge_request = api.get_pull_request("check-oldies", "my-branch")
+    assert merge_request.number == 12
+    assert merge_request.state == "opened"
+    assert api.get_pull_request("unknown-project", "my-branch") is None
+
+
+@mock.patch.dict(os.environ, {"TOKEN": "secret"}, clear=True)
+def test_gitlab_api_caches_projects(githost_simulator):
+    project = githost_simulator.add_project("check-oldies")
+    githost_simulator.add_merge_request(project, "my-branch", iid=12)
+    api_access = branches.GitHostApiAccessInfo(
+        api_base_url=githost_simulator.url, auth_token_env_var="TOKEN"
+    )
+    api = githost.GitLabApi("polyconseil", api_access)
+    profiling.reset()
+
+    assert api.get_pull_request("check-oldies", "my-branch").number == 12
+    assert api.get_pull_request("check-oldies", "other-branch") is None
+    assert githost_simulator.stats.requests == 3  # 1 project search + 2 merge requests
+    cache_stat = profiling.current.caches["gitlab projects"]
+    assert (cache_stat.hits, cache_stat.misses) == (1, 1)
+
+
+@mock.patch.dict(os.environ, {"TOKEN": "secret"}, clear=True)
+def test_simulator_errors_and_rate_limit(githost_simulator):
+    api_access = branches.GitHostApiAccessInfo(
+        api_base_url=githost_simulator.url, auth_token_env_var="TOKEN"
+    )
+    api = githost.GitHubApi("polyconseil", api_access)
+
+    githost_simulator.behaviour.rate_limit = 1
+    api.get_pull_request("check-oldies", "my-branch")
+    with pytest.raises(urllib.error.HTTPError) as caught:
+        api.get_pull_request("check-oldies", "my-branch")
+    assert caught.value.code == 429
+    assert caught.value.headers["X-RateLimit-Remaining"] == "0"
+
+    githost_simulator.behaviour.rate_limit = 0
+    githost_simulator.behaviour.error_rate = 1
+    with pytest.raises(urllib.error.HTTPError) as caught:
+        api.get_pull_request("check-oldies", "my-branch")
+    assert caught.value.code == 502
+    assert githost_simulator.stats.errors == 1
+
+
+@mock.patch.dict(os.environ, {"TOKEN": "secret"}, clear=True)
+def test_github_api_timeout(githost_simulator):
+    githost_simulator.behaviour.latency = 0.5
+    api_access = branches.GitHostApiAccessInfo(
+        api_base_url=githost_simulator.url, auth_token_env_var="TOKEN"
+    )
+    api = githost.GitHubApi("polyconseil", api_access, timeout=0.1, retries=1)
+    profiling.reset()
+
+    with pytest.raises(githost.TIMEOUT_ERRORS) as caught:
+        api.get_pull_request("check-oldies", "my-branch")
+    assert githost.is_timeout(caught.value)
+    assert profiling.current.calls["request timeout"].count == 2  # 1 retry
@@ -0,0 +1,74 @@
+import datetime
+from unittest import mock
+
+import pytest
+
+from check_oldies import annotations
+from check_oldies import check_fixmes
+from check_oldies import history
+from check_oldies import report
+
+from . import base
+
+
+def _annotation(line_no, line_content, age, assignee="jsmith"):
+    return annotations.Annotation(
+        path="file.py", line_no=line_no, line_content=line_content, age=age, assignee=assignee
+    )
+
+
+def _record(store, started_at, annotation_list):
+    config = annotations.Config()
+    run_id = store.start_run("check-fixmes", "repo", "abc123", started_at=started_at)
+    list(store.track_annotations(run_id, annotation_list, 90, config.get_tag))
+
+
+def test_history(tmp_path):
+    path = tmp_path / "history.sqlite"
+    week1 = datetime.datetime(2026, 2, 10, tzinfo=datetime.timezone.utc)
+    week2 = week1 + datetime.timedelta(days=7)
+    with history.History(path) as store:
+        _record(store, week1, [
+            _annotation(1, "# TODO: one", age=80),
+            _annotation(5, "# FIXME (jdoe): two", age=100, assignee="jdoe"),
+        ])
+        # Same annotations, but lines have moved and the first one got old.
+        _record(store, week2, [
+            _annotation(3, "# TODO: one", age=87 + 7),
+            _annotation(7, "# FIXME (jdoe): two", age=107, assignee="jdoe"),
+        ])
+
+    with history.History(path) as store:
+        assert store.connection.execute("SELECT COUNT(*) FROM findings").fetchone()[0] == 2
+        assert store.trend(group_by=["week"]) == [
+            history.Trend(group=("2026-W07", ), findings=2, old_findings=1),
+            history.Trend(group=("2026-W08", ), findings=2, old_findings=2),
+        ]
+        assert store.trend(group_by=["assignee", "tag"], since=week2.date()) == [
+            history.Trend(group=("jdoe", "fixme"), findings=1, old_findings=1),
+            history.Trend(group=("jsmith", "todo"), findings=1, old_findings=1),
+        ]
+        assert store.trend(kind=history.BRANCH) == []
+
+
+@mock.patch("check_oldies.annotations.get_line_blame", base.fake_get_line_blame)
+def test_check_fixmes_and_report(tmp_path, capfd):
+    path = tmp_path / "history.sqlite"
+    config = annotations.Config(
+        path=base.TEST_DIR_PATH / "data/project1",
+        annotations=base.TESTING_ANNOTATIONS,
+        future_tag_regex=base.TESTING_FUTURE_TAG,
+        history_file=str(path),
+    )
+    with mock.patch("check_oldies.configuration.get_config", return_value=config):
+        with pytest.raises(SystemExit):
+            check_fixmes.main()
+    capfd.readouterr()
+
+    report.main([str(path), "--by", "repository", "--by", "assignee"])
+    stdout = capfd.readouterr().out.splitlines()
+    assert stdout == [
+        "repository  assignee  findings  old findings",
+        "project1    jane.doe  3         0",
+        "project1    jsmith    2         0",
+    ]
@@ -0,0 +1,62 @@
+import dataclasses
+from unittest import mock
+
+import pytest
+
+from check_oldies import annotations
+from check_oldies import check_fixmes
+from check_oldies import metrics
+from check_oldies import profiling
+
+from . import base
+
+
+@dataclasses.dataclass
+class Finding:
+    age: int
+
+
+def test_metrics_to_text():
+    collector = metrics.Metrics("check-fixmes")
+    findings = [Finding(age=1), Finding(age=100), Finding(age=1000)]
+    assert list(collector.track_annotations('my "repo"', findings, max_age=90)) == findings
+    profiler = profiling.Profiler()
+    profiler.record("command", "git grep", 0.5, bytes_read=42)
+    profiler.record_cache("gitlab projects", hit=True)
+
+    lines = collector.to_text(profiler).splitlines()
+
+    labels = 'command="check-fixmes",repository="my \\"repo\\""'
+    assert f"check_oldies_annotations{{{labels}}} 3" in lines
+    assert f"check_oldies_old_annotations{{{labels}}} 2" in lines
+    assert f'check_oldies_annotation_age_days_bucket{{{labels},le="7.0"}} 1' in lines
+    assert f'check_oldies_annotation_age_days_bucket{{{labels},le="180.0"}} 2' in lines
+    assert f'check_oldies_annotation_age_days_bucket{{{labels},le="+Inf"}} 3' in lines
+    assert f"check_oldies_annotation_age_days_count{{{labels}}} 3" in lines
+    assert f"check_oldies_annotation_age_days_sum{{{labels}}} 1101" in lines
+    assert 'check_oldies_calls{command="check-fixmes",kind="command"} 1' in lines
+    assert 'check_oldies_calls_read_bytes{command="check-fixmes",kind="command"} 42' in lines
+    assert 'check_oldies_cache_hits{command="check-fixmes",cache="gitlab projects"} 1' in lines
+    assert lines[-1] == "# EOF"
+
+
+@mock.patch("check_oldies.annotations.get_line_blame", base.fake_get_line_blame)
+def test_check_fixmes_metrics_file(tmp_path, capfd):
+    metrics_path = tmp_path / "textfile" / "check-fixmes.prom"
+    config = annotations.Config(
+        path=base.TEST_DIR_PATH / "data/project1",
+        annotations=base.TESTING_ANNOTATIONS,
+        future_tag_regex=base.TESTING_FUTURE_TAG,
+        only_old=True,
+        metrics_file=str(metrics_path),
+    )
+
+    with mock.patch("check_oldies.configuration.get_config", return_value=config):
+        with pytest.raises(SystemExit):
+            check_fixmes.main()
+    capfd.readouterr()
+
+    lines = metrics_path.read_text().splitlines()
+    # Metrics count all annotations, even with ``only-old``.
+    assert 'check_oldies_annotations{command="check-fixmes",repository="project1"} 5' in lines
+    assert list(metrics_path.parent.iterdir()) == [metrics_path]  # no temporary file left
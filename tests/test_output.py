@@ -1,60 +1,175 @@
-import sys
-
-import pytest
+import io
+import xml.etree.ElementTree
 
 from check_oldies import output
-
-
-# `xml.etree.ElementTree.tostring()` preserves attribute order only as of
-# Python 3.8. With prior versions, we cannot easily compare XML
-# output, so don't bother.
-HAS_UNSORTED_XML_WRITE = sys.version_info[:2] < (3, 8)
+from check_oldies import xunit
 
 
 class FakeResult:
-    def __init__(self, var):
+    def __init__(self, var, must_warn=False):
         self.var = var
+        self.must_warn = must_warn
+        self.location = f"file.py:{var}"
 
     def to_text(self):
-        return f"fake: {self.var}"
+        return f"fake: {self.var} <&>"
 
 
-@pytest.mark.skipif(HAS_UNSORTED_XML_WRITE, reason="")
-def test_xunit_formatter_success():
+def test_xunit_writer_success():
     results = [FakeResult(1), FakeResult(2)]
-    xml = output.xunit_formatter(
+    out = io.StringIO()
+    output.xunit_writer(
         results,
-        error_message="",
+        out,
         xunit_suite_name="suite name",
         xunit_case_name="case name",
         xunit_class_name="class name",
     )
-    assert xml == (
-        '<testsuite name="suite name" tests="1" errors="0" failures="0">'
-        '<testcase classname="class name" name="case name">'
-        "<system-out>fake: 1\nfake: 2</system-out>"
-        "<system-err />"
+    assert out.getvalue() == (
+        '<?xml version="1.0" encoding="utf-8"?>\n'
+        '<testsuite name="suite name" tests="2" errors="0" failures="0">'
+        '<testcase classname="class name" name="file.py:1">'
+        "<system-out>fake: 1 &lt;&amp;&gt;</system-out>"
+        "</testcase>"
+        '<testcase classname="class name" name="file.py:2">'
+        "<system-out>fake: 2 &lt;&amp;&gt;</system-out>"
         "</testcase>"
-        "</testsuite>"
+        "</testsuite>\n"
     )
 
 
-@pytest.mark.skipif(HAS_UNSORTED_XML_WRITE, reason="")
-def test_xunit_formatter_failure():
-    results = [FakeResult(1), FakeResult(2)]
-    xml = output.xunit_formatter(
+def test_xunit_writer_failure():
+    results = [FakeResult(1, must_warn=True), FakeResult(2)]
+    out = io.StringIO()
+    output.xunit_writer(
         results,
-        error_message="A dramatic error occurred!",
+        out,
         xunit_suite_name="suite name",
         xunit_case_name="case name",
         xunit_class_name="class name",
     )
-    assert xml == (
-        '<testsuite name="suite name" tests="1" errors="0" failures="1">'
+    assert out.getvalue() == (
+        '<?xml version="1.0" encoding="utf-8"?>\n'
+        '<testsuite name="suite name" tests="2" errors="0" failures="1">'
+        '<testcase classname="class name" name="file.py:1">'
+        '<failure message="fake: 1 &lt;&amp;&gt;">fake: 1 &lt;&amp;&gt;</failure>'
+        "</testcase>"
+        '<testcase classname="class name" name="file.py:2">'
+        "<system-out>fake: 2 &lt;&amp;&gt;</system-out>"
+        "</testcase>"
+        "</testsuite>\n"
+    )
+
+
+def test_xunit_writer_without_results():
+    out = io.StringIO()
+    output.xunit_writer(
+        [],
+        out,
+        xunit_suite_name="suite name",
+        xunit_case_name="case name",
+        xunit_class_name="class name",
+    )
+    assert out.getvalue() == (
+        '<?xml version="1.0" encoding="utf-8"?>\n'
+        '<testsuite name="suite name" tests="1" errors="0" failures="0">'
+        '<testcase classname="class name" name="case name" />'
+        "</testsuite>\n"
+    )
+
+
+def test_xunit_writer_with_error_message():
+    out = io.StringIO()
+    output.xunit_writer(
+        [FakeResult(1)],
+        out,
+        xunit_suite_name="suite name",
+        xunit_case_name="case name",
+        xunit_class_name="class name",
+        ok_message="",
+        error_message="Time budget exhausted",
+    )
+    assert out.getvalue() == (
+        '<?xml version="1.0" encoding="utf-8"?>\n'
+        '<testsuite name="suite name" tests="2" errors="1" failures="0">'
+        '<testcase classname="class name" name="file.py:1">'
+        "<system-out>fake: 1 &lt;&amp;&gt;</system-out>"
+        "</testcase>"
         '<testcase classname="class name" name="case name">'
-        '<failure message="A dramatic error occurred!">fake: 1\nfake: 2</failure>'
-        "<system-out>fake: 1\nfake: 2</system-out>"
-        "<system-err />"
+        '<error message="Time budget exhausted">Time budget exhausted</error>'
         "</testcase>"
-        "</testsuite>"
+        "</testsuite>\n"
     )
+
+
+def test_stream_xunit_with_error_message(tmp_path):
+    path = tmp_path / "xunit.xml"
+    results = [FakeResult(1), FakeResult(2)]
+    consumed = []
+
+    def get_messages():
+        # Messages are only asked for once all results have been consumed.
+        return "", f"Stopped after {len(consumed)} results"
+
+    output.stream_printer(
+        (consumed.append(result) or result for result in results),
+        output.OutputFormat.XUNIT,
+        get_messages=get_messages,
+        output_file=str(path),
+        xunit_suite_name="suite name",
+        xunit_case_name="case name",
+        xunit_class_name="class name",
+    )
+    root = xml.etree.ElementTree.parse(path).getroot()
+    assert root.attrib["errors"] == "1"
+    assert root.find("testcase/error").attrib["message"] == "Stopped after 2 results"
+
+
+def test_create_xunit_file(tmp_path):
+    path = tmp_path / "reports" / "xunit.xml"
+    xunit.create_xunit_file(
+        path,
+        [FakeResult("\x1b[91m")],  # control characters are not allowed in XML
+        suite_name="suite name",
+        case_name="case name",
+        class_name="class name",
+    )
+    root = xml.etree.ElementTree.parse(path).getroot()
+    assert root.attrib["tests"] == "1"
+    assert root.find("testcase/system-out").text == "fake: [91m <&>"
+
+
+class FakeDictResult:
+    def __init__(self, var, flag=None):
+        self.var = var
+        self.flag = flag
+
+    def to_dict(self):
+        return {"var": self.var, "flag": self.flag}
+
+
+def test_csv_writer():
+    out = io.StringIO()
+    output.csv_writer([FakeDictResult(1, True), FakeDictResult("a,b")], out)
+    assert out.getvalue() == 'var,flag\r\n1,1\r\n"a,b",\r\n'
+
+
+def test_csv_writer_without_objects():
+    out = io.StringIO()
+    output.csv_writer([], out)
+    assert out.getvalue() == ""
+
+
+def test_ndjson_writer():
+    out = io.StringIO()
+    output.ndjson_writer(iter([FakeDictResult(1, True), FakeDictResult("a")]), out)
+    assert out.getvalue() == (
+        '{"var": 1, "flag": true}\n'
+        '{"var": "a", "flag": null}\n'
+    )
+
+
+def test_printer_to_file(tmp_path):
+    path = tmp_path / "out.ndjson"
+    output.printer([FakeDictResult(1)], output.OutputFormat.NDJSON, output_file=str(path))
+    assert path.read_text() == '{"var": 1, "flag": null}\n'
@@ -0,0 +1,98 @@
+import pytest
+
+from check_oldies import annotations
+from check_oldies import planner
+
+from . import base
+
+
+ANNOTATED_LINES = [
+    "# timebomb: after a hash",
+    "x = 1  # TIMEBOMB: after code",
+    "/*TIMEBOMB*/",
+    "{timebomb}",
+    "<timebomb",
+    "timebomb at the start",
+    "\ttimebomb after a tab",
+    "\x1ftimebomb after a unit separator",
+    " timebomb after a no-break space",
+    "# timebomb—with a dash",
+    "# fewture timebomb and SECOND",
+]
+NOT_ANNOTATED_LINES = [
+    "timebombs",
+    "_timebomb",
+    "timebomb_list",
+    "a-timebomb",
+    "<!--timebomb",
+    "étimebomb",
+    "# timebombé",
+    "# TIMEBOMB: no-check-fixmes",
+    "# tIMEBOMB: NO-CHECK-FIXMES",
+]
+
+
+@pytest.fixture(name="repo")
+def fixture_repo(repo):
+    lines = ANNOTATED_LINES + NOT_ANNOTATED_LINES
+    (repo / "file1.py").write_text("".join(f"{line}\n" for line in lines), encoding="utf-8")
+    (repo / "latin1.py").write_bytes(b"# timebomb caf\xe9\n# timebomb\xe9\n\xe9timebomb\n")
+    (repo / "crlf.py").write_bytes(b"# timebomb\r\n")
+    base.git(repo, "add", ".")
+    base.git(repo, "commit", "--quiet", "-m", "Initial commit")
+    return repo
+
+
+def test_choose_annotations_mode():
+    choose = planner.choose_annotations_mode
+    assert choose(["todo", "fixme"]) == planner.GrepMode.FIXED
+    assert choose(["todo", "fixme"], perl_regexp=True) == planner.GrepMode.PERL
+    assert choose(["to do", "fix-me"], perl_regexp=True) == planner.GrepMode.PERL
+    assert choose(["à faire"], perl_regexp=True) == planner.GrepMode.FIXED
+    assert choose(["todo", "fix.?me"], perl_regexp=True) == planner.GrepMode.EXTENDED
+    assert choose([], perl_regexp=True) == planner.GrepMode.EXTENDED
+    assert planner.get_future_tags_plan("FUTURE-1").mode == planner.GrepMode.FIXED
+    assert planner.get_future_tags_plan(r"FUTURE-[0-9]+").mode == planner.GrepMode.EXTENDED
+
+
+def test_get_annotations_plan():
+    plan = planner.get_annotations_plan(["TODO", "fixme"], planner.GrepMode.FIXED)
+    assert plan.options == ["--fixed-strings", "(", "-e", "todo", "-e", "fixme", ")"]
+    plan = planner.get_annotations_plan(["TODO", "fixme"], planner.GrepMode.EXTENDED)
+    assert plan.options == ["--extended-regexp", "(", "-e", "todo|fixme", ")"]
+    assert not plan.is_exact("# todo")
+    plan = planner.get_annotations_plan(["TODO", "fixme"], planner.GrepMode.PERL)
+    assert plan.is_exact("# todo")
+    assert not plan.is_exact("# todo é")
+
+
+@pytest.mark.parametrize("mode", list(planner.GrepMode))
+@pytest.mark.parametrize("rev", ["", "HEAD"])
+def test_modes_give_the_same_annotations(repo, mode, rev, monkeypatch):
+    if mode == planner.GrepMode.PERL and not planner.has_perl_regexp(repo):  # pragma: no cover
+        pytest.skip("git is built without support of Perl-compatible regular expressions")
+    monkeypatch.setattr(planner, "choose_annotations_mode", lambda *args: mode)
+    config = annotations.Config(path=repo, rev=rev, annotations=["TIMEBOMB", "second"])
+    assert config.annotation_plan.mode == mode
+
+    found = [(ann.path, ann.line_no, ann.line_content) for ann in annotations.iter_unblamed_annotations(config)]
+
+    assert found == [
+        ("crlf.py", 1, "# timebomb"),
+        *(("file1.py", line_no, line) for line_no, line in enumerate(ANNOTATED_LINES, 1)),
+        ("latin1.py", 1, "# timebomb caf�"),
+        ("latin1.py", 2, "# timebomb�"),
+    ]
+    if mode == planner.GrepMode.PERL:
+        # Lines that are not checked again are only annotations.
+        candidates = annotations.get_annotation_candidates(
+            repo, config.annotation_regex, (), rev=rev, plan=config.annotation_plan,
+        )
+        exact = [line for line in candidates if config.annotation_plan.is_exact(line.content)]
+        assert exact == [(path, line_no, line) for path, line_no, line in found if line.isascii()]
+
+
+def test_fixed_future_tags(repo):
+    (repo / "file1.py").write_text("FEWTURE-1 FEWTURE-10 FEWTURE-1\n", encoding="utf-8")
+    lines = annotations.get_future_lines(repo, "FEWTURE-1", whitelist=())
+    assert lines == [("file1.py", 1, "FEWTURE-1")] * 3
@@ -0,0 +1,142 @@
+import io
+import os
+
+import pytest
+
+from check_oldies import annotations
+from check_oldies import pre_receive
+
+from . import base
+
+
+NULL_REV = "0" * 40
+
+
+def commit(cwd, files):
+    for path, content in files.items():
+        (cwd / path).write_text(content, encoding="utf-8")
+    base.git(cwd, "add", *files)
+    base.git(cwd, "commit", "--quiet", "-m", "Commit")
+    return base.git(cwd, "rev-parse", "HEAD")
+
+
+def get_config(repo):
+    return annotations.Config(
+        path=repo,
+        annotations=["TIMEBOMB"],
+        future_tag_regex=r"FEWTURE-[-[:alnum:]\._]+?",
+    )
+
+
+def test_check_update(repo):
+    oldrev = commit(repo, {
+        "file1.py": "# TIMEBOMB: not added by the push\n# TIMEBOMB (jsmith): FEWTURE-KNOWN\n",
+    })
+    newrev = commit(repo, {
+        "file1.py": (
+            "# TIMEBOMB: not added by the push\n"
+            "# TIMEBOMB (jsmith): FEWTURE-KNOWN\n"
+            "# TIMEBOMB (jsmith): assigned\n"
+            "# TIMEBOMB: not assigned\n"
+            "FEWTURE-KNOWN FEWTURE-ORPHAN\n"
+        ),
+        'quote"d.py': "# TIMEBOMB: not assigned either\n",
+        "é.py": "# TIMEBOMB: not assigned either\n",
+        "sp ace.py": "# TIMEBOMB: not assigned either\n",
+    })
+
+    problems = pre_receive.check_update(get_config(repo), oldrev, newrev, "refs/heads/main")
+
+    assert [problem.to_text() for problem in problems] == [
+        "refs/heads/main: file1.py:4: Annotation without assignee: # TIMEBOMB: not assigned",
+        "refs/heads/main: file1.py:5: Unknown tag FEWTURE-ORPHAN",
+        'refs/heads/main: quote"d.py:1: Annotation without assignee: # TIMEBOMB: not assigned either',
+        "refs/heads/main: sp ace.py:1: Annotation without assignee: # TIMEBOMB: not assigned either",
+        "refs/heads/main: é.py:1: Annotation without assignee: # TIMEBOMB: not assigned either",
+    ]
+
+
+def test_added_lines_that_look_like_file_headers(repo):
+    oldrev = commit(repo, {"file1.py": "a = 1\nb = 2\n"})
+    # Added lines that start with "++ " look like "+++ b/..." headers in the diff.
+    newrev = commit(repo, {"file1.py": "++ b/other.py\na = 1\nb = 2\n# TIMEBOMB: not assigned\n"})
+
+    added = pre_receive.get_added_lines(repo, oldrev, newrev)
+
+    assert added == {"file1.py": {1, 4}}
+
+
+def test_check_new_and_deleted_references(repo):
+    commit(repo, {"file1.py": "# TIMEBOMB: in the first commit\n"})
+    newrev = commit(repo, {"file2.py": "# TIMEBOMB: pushed\n"})
+    # Forget the last commit, as if it had just been pushed.
+    base.git(repo, "reset", "--quiet", "--hard", "HEAD~1")
+    config = get_config(repo)
+
+    problems = pre_receive.check_update(config, NULL_REV, newrev, "refs/heads/new")
+    assert [(problem.path, problem.line_no) for problem in problems] == [("file2.py", 1)]
+    # A new reference to known commits, or a deleted one, adds nothing.
+    head = base.git(repo, "rev-parse", "HEAD")
+    assert pre_receive.check_update(config, NULL_REV, head, "refs/tags/v1") == []
+    assert pre_receive.check_update(config, head, NULL_REV, "refs/heads/old") == []
+
+
+def test_new_reference_with_a_merge_of_known_branches(repo):
+    first = commit(repo, {"file1.py": "a = 1\n"})
+    main = commit(repo, {"file1.py": "a = 1  # TIMEBOMB: on main\n"})
+    base.git(repo, "checkout", "--quiet", "-b", "other", first)
+    commit(repo, {"file2.py": "# TIMEBOMB: on other\n"})
+    base.git(repo, "checkout", "--quiet", "--detach", main)
+    base.git(repo, "merge", "--quiet", "--no-edit", "other")
+    newrev = commit(repo, {"file3.py": "# TIMEBOMB: pushed\n"})
+    # Forget the merge and the last commit, as if they had just been pushed.
+    base.git(repo, "checkout", "--quiet", main)
+
+    problems = pre_receive.check_update(get_config(repo), NULL_REV, newrev, "refs/heads/new")
+
+    assert [(problem.path, problem.line_no) for problem in problems] == [("file3.py", 1)]
+
+
+def test_main(repo, monkeypatch, capsys: pytest.CaptureFixture):
+    monkeypatch.chdir(repo)  # Git runs hooks in the repository
+    (repo / "pyproject.toml").write_text('[tool.check-fixmes]\nannotations = ["TIMEBOMB"]\n', encoding="utf-8")
+    oldrev = commit(repo, {"file1.py": "a = 1\n"})
+    newrev = commit(repo, {"file1.py": "a = 1  # TIMEBOMB: not assigned\n"})
+    stdin = io.StringIO(f"{oldrev} {newrev} refs/heads/main\n")
+
+    with pytest.raises(SystemExit) as caught_exit:
+        pre_receive.main(["--conf", str(repo / "pyproject.toml")], stdin=stdin)
+
+    assert caught_exit.value.code == os.EX_DATAERR
+    assert capsys.readouterr().out.splitlines() == [
+        "NOK: The push adds annotations without assignee or orphan FUTURE tags.",
+        "refs/heads/main: file1.py:1: Annotation without assignee: a = 1  # TIMEBOMB: not assigned",
+    ]
+
+
+def test_whitelisted_and_pruned_files_are_ignored(repo, tmp_path_factory):
+    oldrev = commit(repo, {".gitattributes": "*.min.js linguist-generated\n"})
+    newrev = commit(repo, {
+        "file1.py": "# TIMEBOMB: not assigned\n",
+        "vendor.py": "# TIMEBOMB: whitelisted\n",
+        "bundle.min.js": "// TIMEBOMB: generated\n",
+    })
+    whitelist_file = tmp_path_factory.mktemp("conf") / "whitelist.txt"
+    whitelist_file.write_text("vendor.py\n", encoding="utf-8")
+    config = get_config(repo)
+    config.whitelist_file = str(whitelist_file)
+    config.excluded_attributes = ["linguist-generated"]
+
+    problems = pre_receive.check_update(config, oldrev, newrev, "refs/heads/main")
+
+    assert [problem.path for problem in problems] == ["file1.py"]
+
+
+def test_main_with_a_malformed_line(repo, monkeypatch):
+    monkeypatch.chdir(repo)
+    stdin = io.StringIO("not a valid line\n")
+
+    with pytest.raises(SystemExit) as caught_exit:
+        pre_receive.main([], stdin=stdin)
+
+    assert caught_exit.value.code == "NOK: Unexpected line on the standard input: not a valid line"
@@ -0,0 +1,79 @@
+import json
+import time
+from unittest import mock
+
+import pytest
+
+from check_oldies import annotations
+from check_oldies import check_fixmes
+from check_oldies import commands
+from check_oldies import profiling
+
+from . import base
+
+
+def test_profiler():
+    profiler = profiling.Profiler(slowest_calls=2)
+    with profiler.phase("grep"):
+        pass
+    with profiler.phase("grep"):
+        pass
+    profiler.record("command", "git grep", 0.3, bytes_read=10)
+    profiler.record("command", "git blame 1", 0.1, bytes_read=5)
+    profiler.record("command", "git blame 2", 0.2, bytes_read=5)
+    profiler.record("request", "GET https://example.com", 0.5, bytes_read=100)
+
+    report = profiler.to_dict()
+    assert report["phases"]["grep"]["count"] == 2
+    assert report["calls"]["command"] == {"count": 3, "duration": pytest.approx(0.6), "bytes_read": 20}
+    assert report["calls"]["request"] == {"count": 1, "duration": 0.5, "bytes_read": 100}
+    assert [call["description"] for call in report["slowest_calls"]] == [
+        "GET https://example.com",
+        "git grep",
+    ]
+    assert "git grep" in profiler.to_text()
+
+
+def test_profiler_iterate():
+    def produce():
+        for item in range(2):
+            time.sleep(0.02)
+            yield item
+
+    profiler = profiling.Profiler()
+    for _item in profiler.iterate("grep", produce()):
+        time.sleep(0.2)  # not counted
+
+    stat = profiler.phases["grep"]
+    assert stat.count == 1
+    assert 0.04 <= stat.duration < 0.2
+
+
+def test_commands_are_recorded():
+    profiling.reset()
+    commands.get_output(["head", "-n 4", "test_commands.py"], cwd=base.TEST_DIR_PATH)
+    stat = profiling.current.calls["command"]
+    assert stat.count == 1
+    assert stat.bytes_read > 0
+
+
+@mock.patch("check_oldies.annotations.get_line_blame", base.fake_get_line_blame)
+def test_check_fixmes_profile(tmp_path, capfd):
+    profile_path = tmp_path / "profile.json"
+    config = annotations.Config(
+        path=base.TEST_DIR_PATH / "data/project1",
+        annotations=base.TESTING_ANNOTATIONS,
+        future_tag_regex=base.TESTING_FUTURE_TAG,
+        profile=str(profile_path),
+    )
+
+    with mock.patch("check_oldies.configuration.get_config", return_value=config):
+        with pytest.raises(SystemExit):
+            check_fixmes.main()
+    capfd.readouterr()
+
+    report = json.loads(profile_path.read_text())
+    assert set(report["phases"]) == {"grep", "blame", "output"}
+    assert report["phases"]["blame"]["count"] == 5
+    assert report["calls"]["command"]["count"] >= 1
+    assert report["slowest_calls"][0]["kind"] == "command"
@@ -0,0 +1,94 @@
+import pytest
+
+from check_oldies import annotations
+from check_oldies import pruning
+from check_oldies import scanner
+
+from . import base
+
+
+@pytest.fixture(name="repo")
+def fixture_repo(repo):
+    files = {
+        ".gitattributes": (
+            "*.min.js linguist-generated\n"
+            "vendor/** linguist-vendored\n"
+            "vendor/ours.py -linguist-vendored\n"
+            "not_generated.py linguist-generated=false\n"
+            "custom.py skip-fixmes\n"
+        ),
+        "file1.py": "# TIMEBOMB: searched\nFEWTURE-SEARCHED\n",
+        "big.py": "# TIMEBOMB: too large\nFEWTURE-TOO-LARGE\n" + "x = 1\n" * 100,
+        "bundle.min.js": "// TIMEBOMB: generated\n// FEWTURE-GENERATED\n",
+        "vendor/lib.py": "# TIMEBOMB: vendored\n# FEWTURE-VENDORED\n",
+        "vendor/ours.py": "# TIMEBOMB: not vendored\n",
+        "not_generated.py": "# TIMEBOMB: not generated\n",
+        "custom.py": "# TIMEBOMB: with a custom attribute\n",
+    }
+    for path, content in files.items():
+        (repo / path).parent.mkdir(exist_ok=True)
+        (repo / path).write_text(content, encoding="utf-8")
+    base.git(repo, "add", ".")
+    base.git(repo, "commit", "--quiet", "-m", "Initial commit")
+    return repo
+
+
+def get_config(repo, **options):
+    return annotations.Config(
+        path=repo,
+        annotations=base.TESTING_ANNOTATIONS,
+        future_tag_regex=base.TESTING_FUTURE_TAG,
+        max_file_size=200,
+        excluded_attributes=["linguist-generated", "linguist-vendored", "skip-fixmes"],
+        **options,
+    )
+
+
+PRUNED_PATHS = {"big.py", "bundle.min.js", "vendor/lib.py", "custom.py"}
+
+
+@pytest.mark.parametrize("rev", ["", "HEAD"])
+def test_get_pruned_paths(repo, rev):
+    assert get_config(repo).get_pruned_paths(rev) == PRUNED_PATHS
+    assert get_config(repo, whitelist=["vendor/*"]).get_pruned_paths(rev) == PRUNED_PATHS - {"vendor/lib.py"}
+    config = annotations.Config(path=repo, excluded_attributes=["linguist-generated"])
+    assert config.get_pruned_paths(rev) == {"bundle.min.js"}
+    assert annotations.Config(path=repo).get_pruned_paths(rev) == set()
+
+
+@pytest.mark.parametrize("rev", ["", "HEAD"])
+def test_get_pruned_paths_among_given_paths(repo, rev):
+    paths = ["file1.py", "big.py", "vendor/lib.py", "deleted.py"]
+    assert get_config(repo).get_pruned_paths(rev, paths=paths) == {"big.py", "vendor/lib.py"}
+
+
+def test_attributes_of_a_revision(repo, capsys: pytest.CaptureFixture):
+    (repo / ".gitattributes").write_text("", encoding="utf-8")  # not committed
+
+    pruned = get_config(repo).get_pruned_paths("HEAD")
+
+    if pruning.has_attributes_source(repo):  # pragma: no cover (depends on the version of git)
+        assert pruned == PRUNED_PATHS
+        assert capsys.readouterr().err == ""
+    else:  # pragma: no cover
+        assert pruned == {"big.py"}
+        assert "cannot read attributes of HEAD" in capsys.readouterr().err
+
+
+def test_get_sizes_of_working_tree(repo):
+    (repo / "file1.py").write_text("# modified\n", encoding="utf-8")
+    (repo / "custom.py").unlink()
+    blob_ids = {"file1.py": "", "custom.py": ""}
+    assert pruning.get_sizes(repo, blob_ids) == {"file1.py": len("# modified\n")}
+
+
+@pytest.mark.parametrize("engine", list(scanner.Engine))
+@pytest.mark.parametrize("cache_file", ["", ":memory:"])
+def test_pruned_files_are_not_searched(repo, engine, cache_file):
+    config = get_config(repo, engine=engine, cache_file=cache_file)
+
+    found = {ann.path for ann in annotations.iter_unblamed_annotations(config)}
+    assert found == {"file1.py", "vendor/ours.py", "not_generated.py"}
+
+    orphans = {orphan.tag for orphan in annotations.get_orphan_futures(config)}
+    assert orphans == {"FEWTURE-SEARCHED"}
@@ -0,0 +1,128 @@
+import os
+from unittest import mock
+
+import pytest
+
+from check_oldies import annotations
+from check_oldies import scanner
+
+from . import base
+
+
+def test_translate_regex():
+    assert scanner.translate_regex(r"FUTURE-[-[:alnum:]\._]+?") == r"FUTURE-[-a-zA-Z0-9\\._]*"
+    assert scanner.translate_regex(r".*?(tag).*?") == r".*(tag).*"
+    assert scanner.translate_regex(r"[]a[]\+?") == r"[\]a\[]\+?"
+    assert scanner.translate_regex(r"\<todo\>") == r"\b(?=\w)todo\b(?<=\w)"
+
+
+@pytest.fixture(name="repo")
+def fixture_repo(repo):
+    files = {
+        "file1.py": (
+            "# TIMEBOMB: first\n"
+            "# timebomb (jsmith): FEWTURE-KNOWN\n"
+            "x = 1  # TIMEBOMB no-check-fixmes\n"
+            "FEWTURE-ONE and FEWTURE-TWO\n"
+            "FEWTURE- without name\n"
+            "# NO-CHECK-FIXMES FEWTURE-IGNORED-ONLY-FOR-ANNOTATIONS\n"
+            "# no-check-fixmes FEWTURE-IGNORED\n"
+            "# NOFIX: FEWTURE-WONTFIX and more\n"
+            "# nofix without tag\n"
+        ),
+        "crlf.py": "# TIMEBOMB: crlf\r\nFEWTURE-CRLF\r\n",
+        'dir é/quote"d.py': "# TIMEBOMB: special path\n",
+        "vendor/lib.py": "# TIMEBOMB: whitelisted\n",
+        "empty.py": "",
+        "no_newline.py": "FEWTURE-LAST # TIMEBOMB: no newline at the end",
+        "deleted.py": "# TIMEBOMB: deleted from the working tree\n",
+    }
+    for path, content in files.items():
+        (repo / path).parent.mkdir(exist_ok=True)
+        (repo / path).write_text(content, encoding="utf-8", newline="")
+    (repo / "binary.bin").write_bytes(b"\0# TIMEBOMB: in a binary file\n")
+    os.symlink("file1.py", repo / "link.py")
+    base.git(repo, "add", ".")
+    base.git(repo, "commit", "--quiet", "-m", "Initial commit")
+    (repo / "deleted.py").unlink()
+    (repo / "untracked.py").write_text("# TIMEBOMB: untracked\n", encoding="utf-8")
+    return repo
+
+
+def get_config(repo, engine=scanner.Engine.PYTHON):
+    return annotations.Config(
+        path=repo,
+        engine=engine,
+        annotations=base.TESTING_ANNOTATIONS,
+        ignored_orphans_annotations=base.TESTING_IGNORED_ORPHANS_ANNOTATIONS,
+        future_tag_regex=base.TESTING_FUTURE_TAG,
+        whitelist=["vendor"],
+    )
+
+
+@pytest.mark.parametrize("chunk_size", [scanner.CHUNK_SIZE, 1])
+def test_scanner_finds_what_git_grep_finds(repo, chunk_size, monkeypatch):
+    # With chunks of 1 file, files are scanned by several processes.
+    monkeypatch.setattr(scanner, "CHUNK_SIZE", chunk_size)
+    config = get_config(repo)
+    config.get_scanner().jobs = 2
+
+    result = config.get_scanner().scan()
+
+    expected_annotation_lines = annotations.get_annotation_candidates(
+        repo, config.annotation_regex, config.whitelist,
+    )
+    assert result.annotation_lines == expected_annotation_lines
+    assert ('dir é/quote"d.py', 1, "# TIMEBOMB: special path") in result.annotation_lines
+    assert result.future_lines == annotations.get_future_lines(
+        repo, config.future_tag_regex, config.whitelist,
+    )
+    assert result.known_future_tags == annotations.get_known_future_tags(
+        repo,
+        fr"{config.ignored_orphans_annotations_regex}|{config.annotation_regex}",
+        config.future_tag_regex,
+        config.whitelist,
+    )
+
+
+def test_engines_give_the_same_orphans(repo):
+    python_orphans = annotations.get_orphan_futures(get_config(repo))
+    git_orphans = annotations.get_orphan_futures(get_config(repo, scanner.Engine.GIT))
+    assert python_orphans == git_orphans
+    assert {orphan.tag for orphan in python_orphans} >= {"FEWTURE-ONE", "FEWTURE-TWO", "FEWTURE-CRLF"}
+
+
+def test_scan_given_paths(repo):
+    config = get_config(repo)
+    result = config.get_scanner().scan(["crlf.py", "link.py"])  # symbolic links are not searched
+    assert result.annotation_lines == [("crlf.py", 1, "# TIMEBOMB: crlf")]
+    assert result.future_lines == [("crlf.py", 2, "FEWTURE-CRLF")]
+
+
+def test_unreadable_files_are_skipped(repo):
+    config = get_config(repo)
+    patterns = config.get_scanner().patterns
+    (repo / "file1.py").unlink()
+    (repo / "file1.py").mkdir()  # e.g. a submodule
+    assert scanner.scan_file(repo, "file1.py", patterns) == scanner.ScanResult()
+    with mock.patch("builtins.open", side_effect=PermissionError):
+        assert scanner.scan_file(repo, "crlf.py", patterns) == scanner.ScanResult()
+
+
+@pytest.mark.parametrize("chunk_size", [scanner.CHUNK_SIZE, 1])
+def test_scan_revision(repo, chunk_size, monkeypatch):
+    monkeypatch.setattr(scanner, "CHUNK_SIZE", chunk_size)
+    # Files of the working tree are ignored.
+    (repo / "crlf.py").write_text("# TIMEBOMB: modified\n", encoding="utf-8")
+    config = get_config(repo)
+    config.get_scanner("HEAD").jobs = 2
+
+    result = config.get_scanner("HEAD").scan()
+
+    assert result.annotation_lines == annotations.get_annotation_candidates(
+        repo, config.annotation_regex, config.whitelist, rev="HEAD",
+    )
+    assert ("deleted.py", 1, "# TIMEBOMB: deleted from the working tree") in result.annotation_lines
+    assert result.future_lines == annotations.get_future_lines(
+        repo, config.future_tag_regex, config.whitelist, rev="HEAD",
+    )
@@ -0,0 +1,64 @@
+from check_oldies import annotations
+from check_oldies import branches
+from check_oldies import githost
+from check_oldies import spool
+
+
+def make_annotation(path, age, assignee):
+    return annotations.Annotation(
+        path=path, line_no=1, line_content="# TIMEBOMB", age=age, assignee=assignee, is_old=True
+    )
+
+
+def test_spool_roundtrip():
+    with spool.FindingSpool() as findings:
+        findings.add_annotations("repo", [
+            make_annotation("b.py", 40, "jsmith"),
+            make_annotation("a.py", 30, "unknown"),
+            make_annotation("c.py", 20, "jsmith"),
+            annotations.Annotation(path="d.py", line_no=1, line_content="# TIMEBOMB", assignee="jsmith", timed_out=True),
+        ])
+        pull_request = githost.PullRequestInfo(number=12, state="open", url="https://example.com/pr/12")
+        findings.add_branches([
+            branches.BranchInfo(
+                repo="repo", name="old", url="https://example.com/old", author="jane",
+                age=100, is_old=True, pull_request=pull_request,
+            ),
+        ])
+        assert findings.get_recipients("annotations") == ["jsmith", "unknown"]
+        assert findings.get_recipients("branches") == ["jane"]
+
+        findings.set_email("annotations", "jsmith", "john.smith@example.com")
+        findings.set_email("annotations", "unknown", spool.CATCH_ALL_EMAIL)
+        findings.set_email("branches", "jane", "jane@example.com")
+        assert findings.get_emails("annotations") == ["john.smith@example.com", spool.CATCH_ALL_EMAIL]
+
+        found = list(findings.iter_annotations("john.smith@example.com"))
+        assert [ann.path for ann in found] == ["b.py", "c.py", "d.py"]
+        found = list(findings.iter_annotations("john.smith@example.com", sort_by_age=True))
+        assert [ann.path for ann in found] == ["d.py", "c.py", "b.py"]
+        assert found[1].repository == "repo"
+        assert found[1].is_old is True
+        assert [ann.timed_out for ann in found] == [True, False, False]
+
+        (branch,) = findings.iter_branches("jane@example.com")
+        assert branch.name_and_details == (
+            "old (https://example.com/old), linked to open PR/MR #12 (https://example.com/pr/12)"
+        )
+
+
+def make_branch(name, age):
+    return branches.BranchInfo(
+        repo="repo", name=name, url=f"https://example.com/{name}", author="unknown", age=age, is_old=True,
+    )
+
+
+def test_spool_branches_sorted_by_age():
+    with spool.FindingSpool() as findings:
+        findings.add_branches([make_branch("b", 40), make_branch("a", 30), make_branch("c", 50)])
+        findings.set_email("branches", "unknown", spool.CATCH_ALL_EMAIL)
+
+        found = findings.iter_branches(spool.CATCH_ALL_EMAIL)
+        assert [branch.name for branch in found] == ["b", "a", "c"]
+        found = findings.iter_branches(spool.CATCH_ALL_EMAIL, sort_by_age=True)
+        assert [branch.name for branch in found] == ["a", "b", "c"]